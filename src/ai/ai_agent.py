@@ -1,28 +1,81 @@
 import os
+import time
 import asyncio
-from typing import TypedDict, Annotated
+import logging
+from typing import AsyncIterator, Dict, NotRequired, Optional, TypedDict, Annotated, Tuple
 from contextlib import asynccontextmanager
 
-import langchain
 from langgraph.graph import StateGraph, END, START
 from langgraph.prebuilt import ToolNode
 from langgraph.graph.message import AnyMessage, add_messages
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate
-from langchain_core.messages import AIMessage
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import tool
+from langchain_core.exceptions import OutputParserException
+from langchain_core.utils.json import parse_json_markdown
 from langchain_mcp_adapters.tools import load_mcp_tools
-from mcp import ClientSession
-from mcp.client.sse import sse_client
+from pydantic import AnyUrl
 
-from src.utils.tools import TomTatThreadTool
+from src.ai.mcp_pool import MCPSessionPool
+from src.utils.tools import TomTatThreadTool, current_channel
 from src.utils.parser import answer_parser
+from src.utils.metrics import MetricsCallbackHandler, configure_debug, count, metrics, span
+from src.utils.settings import env
 
-langchain.debug = True
+configure_debug()
+
+logger = logging.getLogger(__name__)
+
+MCP_URL = os.getenv("MCP_URL") or "http://localhost:8000/sse"
+MCP_POOL_SIZE = int(env("MCP_POOL_SIZE", "2"))
+
+# Progress shown while a tool runs during a streamed answer
+TOOL_STATUS = {
+    "retrieve_related_docs": "Searching history…",
+    "retrieve_related_docs_batch": "Searching history…",
+    "read_document": "Reading a related thread…",
+    "tom_tat_thread": "Summarizing the thread…",
+}
+
+# Search for the question while the first LLM call decides whether it needs to
+PREFETCH_RETRIEVAL = env("PREFETCH_RETRIEVAL", "false").lower() in ("1", "true", "yes")
+PREFETCH_TOOL = "retrieve_related_docs"
+PREFETCH_K = 3
+# Tools searching the index, told by the bot which channel the question was asked in
+RETRIEVAL_TOOLS = ("retrieve_related_docs", "retrieve_related_docs_batch")
+def parse_tool_timeouts(value: str) -> Dict[str, float]:
+    """Per-tool timeouts from name=seconds pairs separated by commas; malformed pairs are skipped."""
+    timeouts = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, seconds = item.partition("=")
+        try:
+            if not name.strip():
+                raise ValueError("missing tool name")
+            timeouts[name.strip()] = float(seconds)
+        except ValueError:
+            logger.warning(f"Ignoring TOOL_TIMEOUTS entry {item!r}, expected tool_name=seconds")
+    return timeouts
+
+# Seconds a tool call may run before the agent goes on without it, with overrides per tool
+TOOL_TIMEOUT = float(env("TOOL_TIMEOUT", "20"))
+TOOL_TIMEOUTS = parse_tool_timeouts(env("TOOL_TIMEOUTS", "tom_tat_thread=60"))
+# Rounds of tool calls after which the model has to answer with what it has
+MAX_AGENT_ITERATIONS = int(env("MAX_AGENT_ITERATIONS", "3"))
 
 class State(TypedDict):
     messages: Annotated[list[AnyMessage], add_messages]
+    # Question of the mention, searched for by the prefetch
+    question: NotRequired[str]
+    # Prefetched search, handed to the first matching retrieval call
+    prefetch: NotRequired[Optional[asyncio.Task]]
 
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, api_key=os.getenv("OPENAI_API_KEY"))
+# stream_usage reports token counts for streamed answers too
+llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, api_key=os.getenv("OPENAI_API_KEY"), stream_usage=True)
+# Pass as the config of every agent run to time tool calls and count tokens
+agent_config = {"callbacks": [MetricsCallbackHandler()]}
 
 def get_system_prompt():
     system_prompt = """
@@ -38,14 +91,26 @@ def get_system_prompt():
 
     return system_prompt
 
-def create_chatbot(tools):
+def tool_rounds(messages) -> int:
+    """Number of model turns that called tools so far."""
+    return sum(1 for message in messages if isinstance(message, AIMessage) and message.tool_calls)
+
+async def prefetch(tool, question: str) -> ToolMessage:
+    with span("agent.prefetch"):
+        args = {"query": question, "k": PREFETCH_K, "mention_channel": current_channel()}
+        return await tool.ainvoke({"name": tool.name, "args": args, "id": "prefetch", "type": "tool_call"})
+
+def create_chatbot(tools, max_iterations: int = MAX_AGENT_ITERATIONS, prefetch_retrieval: bool = PREFETCH_RETRIEVAL):
     prompt = ChatPromptTemplate.from_messages([
         SystemMessagePromptTemplate.from_template(get_system_prompt()),
     ])
     llm_with_tools = llm.bind_tools(tools=tools, tool_choice="auto")
     chain = prompt | llm_with_tools
+    # Without tools bound the model can only answer
+    answer_chain = prompt | llm
+    prefetch_tool = next((tool for tool in tools if tool.name == PREFETCH_TOOL), None) if prefetch_retrieval else None
 
-    def chatbot(state: State):
+    async def chatbot(state: State):
         # Ensure messages are in the right format
         if isinstance(state["messages"], str):
             from langchain_core.messages import HumanMessage
@@ -53,12 +118,111 @@ def create_chatbot(tools):
         else:
             messages = state["messages"]
 
-        response = chain.invoke({"conversation": messages, "format_instructions": answer_parser.get_format_instructions()})
+        rounds = tool_rounds(messages)
+        update = {}
+        if rounds == 0 and prefetch_tool is not None and state.get("question"):
+            task = asyncio.create_task(prefetch(prefetch_tool, state["question"]))
+            # Its result may go unused, so mark its outcome as seen whatever happens to it
+            task.add_done_callback(lambda task: task.cancelled() or task.exception())
+            update["prefetch"] = task
+        if rounds >= max_iterations:
+            count("agent.iteration_cap")
+            logger.warning(f"Agent reached {rounds} rounds of tool calls, answering without more tools")
+
+        count("agent.loops")
+        try:
+            with span("agent.chatbot"):
+                response = await (chain if rounds < max_iterations else answer_chain).ainvoke(
+                    {"conversation": messages, "format_instructions": answer_parser.get_format_instructions()}
+                )
+        except BaseException:
+            if "prefetch" in update:
+                update["prefetch"].cancel()
+            raise
+        if "prefetch" in update and not response.tool_calls:
+            # Let it finish rather than cancel it, so its MCP session goes back to the pool
+            update["prefetch"] = None
 
-        return {"messages": messages + [response]}
+        return {"messages": messages + [response], **update}
 
     return chatbot
 
+def tool_timeout(name: str) -> float:
+    return TOOL_TIMEOUTS.get(name, TOOL_TIMEOUT)
+
+def document_tool(pool: MCPSessionPool):
+    """Tool reading the document resource of the MCP server, which load_mcp_tools does not expose."""
+    @tool
+    async def read_document(doc_id: str) -> str:
+        """Read a document from the search results by its id (channel:message_ts:chunk_index), with the ids of the chunks before and after it. Use it for more context on a result instead of searching again"""
+        try:
+            uri = AnyUrl("document://{}/{}/{}/{}".format(*doc_id.rsplit(":", 2), current_channel() or "-"))
+        except (IndexError, ValueError):
+            return f"Invalid document id {doc_id}, expected channel:message_ts:chunk_index"
+        result = await pool.read_resource(uri)
+        return "\n".join(content.text for content in result.contents if hasattr(content, "text"))
+
+    return read_document
+
+
+def takes_prefetch(state, tool_call: Dict) -> bool:
+    """Whether a tool call gets the prefetched search instead of running.
+
+    Only the first retrieval call of the first round qualifies, and only
+    without filters, since the prefetch searched every channel the question
+    may see.
+    """
+    if not isinstance(state, dict) or state.get("prefetch") is None or tool_call["name"] != PREFETCH_TOOL:
+        return False
+    messages = state["messages"]
+    if tool_rounds(messages) != 1:
+        return False
+    first = next(call for call in messages[-1].tool_calls if call["name"] == PREFETCH_TOOL)
+    args = tool_call["args"]
+    return first["id"] == tool_call["id"] and set(args) <= {"query", "k"} and (args.get("k") or PREFETCH_K) <= PREFETCH_K
+
+async def run_tool_call(request, execute):
+    """Run one tool call within its deadline, answering from the prefetch when it applies.
+
+    ToolNode runs the calls of one turn concurrently, so a call that times
+    out only costs its own deadline; the model gets an error result for it
+    and answers with the rest. Searches get the channel the question was
+    asked in from the bot, whatever the model passed, since it decides
+    which private channels they may see.
+    """
+    tool_call = request.tool_call
+    timeout = tool_timeout(tool_call["name"])
+    state = request.state
+    if isinstance(state, dict) and state.get("prefetch") is not None and not any(
+        takes_prefetch(state, call) for call in state["messages"][-1].tool_calls
+    ):
+        # No call of this turn can use it, e.g. the model searched with filters
+        state["prefetch"].cancel()
+    try:
+        if takes_prefetch(state, tool_call):
+            try:
+                result = await asyncio.wait_for(asyncio.shield(state["prefetch"]), timeout)
+                count("agent.prefetch_used")
+                return result.model_copy(update={"tool_call_id": tool_call["id"]})
+            except asyncio.TimeoutError:
+                raise
+            except Exception as e:
+                logger.warning(f"Prefetched search failed, running the tool call instead: {e!r}")
+        if tool_call["name"] in RETRIEVAL_TOOLS:
+            request = request.override(
+                tool_call={**tool_call, "args": {**tool_call["args"], "mention_channel": current_channel()}}
+            )
+        return await asyncio.wait_for(execute(request), timeout)
+    except asyncio.TimeoutError:
+        count("agent.tool_timeouts")
+        logger.warning(f"Tool {tool_call['name']} did not finish within {timeout:g}s")
+        return ToolMessage(
+            content=f"{tool_call['name']} did not finish within {timeout:g} seconds, answer without it.",
+            name=tool_call["name"],
+            tool_call_id=tool_call["id"],
+            status="error",
+        )
+
 
 def router(state):
     messages = state["messages"]
@@ -74,44 +238,136 @@ def router(state):
     
     return "tools" if has_tool_calls else "end"
 
+def build_graph(tools):
+    graph_builder = StateGraph(State)
+    tool_node = ToolNode(tools, awrap_tool_call=run_tool_call)
+
+    chatbot_node = create_chatbot(tools)
+    graph_builder.add_node("chatbot", chatbot_node)
+    graph_builder.add_node("tools", tool_node)
+
+    graph_builder.add_edge(START, "chatbot")
+    graph_builder.add_conditional_edges(
+        "chatbot",
+        router,
+        {
+            "tools": "tools",
+            "end": END
+        }
+    )
+    graph_builder.add_edge("tools", "chatbot")
+    return graph_builder.compile()
+
+
+def partial_answer(content: str) -> str:
+    """The answer field of a possibly incomplete JSON answer, empty until it starts."""
+    try:
+        answer = parse_json_markdown(content).get("answer")
+    except Exception:
+        return ""
+    return answer if isinstance(answer, str) else ""
+
+
+def final_answer(content: str) -> str:
+    """The answer of a complete response, falling back to whatever can be salvaged from it."""
+    with span("answer.parse"):
+        try:
+            return answer_parser.parse(content).answer
+        except OutputParserException:
+            logger.warning("Could not parse the agent's answer, sending it as is")
+            return partial_answer(content) or content
+
+
+async def astream_answer(agent, inputs) -> AsyncIterator[Tuple[str, str]]:
+    """Run the agent, yielding progress as the answer is generated.
+
+    Yields ("status", text) when a tool starts, ("partial", answer so far)
+    as answer tokens of the chatbot node arrive, and finally ("final", answer).
+    """
+    content = ""
+    final_message = None
+    first_token = None
+    started = time.perf_counter()
+    async for event in agent.astream_events(inputs, config=agent_config, version="v2"):
+        kind = event["event"]
+        # Skip model calls made inside tools, such as thread summaries
+        if kind.startswith("on_chat_model") and event.get("metadata", {}).get("langgraph_node") != "chatbot":
+            continue
+        if kind == "on_chat_model_start":
+            content = ""
+        elif kind == "on_chat_model_stream":
+            chunk = event["data"]["chunk"].content
+            if isinstance(chunk, str) and chunk:
+                content += chunk
+                answer = partial_answer(content)
+                if answer:
+                    if first_token is None:
+                        first_token = (time.perf_counter() - started) * 1000
+                        metrics.observe("agent.first_answer_token", first_token)
+                    yield "partial", answer
+        elif kind == "on_chat_model_end":
+            final_message = event["data"]["output"]
+        elif kind == "on_tool_start":
+            yield "status", TOOL_STATUS.get(event["name"], f"Running {event['name']}…")
+    yield "final", final_answer(final_message.content if final_message is not None else content)
+
+
+class AgentManager:
+    def __init__(self, url: str = MCP_URL, pool_size: int = MCP_POOL_SIZE):
+        """Keep one compiled agent graph and a pool of MCP sessions for the whole process.
+
+        The graph holds no per-run state, so the same compiled graph is shared by
+        every mention. MCP tools are bound to the session pool, which reconnects
+        dropped sessions in the background.
+
+        Args:
+            url: SSE endpoint of the MCP server
+            pool_size: Number of MCP sessions kept open
+        """
+        self.pool = MCPSessionPool(url, size=pool_size)
+        self._graph = None
+        self._lock = None
+
+    async def start(self, timeout: float = None):
+        """Connect the session pool and compile the graph if not done yet.
+
+        Returns:
+            The compiled agent graph
+        """
+        if self._graph is not None:
+            return self._graph
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._graph is None:
+                await self.pool.start(timeout=timeout)
+                tools = await load_mcp_tools(self.pool)
+                tools.append(document_tool(self.pool))
+                tools.append(TomTatThreadTool(llm))
+                self._graph = build_graph(tools)
+                logger.info(f"Agent graph compiled with tools: {[tool.name for tool in tools]}")
+        return self._graph
+
+    async def close(self):
+        await self.pool.close()
+        self._graph = None
+
+
+agent_manager = AgentManager()
+
+
 @asynccontextmanager
 async def create_agent():
-    async with sse_client(url="http://localhost:8000/sse") as streams:
-        async with ClientSession(*streams) as session:
-            await session.initialize()
-            
-            tools = await load_mcp_tools(session)
-            tools.append(TomTatThreadTool(llm))
-            graph_builder = StateGraph(State)
-            tool_node = ToolNode(tools)
-
-            chatbot_node = create_chatbot(tools)
-            graph_builder.add_node("chatbot", chatbot_node)
-            graph_builder.add_node("tools", tool_node)
-
-            graph_builder.add_edge(START, "chatbot")
-            graph_builder.add_conditional_edges(
-                "chatbot",
-                router,
-                {
-                    "tools": "tools",
-                    "end": END
-                }
-            )
-            graph_builder.add_edge("tools", "chatbot")
-            graph = graph_builder.compile()
-            
-            try:
-                yield graph
-            finally:
-                pass
+    """Hand out the shared agent graph, connecting on first use."""
+    yield await agent_manager.start()
 
 
 async def main():
     async with create_agent() as agent:
-        result = await agent.ainvoke({"messages": """@botAI Capital of japan? """})
+        result = await agent.ainvoke({"messages": """@botAI Capital of japan? """}, config=agent_config)
         # Get only the answer from the result
         print(result)
+    await agent_manager.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,182 @@
+import re
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.ai.retrieval import index_version, embed_query, normalize_query
+from src.utils.shared_state import SharedState
+from src.utils.settings import env
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE = env("ANSWER_CACHE", "false").lower() in ("1", "true", "yes")
+# Cosine similarity above which two questions count as the same
+ANSWER_CACHE_THRESHOLD = float(env("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(env("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIZE = int(env("ANSWER_CACHE_SIZE", "512"))
+# Scope of answers to questions asked in public channels, which only search public channels
+PUBLIC_SCOPE = "public"
+
+
+def question_text(text: str) -> str:
+    """The question of a mention, without the bot mention and other user mentions."""
+    return re.sub(r"\s+", " ", re.sub(r"<@[A-Z0-9]+(\|[^>]*)?>", " ", text or "")).strip()
+
+
+class SemanticAnswerCache:
+    """Answers to earlier questions, found by embedding similarity.
+
+    Questions are embedded with the retrieval query embeddings, so a repeated
+    question costs no embedding call either. Lookups are one matrix-vector
+    product over the cached question embeddings. Entries expire after ``ttl``
+    and the whole cache is dropped when the vector store changes, since new
+    documents may change the answer. With a state shared between bot
+    processes, answers are stored there and every process adds the ones
+    stored since its last lookup to its own matrix.
+
+    Every answer belongs to a scope, the set of channels its question could
+    search, and is only reused for questions in the same scope.
+    """
+
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl: float = ANSWER_CACHE_TTL,
+        maxsize: int = ANSWER_CACHE_SIZE,
+        state: SharedState = None,
+    ):
+        """Initialize the SemanticAnswerCache class.
+
+        Args:
+            threshold: Minimum cosine similarity for a hit
+            ttl: Seconds an answer stays valid
+            maxsize: Maximum number of answers; the oldest is evicted first
+            state: State shared with other bot processes, if any
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+        self._shared = state.cache("answers", maxsize=maxsize, ttl=ttl) if state is not None and state.is_shared else None
+        self._synced_at = 0.0
+        self._clear()
+
+    def _clear(self):
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        # (question, answer, created_at, latency, scope) per row of _vectors
+        self._entries = []
+        self._version = index_version()
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(embed_query(question), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1)
+
+    def _expire(self):
+        version = index_version()
+        if version != self._version:
+            if self._entries:
+                logger.info(f"Vector store changed, dropping {len(self._entries)} cached answers")
+            self._clear()
+            return
+        now = time.time()
+        keep = [i for i, entry in enumerate(self._entries) if now - entry[2] < self.ttl][-self.maxsize:]
+        if len(keep) != len(self._entries):
+            self._entries = [self._entries[i] for i in keep]
+            self._vectors = self._vectors[keep]
+
+    def _add(self, vector: np.ndarray, entry: Tuple):
+        if not self._entries:
+            self._vectors = vector[None, :]
+        else:
+            self._vectors = np.vstack([self._vectors, vector])
+        self._entries.append(entry)
+        if len(self._entries) > self.maxsize:
+            self._entries = self._entries[1:]
+            self._vectors = self._vectors[1:]
+
+    async def _changes(self) -> List[Tuple[str, Dict, float]]:
+        """Answers stored by any bot process since the last sync."""
+        if self._shared is None:
+            return []
+        return await self._shared.achanged_since(self._synced_at)
+
+    def _sync(self, changes: List[Tuple[str, Dict, float]]):
+        """Add answers from ``_changes``."""
+        for _, stored, updated_at in changes:
+            # Concurrent lookups may fetch the same answers
+            if updated_at <= self._synced_at:
+                continue
+            self._synced_at = updated_at
+            # Answers from before the last vector store change are stale
+            if stored["version"] == self._version:
+                entry = (stored["question"], stored["answer"], stored["created_at"], stored["latency"], stored.get("scope"))
+                self._add(np.asarray(stored["vector"], dtype=np.float32), entry)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    async def lookup(self, question: str, scope: str = PUBLIC_SCOPE) -> Optional[Tuple[str, float]]:
+        """Find the answer to a near-identical earlier question asked in the same scope.
+
+        Returns:
+            Tuple of the answer and the similarity, or None on a miss
+        """
+        if not question:
+            return None
+        started = time.monotonic()
+        vector = await asyncio.to_thread(self._embed, question)
+        changes = await self._changes()
+        with self._lock:
+            self._expire()
+            self._sync(changes)
+            match = None
+            in_scope = [i for i, entry in enumerate(self._entries) if entry[4] == scope]
+            if in_scope:
+                similarities = self._vectors[in_scope] @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    match = self._entries[in_scope[best]], float(similarities[best])
+            if match is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                saved = max(0.0, match[0][3] - (time.monotonic() - started))
+                self.saved_seconds += saved
+
+        if match is None:
+            logger.info(f"Answer cache miss (hit rate {self.hit_rate:.0%}, {self.saved_seconds:.1f}s saved so far)")
+            return None
+        (cached_question, answer, _, _, _), similarity = match
+        logger.info(
+            f"Answer cache hit for {question!r} ~ {cached_question!r} (similarity {similarity:.3f}), "
+            f"saved {saved:.1f}s (hit rate {self.hit_rate:.0%}, {self.saved_seconds:.1f}s saved so far)"
+        )
+        return answer, similarity
+
+    async def store(self, question: str, answer: str, latency: float, scope: str = PUBLIC_SCOPE):
+        """Cache the answer to a question asked in ``scope``, with the seconds it took to produce."""
+        if not question or not answer:
+            return
+        vector = await asyncio.to_thread(self._embed, question)
+        if self._shared is None:
+            with self._lock:
+                self._expire()
+                self._add(vector, (question, answer, time.time(), latency, scope))
+            return
+        await self._shared.aset(f"{scope}:{normalize_query(question)}", {
+            "question": question, "answer": answer, "created_at": time.time(), "latency": latency,
+            "vector": vector.tolist(), "version": index_version(), "scope": scope,
+        })
+        changes = await self._changes()
+        with self._lock:
+            self._expire()
+            self._sync(changes)
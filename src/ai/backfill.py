@@ -0,0 +1,95 @@
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+from src.slack.history_archive import archived_channels
+from src.slack.slack_channel_history import SlackChannelHistory
+from src.utils.settings import env
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BACKFILL_PROCESSES = int(env("BACKFILL_PROCESSES", "4"))
+
+
+def member_channels() -> List[Dict]:
+    """Public and private channels the bot is a member of, as conversations.list returns them."""
+    history = SlackChannelHistory()
+    return [
+        channel
+        for channel in history.iter_channels(types="public_channel,private_channel")
+        if channel.get("is_member")
+    ]
+
+
+def index_channel(channel: Dict, rate_share: float, offline: bool = False) -> Dict:
+    """Backfill one channel; runs in a worker process with its own watermark and store.
+
+    The channel id comes from the listing, since looking a private channel up by name
+    would need another listing of private channels in every worker.
+    """
+    from src.ai.create_vector_db import HISTORY_ARCHIVE, SlackVectorDB
+
+    vector_db = SlackVectorDB(
+        channel_name=channel["name"], channel_id=channel.get("id", ""), archive=HISTORY_ARCHIVE or offline
+    )
+    return vector_db.process_channel_history(rate_share=rate_share, offline=offline)
+
+
+def backfill(channels: List[Dict], processes: int = BACKFILL_PROCESSES, offline: bool = False) -> Dict[str, Dict]:
+    """Index many channels in parallel, one channel per worker process.
+
+    Each channel keeps its own last_processed_<channel>.json watermark and
+    vector store directory, so workers never write to the same database and
+    any channel can be resumed on its own. The Slack rate limits are shared
+    by the whole workspace, so each worker gets an equal share of them.
+
+    Args:
+        channels: Channels to index, with their name and, unless offline, their id
+        processes: Maximum number of worker processes
+        offline: Re-index from the history archives without calling Slack
+
+    Returns:
+        Achieved requests per second per API method, for each channel that finished
+    """
+    processes = max(1, min(processes, len(channels)))
+    rate_share = 1.0 / processes
+    reports = {}
+    started = time.monotonic()
+    # Spawn rather than fork, the parent may already hold client threads and locks
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+        futures = {executor.submit(index_channel, channel, rate_share, offline): channel["name"] for channel in channels}
+        for future in as_completed(futures):
+            channel = futures[future]
+            try:
+                reports[channel] = future.result()
+                logger.info(f"Finished backfill of #{channel}")
+            except Exception as e:
+                logger.error(f"Backfill of #{channel} failed: {e}")
+    logger.info(f"Backfilled {len(reports)}/{len(channels)} channels in {time.monotonic() - started:.1f}s")
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index many Slack channels in parallel")
+    parser.add_argument("channels", nargs="*", help="Channel names, every channel the bot is in if omitted")
+    parser.add_argument("--processes", type=int, default=BACKFILL_PROCESSES, help="Number of worker processes")
+    parser.add_argument("--offline", action="store_true", help="Re-index the history archives without calling Slack")
+    args = parser.parse_args()
+
+    if args.offline:
+        # Ids come from the archives
+        channels = [{"name": name} for name in args.channels or archived_channels()]
+    else:
+        # One listing for every worker, which has no way to look a private channel up by name
+        channels = member_channels()
+        if args.channels:
+            unknown = set(args.channels) - {channel["name"] for channel in channels}
+            if unknown:
+                logger.error(f"Not a member of {', '.join(sorted(unknown))}, skipping")
+            channels = [channel for channel in channels if channel["name"] in args.channels]
+    backfill(channels, processes=args.processes, offline=args.offline)
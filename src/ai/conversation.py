@@ -0,0 +1,127 @@
+import logging
+from typing import List, Tuple
+
+from langchain_openai import ChatOpenAI
+
+from src.utils.shared_state import get_shared_state
+from src.utils.tokens import count_tokens
+from src.utils.settings import env
+
+logger = logging.getLogger(__name__)
+
+# Threads up to this many tokens are sent verbatim
+CONVERSATION_TOKEN_BUDGET = int(env("CONVERSATION_TOKEN_BUDGET", "3000"))
+# Tokens of recent messages kept verbatim when older ones are summarized
+CONVERSATION_RECENT_TOKENS = int(env("CONVERSATION_RECENT_TOKENS", "1500"))
+# Tokens of new messages folded into the summary per LLM call
+SUMMARY_INPUT_TOKENS = 6000
+THREAD_SUMMARY_TTL = float(env("THREAD_SUMMARY_TTL", "86400"))
+
+SUMMARY_PROMPT = """You maintain a running summary of a Slack thread for an assistant that answers questions in it.
+Update the summary with the new messages below. Keep who said what, questions asked, decisions, action items, names, numbers, ids and dates; drop small talk.
+Write at most 200 words, in the language of the conversation.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
+
+
+class ConversationBuilder:
+    """Assemble a thread into a conversation that fits a token budget.
+
+    Short threads are passed through verbatim. In longer ones the most recent
+    messages are kept verbatim and everything before them is replaced by a
+    rolling summary. Summaries are cached per thread_ts together with the
+    timestamp of the last message they cover, so a follow-up mention only
+    folds the messages that have left the recent window since into it.
+    """
+
+    def __init__(
+        self,
+        model: ChatOpenAI,
+        token_budget: int = CONVERSATION_TOKEN_BUDGET,
+        recent_tokens: int = CONVERSATION_RECENT_TOKENS,
+        summary_ttl: float = THREAD_SUMMARY_TTL,
+    ):
+        """Initialize the ConversationBuilder class.
+
+        Args:
+            model: Chat model used for summaries
+            token_budget: Largest thread, in tokens, that is sent verbatim
+            recent_tokens: Tokens of recent messages kept verbatim in longer threads
+            summary_ttl: Seconds a thread summary stays cached
+        """
+        self.model = model
+        self.token_budget = token_budget
+        self.recent_tokens = recent_tokens
+        # (summary, ts of the last message it covers) per thread, shared with other bot processes
+        self.summaries = get_shared_state().cache("conversation_summaries", maxsize=1024, ttl=summary_ttl)
+
+    def count_tokens(self, text: str) -> int:
+        return count_tokens(text, self.model.model_name)
+
+    async def _summarize(self, summary: str, lines: List[str]) -> str:
+        prompt = SUMMARY_PROMPT.format(summary=summary or "(none yet)", messages="".join(lines))
+        response = await self.model.ainvoke(prompt)
+        return response.content.strip()
+
+    async def _fold(self, summary: str, lines: List[str]) -> str:
+        """Fold lines into the summary, a bounded batch per call."""
+        batch, batch_tokens = [], 0
+        for line in lines:
+            tokens = self.count_tokens(line)
+            if batch and batch_tokens + tokens > SUMMARY_INPUT_TOKENS:
+                summary = await self._summarize(summary, batch)
+                batch, batch_tokens = [], 0
+            batch.append(line)
+            batch_tokens += tokens
+        if batch:
+            summary = await self._summarize(summary, batch)
+        return summary
+
+    async def build(self, channel: str, thread_ts: str, messages: List[Tuple[str, str]]) -> str:
+        """Build the conversation of a thread.
+
+        Args:
+            channel: ID of the thread's channel
+            thread_ts: Timestamp of the thread, unique only within its channel
+            messages: (ts, formatted line) pairs in thread order, each line ending in a newline
+
+        Returns:
+            The conversation text
+        """
+        tokens = [self.count_tokens(line) for _, line in messages]
+        if sum(tokens) <= self.token_budget:
+            return "".join(line for _, line in messages)
+
+        # Walk back from the newest message, always keeping the one that mentioned the bot
+        split = len(messages) - 1
+        recent_tokens = tokens[split]
+        while split > 0 and recent_tokens + tokens[split - 1] <= self.recent_tokens:
+            split -= 1
+            recent_tokens += tokens[split]
+        older, recent = messages[:split], messages[split:]
+
+        # Thread timestamps are only unique within a channel
+        key = f"{channel}:{thread_ts}"
+        cached = await self.summaries.aget(key)
+        summary, summarized_ts = cached if cached else ("", "")
+        new_lines = [line for ts, line in older if float(ts) > float(summarized_ts or 0)]
+        if new_lines:
+            try:
+                summary = await self._fold(summary, new_lines)
+                await self.summaries.aset(key, (summary, older[-1][0]))
+                logger.info(
+                    f"Summarized {len(new_lines)} new of {len(older)} older messages in thread {thread_ts} "
+                    f"({sum(tokens)} tokens, {recent_tokens} kept verbatim)"
+                )
+            except Exception as e:
+                logger.error(f"Error summarizing thread {thread_ts}, truncating instead: {e}")
+                if not summary:
+                    summary = "(earlier messages omitted)"
+
+        return f"Summary of earlier messages:\n{summary}\n\nRecent messages:\n" + "".join(line for _, line in recent)
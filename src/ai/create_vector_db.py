@@ -1,64 +1,116 @@
 import os
+import asyncio
+import argparse
 import dotenv
 import json
 import logging
+import time
+from collections import defaultdict
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Tuple
 
-from langchain_chroma.vectorstores import Chroma
 from langchain_openai import OpenAIEmbeddings
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_experimental.text_splitter import SemanticChunker
-from src.slack.slack_channel_history import SlackChannelHistory
+from slack_sdk.errors import SlackApiError
+from src.ai.embedding_cache import CachedEmbeddings
+from src.ai.keyword_index import KeywordIndex
+from src.ai.retrieval import bump_index_version, channel_persist_directory, open_vector_store, save_channel_info
+from src.slack.history_archive import HISTORY_ARCHIVE, ArchivedChannelHistory, HistoryArchive
+from src.slack.rate_limiter import RateLimitedAsyncClient
+from src.slack.slack_channel_history import SlackChannelHistory, AsyncSlackChannelHistory, close_async_client
+from src.slack.user_directory import UserDirectory
+from src.utils.mention_resolver import MentionResolver
+from src.utils.shared_state import SharedState, get_shared_state
+from src.utils.settings import env
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+FETCH_CONCURRENCY = int(env("SLACK_FETCH_CONCURRENCY", "8"))
+EMBED_CONCURRENCY = int(env("EMBED_CONCURRENCY", "4"))
+EMBEDDING_MODEL = "text-embedding-3-small"
+
 
 class SlackVectorDB:
-    def __init__(self, channel_name: str = "social"):
+    def __init__(
+        self, channel_name: str = "social", channel_id: str = "", embeddings: Embeddings = None,
+        archive: bool = HISTORY_ARCHIVE, state: SharedState = None,
+    ):
         """Initialize the SlackVectorDB class.
         
         Args:
             channel_name: The name of the Slack channel to monitor
-            chunk_size: Size of text chunks for splitting conversations
-            chunk_overlap: Overlap between chunks to maintain context
+            channel_id: The channel ID, if already known
+            embeddings: Embeddings model to use instead of OpenAI's, with its name in ``model``
+            archive: Keep a local archive of the raw history and index from it
+            state: State shared with running bot processes, whose live indexer writes the same store
         """
         dotenv.load_dotenv()
         self.OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
         self.channel_name = channel_name
+        self.state = state or get_shared_state()
         
         # Load users list
-        with open("users.json", "r") as f:
-            self.users_store = json.load(f)
+        self.user_directory = UserDirectory()
+        self.users_store = self.user_directory.users_store
+        self.mention_resolver = MentionResolver(self.users_store)
             
         # Initialize embeddings and vector store
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-        self.vector_store = Chroma(
-            collection_name=f"slack_{channel_name}_history",
-            embedding_function=self.embeddings,
-            persist_directory="./chroma_slack_db",
-        )
+        # Shared by the chunker and the vector store, so each text is embedded once
+        embeddings = embeddings or OpenAIEmbeddings(model=EMBEDDING_MODEL)
+        self.embeddings = CachedEmbeddings(embeddings, model_name=embeddings.model)
+        self.vector_store = open_vector_store(channel_name, self.embeddings)
+        # BM25 index of the same chunks, kept in step with every vector store write
+        self.keyword_index = KeywordIndex(channel_persist_directory(channel_name))
         
+        # Raw messages fetched from Slack, so re-indexing replays them instead of calling the API
+        self.archive = HistoryArchive(channel_name) if archive else None
+        if self.archive is not None and not channel_id:
+            channel_id = self.archive.meta.get("channel_id", "")
+
         # Initialize Slack channel history
-        self.slack_channel_history = SlackChannelHistory(channel_name=channel_name)
+        self.slack_channel_history = SlackChannelHistory(channel_name=channel_name, channel_id=channel_id)
         self.text_splitter = SemanticChunker(self.embeddings, breakpoint_threshold_type="gradient")
 
-        # Track last processed timestamp
+        # Track last processed timestamp and any interrupted backfill
         self.last_processed_ts = self._load_last_processed_ts()
+        self.backfill_state = self._load_backfill_state()
     
-    def _load_last_processed_ts(self) -> float:
-        """Load the last processed timestamp from a file."""
+    @property
+    def _state_file(self) -> str:
+        return f"last_processed_{self.channel_name}.json"
+
+    def _load_state(self) -> Dict:
         try:
-            with open(f"last_processed_{self.channel_name}.json", "r") as f:
-                return float(json.load(f).get("last_ts", 0))
+            with open(self._state_file, "r") as f:
+                return json.load(f)
         except (FileNotFoundError, json.JSONDecodeError):
-            return 0.0
-    
+            return {}
+
+    def _write_state(self, state: Dict):
+        # Write to a temp file first so an interrupted run never leaves a corrupt watermark
+        tmp_file = f"{self._state_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_file, self._state_file)
+
+    def _load_last_processed_ts(self) -> float:
+        """Load the last processed timestamp from a file."""
+        return float(self._load_state().get("last_ts", 0))
+
+    def _load_backfill_state(self) -> Dict:
+        """Load the bounds and cursor of an interrupted backfill, if any."""
+        return self._load_state().get("backfill")
+
     def _save_last_processed_ts(self, timestamp: float):
-        """Save the last processed timestamp to a file."""
-        with open(f"last_processed_{self.channel_name}.json", "w") as f:
-            json.dump({"last_ts": timestamp}, f)
+        """Save the last processed timestamp to a file, clearing any backfill cursor."""
+        self._write_state({"last_ts": timestamp})
+
+    def _save_backfill_state(self, backfill: Dict):
+        """Save the bounds and next cursor of the running backfill."""
+        self._write_state({"last_ts": self.last_processed_ts, "backfill": backfill})
     
     @staticmethod
     def timestamp_to_date(timestamp: str) -> str:
@@ -81,10 +133,7 @@ class SlackVectorDB:
         Returns:
             Processed message text
         """
-        message_text = message["text"]
-        for user_id, user_name in self.users_store.items():
-            message_text = message_text.replace(user_id, user_name)
-        return message_text
+        return self.mention_resolver.resolve(message.get("text", ""))
     
     def create_documents(self, thread_history: str, metadata: Dict) -> List[Document]:
         """Create documents from thread history using semantic chunking.
@@ -104,80 +153,413 @@ class SlackVectorDB:
         try:
             # Filter out None values from metadata
             documents = self.text_splitter.create_documents([thread_history], [metadata])
-            return documents
         except Exception as e:
             logger.error(f"Error creating documents: {e}")
-            return [Document(page_content=thread_history, metadata=metadata)]
-    
-    def process_channel_history(self, batch_size: int = 100):
-        """Process the channel history and add to vector store in batches."""
-        channel_history = self.slack_channel_history.get_channel_history()
-        logger.info(f"Found {len(channel_history)} messages in channel history")
-        documents_to_add = []
-        latest_ts = self.last_processed_ts
-        
-        for message in channel_history:
-            message_ts = float(message["ts"])
-            if message_ts <= self.last_processed_ts:
+            documents = [Document(page_content=thread_history, metadata=metadata)]
+
+        for chunk_index, document in enumerate(documents):
+            document.metadata = {**document.metadata, "chunk_index": chunk_index}
+            document.id = self.document_id(document.metadata["channel"], document.metadata["message_ts"], chunk_index)
+        return documents
+
+    @staticmethod
+    def document_id(channel: str, message_ts: str, chunk_index: int) -> str:
+        """Deterministic vector store id of a chunk, so re-ingesting a thread overwrites it."""
+        return f"{channel}:{message_ts}:{chunk_index}"
+
+    def _delete_stale_chunks(self, documents: List[Document]):
+        """Delete chunks left over from an earlier, longer chunking of the same threads."""
+        message_ts = list({document.metadata["message_ts"] for document in documents})
+        current_ids = {document.id for document in documents}
+        existing = self.vector_store.get(
+            where={"$and": [{"channel": self.channel_name}, {"message_ts": {"$in": message_ts}}]},
+        )
+        stale_ids = [doc_id for doc_id in existing["ids"] if doc_id not in current_ids]
+        if stale_ids:
+            self.vector_store.delete(ids=stale_ids)
+            logger.info(f"Deleted {len(stale_ids)} stale chunks")
+
+    def _add_documents(self, documents: List[Document]):
+        """Upsert the chunks of complete threads and drop their stale chunks.
+
+        Errors are raised, so callers never checkpoint threads that were not stored.
+        """
+        self.vector_store.add_documents(documents)
+        self._delete_stale_chunks(documents)
+        self.keyword_index.upsert(documents)
+        bump_index_version()
+        logger.info(f"Upserted {len(documents)} documents to vector store")
+
+    def compact(self) -> int:
+        """Deduplicate the collection and move every chunk to its deterministic id.
+
+        Chunks are grouped by channel and message_ts, identical chunks within a
+        group are dropped, and the rest are renumbered in their stored order.
+        Stored embeddings are reused, so nothing is re-embedded. Chunks from
+        before date filtering get their numeric timestamp, and the keyword
+        index is rebuilt from the compacted collection.
+
+        Returns:
+            Number of duplicate chunks removed
+        """
+        data = self.vector_store.get(include_embeddings=True)
+        groups = defaultdict(list)
+        for entry in zip(data["ids"], data["documents"], data["metadatas"], data["embeddings"]):
+            metadata = entry[2] or {}
+            if metadata.get("message_ts"):
+                groups[(metadata.get("channel", self.channel_name), metadata["message_ts"])].append(entry)
+
+        upsert = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+        delete_ids = []
+        duplicates = 0
+        for (channel, message_ts), entries in groups.items():
+            seen = set()
+            kept = []
+            for entry in entries:
+                if entry[1] not in seen:
+                    seen.add(entry[1])
+                    kept.append(entry)
+            duplicates += len(entries) - len(kept)
+            new_ids = [self.document_id(channel, message_ts, chunk_index) for chunk_index in range(len(kept))]
+            if [entry[0] for entry in entries] == new_ids and all("timestamp" in entry[2] for entry in entries):
                 continue
-                
-            latest_ts = max(latest_ts, message_ts)
-            thread_history = ""
-            
-            # Process main message
-            permalink = self.slack_channel_history.get_permalink(message["ts"])
-            processed_text = self.process_message(message)
-            thread_history += f"{self.timestamp_to_date(message['ts'])} {self.users_store[message['user']]}: {processed_text}\n"
-            
-            # Process thread messages
-            thread_ts = message.get("thread_ts")
-            if thread_ts:
-                thread_messages = self.slack_channel_history.get_thread_history(thread_ts)
-                for thread_message in thread_messages:
-                    processed_text = self.process_message(thread_message)
-                    thread_history += f"{self.timestamp_to_date(thread_message['ts'])} {self.users_store[thread_message['user']]}: {processed_text}\n"
-            
-            # Create metadata
-            metadata = {
-                "permalink_to_message": permalink,
-                "channel": self.channel_name,
-                "message_ts": message["ts"],
-                "thread_ts": thread_ts if thread_ts else "",
-                "user": self.users_store[message["user"]],
-                "message_type": "thread" if thread_ts else "main"
+            for chunk_index, (new_id, (_, document, metadata, embedding)) in enumerate(zip(new_ids, kept)):
+                upsert["ids"].append(new_id)
+                upsert["documents"].append(document)
+                upsert["metadatas"].append({**metadata, "chunk_index": chunk_index, "timestamp": float(message_ts)})
+                upsert["embeddings"].append(embedding)
+            new_id_set = set(new_ids)
+            delete_ids.extend(entry[0] for entry in entries if entry[0] not in new_id_set)
+
+        for start in range(0, len(upsert["ids"]), 1000):
+            self.vector_store.upsert(**{key: values[start:start + 1000] for key, values in upsert.items()})
+        if delete_ids:
+            self.vector_store.delete(ids=delete_ids)
+        self.vector_store.vacuum()
+        logger.info(f"Compacted {len(data['ids'])} chunks: rewrote {len(upsert['ids'])}, removed {duplicates} duplicates")
+
+        compacted = self.vector_store.get()
+        self.keyword_index.rebuild([
+            Document(id=doc_id, page_content=document, metadata=metadata)
+            for doc_id, document, metadata in zip(compacted["ids"], compacted["documents"], compacted["metadatas"])
+            if metadata and metadata.get("message_ts")
+        ])
+        bump_index_version()
+        logger.info(f"Rebuilt keyword index with {len(compacted['ids'])} chunks")
+        return duplicates
+
+    def format_message(self, message: dict) -> str:
+        """Format a message as a dated transcript line."""
+        return f"{self.timestamp_to_date(message['ts'])} {self.user_directory.author(message)}: {self.process_message(message)}\n"
+
+    async def fetch_thread(self, history: AsyncSlackChannelHistory, message: dict, lookup_users: bool = True) -> Tuple[str, Dict]:
+        """Fetch the replies of a top-level message.
+
+        Args:
+            history: Slack history client to fetch with
+            message: Top-level Slack message dictionary
+            lookup_users: Look up users missing from the directory with users.info
+
+        Returns:
+            Tuple of the thread transcript and its document metadata
+        """
+        thread_ts = message.get("thread_ts")
+        thread_messages = await history.get_thread_history(thread_ts) if thread_ts else []
+        return await self.build_thread(history, message, thread_messages, lookup_users=lookup_users)
+
+    async def build_thread(
+        self, history: AsyncSlackChannelHistory, message: dict, thread_messages: List[Dict], lookup_users: bool = True
+    ) -> Tuple[str, Dict]:
+        """Build the transcript and metadata of a top-level message and its replies.
+
+        Without ``lookup_users``, names come from the user snapshot alone and
+        unknown users keep their ID.
+        """
+        thread_ts = message.get("thread_ts")
+        if lookup_users:
+            await self.user_directory.ensure_users(self.user_directory.user_ids_in([message] + thread_messages))
+        # Derived locally from the workspace URL, no API call per message
+        permalink = await history.get_permalink(message["ts"])
+
+        thread_history = self.format_message(message)
+        for thread_message in thread_messages:
+            thread_history += self.format_message(thread_message)
+
+        metadata = {
+            "permalink_to_message": permalink,
+            "channel": self.channel_name,
+            "message_ts": message["ts"],
+            # Numeric copy of message_ts for date range filters
+            "timestamp": float(message["ts"]),
+            "thread_ts": thread_ts if thread_ts else "",
+            "user": self.user_directory.author(message),
+            "message_type": "thread" if thread_ts else "main"
+        }
+        return thread_history, metadata
+
+    async def reindex_thread(self, history: AsyncSlackChannelHistory, thread_ts: str):
+        """Re-chunk and upsert one thread from its current state in Slack.
+
+        If the top-level message is gone, its chunks are deleted instead.
+
+        Args:
+            history: Slack history client to fetch with
+            thread_ts: Timestamp of the top-level message
+        """
+        try:
+            messages = [message async for message in history.iter_thread_history(thread_ts)]
+        except SlackApiError as e:
+            if e.response.get("error") != "thread_not_found":
+                raise
+            messages = []
+        if not messages or messages[0]["ts"] != thread_ts:
+            await asyncio.to_thread(self.delete_thread, thread_ts)
+            return
+        root = messages[0]
+        replies = messages if root.get("thread_ts") else []
+        if self.archive is not None:
+            await asyncio.to_thread(self.archive.append, [(root, replies)])
+        thread = await self.build_thread(history, root, replies)
+        documents = await asyncio.to_thread(self.create_documents, *thread)
+        if documents:
+            await asyncio.to_thread(self._add_documents, documents)
+
+    def delete_thread(self, message_ts: str):
+        """Delete every chunk of a thread."""
+        if self.archive is not None and message_ts in self.archive:
+            self.archive.delete(message_ts)
+        existing = self.vector_store.get(
+            where={"$and": [{"channel": self.channel_name}, {"message_ts": message_ts}]},
+        )
+        if existing["ids"]:
+            self.vector_store.delete(ids=existing["ids"])
+            self.keyword_index.delete_thread(message_ts)
+            bump_index_version()
+            logger.info(f"Deleted {len(existing['ids'])} chunks of thread {message_ts}")
+
+    async def save_channel_info(self, history: AsyncSlackChannelHistory):
+        """Record the channel's id and privacy next to its index, which decide where it may be searched from."""
+        info = await history.get_channel_info()
+        if info:
+            await asyncio.to_thread(save_channel_info, self.channel_name, info["id"], info.get("is_private", True))
+
+    async def aprocess_channel_history(
+        self, batch_size: int = 100, concurrency: int = FETCH_CONCURRENCY, rate_share: float = 1.0, offline: bool = False
+    ):
+        """Process the channel history and add to vector store in batches.
+
+        History pages are streamed from Slack newest first, bounded below by
+        the last processed timestamp. Threads are fetched by ``concurrency``
+        workers through a rate-limited client, and each fetched thread goes
+        straight to chunking and embedding while later threads are in flight.
+
+        The cursor of a page is saved once every thread on it and on all
+        earlier pages is stored, so an interrupted backfill resumes from there
+        with the same bounds. A thread that fails to fetch or store keeps its
+        page uncommitted and the run incomplete, so it is retried on the next
+        run. The watermark only moves once the whole range is done. Every
+        write holds the channel's ``index:`` lock in the shared state, so it
+        never overlaps a live re-index by a bot sharing that state.
+
+        With the history archive on, new history is first synced into the
+        archive and threads are then replayed from it, up to where the archive
+        is synced. ``offline`` skips the sync and re-indexes the whole archive
+        without calling the Slack API, e.g. after changing the chunker.
+        Online runs also record whether the channel is private, since private
+        channels are only searched from mentions in them.
+
+        Args:
+            batch_size: Number of documents per vector store write
+            concurrency: Number of threads fetched at the same time
+            rate_share: Fraction of the Slack rate limits this run may use
+            offline: Re-index everything from the archive instead of syncing it
+
+        Returns:
+            Achieved requests per second per Slack API method
+        """
+        if offline and self.archive is None:
+            raise ValueError("Offline indexing replays the history archive, set HISTORY_ARCHIVE=true")
+        client = RateLimitedAsyncClient(rate_share=rate_share)
+        history = AsyncSlackChannelHistory(
+            self.channel_name, channel_id=self.slack_channel_history.channel_id, client=client
+        )
+        source, latest = "slack", f"{time.time():.6f}"
+        if not offline:
+            await self.save_channel_info(history)
+        if self.archive is not None:
+            if not offline and not await self.archive.sync(history, concurrency):
+                logger.error(f"Archive sync of {self.channel_name} did not finish, indexing what is archived")
+            history = ArchivedChannelHistory(self.archive)
+            # Archive cursors are positions in the archive files, a rebuild starts from the oldest thread
+            source, latest = "rebuild" if offline else "archive", self.archive.meta.get("synced_until")
+            if latest is None:
+                logger.error(f"History archive of {self.channel_name} was never synced, nothing to index")
+                return client.report()
+
+        if self.backfill_state and self.backfill_state.get("source", "slack") == source:
+            backfill = self.backfill_state
+            logger.info(f"Resuming backfill of {self.channel_name} from saved cursor")
+        else:
+            if self.backfill_state:
+                logger.info(f"Restarting backfill of {self.channel_name}, its cursor is from another source")
+            backfill = {
+                "oldest": f"{self.last_processed_ts:.6f}" if self.last_processed_ts and not offline else None,
+                "latest": latest,
+                "cursor": None,
+                "source": source,
             }
-            
-            # Create and add documents to batch
-            documents = self.create_documents(thread_history, metadata)
-            if documents:
-                logger.info(f"Created {len(documents)} documents from message {message['ts']}")
-                documents_to_add.extend(documents)
-
-            # Process in batches
-            if len(documents_to_add) >= batch_size:
+        oldest_ts = float(backfill["oldest"] or 0)
+
+        # Resolve the workspace URL once up front so permalinks are derived locally
+        await history.get_workspace_url()
+        if not offline:
+            await self.user_directory.ensure_fresh(wait=True)
+
+        started = time.monotonic()
+        fetch_queue = asyncio.Queue(maxsize=concurrency * 4)
+        embed_queue = asyncio.Queue(maxsize=concurrency * 4)
+        # One [threads not yet stored, next cursor] entry per fetched page
+        pages = []
+        committed_pages = 0
+        pending = []
+        flush_lock = asyncio.Lock()
+        message_count = 0
+        failed_threads = 0
+        # Same lock as the live indexer's
+        index_lock = f"index:{self.slack_channel_history.channel_id or self.channel_name}"
+
+        def commit_pages():
+            nonlocal committed_pages
+            while committed_pages < len(pages) and pages[committed_pages][0] == 0:
+                next_cursor = pages[committed_pages][1]
+                committed_pages += 1
+                if next_cursor:
+                    backfill["cursor"] = next_cursor
+                    self._save_backfill_state(backfill)
+                    self.backfill_state = backfill
+
+        async def flush(force: bool = False):
+            nonlocal pending, failed_threads
+            async with flush_lock:
+                if not pending or (not force and sum(len(docs) for _, docs in pending) < batch_size):
+                    return
+                batch, pending = pending, []
+                documents = [doc for _, docs in batch for doc in docs]
+                if documents:
+                    try:
+                        # A store has one writer at a time, and a running bot's live indexer writes it too
+                        async with self.state.lock(index_lock):
+                            await asyncio.to_thread(self._add_documents, documents)
+                    except Exception as e:
+                        # Their pages are never counted down, so the cursor stays before them
+                        logger.error(f"Error adding {len(documents)} documents of {len(batch)} threads: {e}")
+                        failed_threads += len(batch)
+                        return
+                for page_index, _ in batch:
+                    pages[page_index][0] -= 1
+                commit_pages()
+
+        async def fetch_worker():
+            nonlocal failed_threads
+            while (item := await fetch_queue.get()) is not None:
+                page_index, message = item
                 try:
-                    self.vector_store.add_documents(documents_to_add)
-                    logger.info(f"Added {len(documents_to_add)} documents to vector store")
-                    documents_to_add = []
+                    thread = await self.fetch_thread(history, message, lookup_users=not offline)
                 except Exception as e:
-                    logger.error(f"Error adding documents: {e}")
-                    # Retry logic could be added here
-        
-        # Process remaining documents
-        if documents_to_add:
+                    # The page is never counted down, so the cursor stays before it
+                    logger.error(f"Error fetching thread {message['ts']}: {e}")
+                    failed_threads += 1
+                    continue
+                await embed_queue.put((page_index, thread))
+
+        async def embed_worker():
+            nonlocal failed_threads
+            while (item := await embed_queue.get()) is not None:
+                page_index, thread = item
+                try:
+                    documents = await asyncio.to_thread(self.create_documents, *thread)
+                except Exception as e:
+                    # The page is never counted down, so the cursor stays before it
+                    logger.error(f"Error chunking thread {thread[1]['message_ts']}: {e}")
+                    failed_threads += 1
+                    continue
+                if documents:
+                    logger.info(f"Created {len(documents)} documents from message {thread[1]['message_ts']}")
+                pending.append((page_index, documents))
+                await flush()
+
+        fetchers = [asyncio.create_task(fetch_worker()) for _ in range(concurrency)]
+        embedders = [asyncio.create_task(embed_worker()) for _ in range(EMBED_CONCURRENCY)]
+        completed = True
+        try:
+            pages_iter = history.iter_channel_history_pages(
+                oldest=backfill["oldest"], latest=backfill["latest"], cursor=backfill["cursor"]
+            )
+            async for channel_history, next_cursor in pages_iter:
+                messages = [message for message in channel_history if float(message["ts"]) > oldest_ts]
+                message_count += len(messages)
+                logger.info(f"Fetched page of {len(channel_history)} messages ({message_count} so far)")
+                pages.append([len(messages), next_cursor])
+                commit_pages()
+                for message in messages:
+                    await fetch_queue.put((len(pages) - 1, message))
+        except SlackApiError as e:
+            logger.error(f"Error fetching channel history, backfill can be resumed: {e}")
+            completed = False
+        finally:
+            # Drain in-flight threads so every finished page still gets checkpointed
+            for _ in fetchers:
+                await fetch_queue.put(None)
+            await asyncio.gather(*fetchers)
+            for _ in embedders:
+                await embed_queue.put(None)
+            await asyncio.gather(*embedders)
+            await flush(force=True)
+        if failed_threads:
+            logger.error(f"{failed_threads} threads of {self.channel_name} were not indexed, backfill can be resumed")
+            completed = False
+
+        elapsed = time.monotonic() - started
+        logger.info(f"Processed {message_count} messages in {elapsed:.1f}s ({message_count / max(elapsed, 1e-9):.2f} messages/s)")
+        report = client.report()
+        logger.info(f"Embedding cache: {self.embeddings.stats()}")
+        if not completed:
+            return report
+
+        # Everything up to the upper bound is stored, so that bound becomes the new watermark
+        latest_ts = float(backfill["latest"])
+        self._save_last_processed_ts(latest_ts)
+        self.last_processed_ts = latest_ts
+        self.backfill_state = None
+        print(f"Updated last processed timestamp to {latest_ts}")
+        return report
+
+    def process_channel_history(
+        self, batch_size: int = 100, concurrency: int = FETCH_CONCURRENCY, rate_share: float = 1.0, offline: bool = False
+    ):
+        """Blocking entry point for aprocess_channel_history."""
+        async def run():
             try:
-                self.vector_store.add_documents(documents_to_add)
-                logger.info(f"Added final batch of {len(documents_to_add)} documents to vector store")
-            except Exception as e:
-                logger.error(f"Error adding final documents: {e}")
-        
-        # Update last processed timestamp
-        if latest_ts > self.last_processed_ts:
-            self._save_last_processed_ts(latest_ts)
-            self.last_processed_ts = latest_ts
-            print(f"Updated last processed timestamp to {latest_ts}")
+                return await self.aprocess_channel_history(
+                    batch_size=batch_size, concurrency=concurrency, rate_share=rate_share, offline=offline
+                )
+            finally:
+                await close_async_client()
+
+        return asyncio.run(run())
 
 # Example usage
 if __name__ == "__main__":
-    vector_db = SlackVectorDB(channel_name="social")
-    vector_db.process_channel_history()
+    parser = argparse.ArgumentParser(description="Index Slack channel history into the vector store")
+    parser.add_argument("--channel", default="social", help="Name of the Slack channel")
+    parser.add_argument("--compact", action="store_true", help="Deduplicate the existing collection instead of ingesting")
+    parser.add_argument("--offline", action="store_true", help="Re-index the whole history archive without calling Slack")
+    args = parser.parse_args()
+
+    vector_db = SlackVectorDB(channel_name=args.channel, archive=HISTORY_ARCHIVE or args.offline)
+    if args.compact:
+        vector_db.compact()
+        if vector_db.archive is not None:
+            vector_db.archive.compact()
+    else:
+        vector_db.process_channel_history(offline=args.offline)
@@ -0,0 +1,105 @@
+import sqlite3
+import hashlib
+import logging
+import threading
+from array import array
+from typing import Dict, List
+
+from langchain_core.embeddings import Embeddings
+from src.utils.settings import env
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_PATH = env("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite3")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper backed by a persistent SQLite cache.
+
+    Vectors are stored as float32 blobs keyed by model name and the SHA-256 of
+    the text, so the same sentence or chunk is only ever embedded once per
+    model, across the SemanticChunker, the vector store and later runs. Only
+    the texts missing from the cache are sent to the wrapped model, in one
+    batch call.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, path: str = EMBEDDING_CACHE_PATH):
+        """Initialize the CachedEmbeddings class.
+
+        Args:
+            embeddings: The embeddings model to wrap
+            model_name: Name of the model, part of the cache key
+            path: SQLite database file
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Backfill workers in other processes may hold the write lock for a moment
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, hash))"
+        )
+        self._conn.commit()
+
+    def _lookup(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        # Stay well below SQLite's limit on bound parameters
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+            for text_hash, blob in rows:
+                found[text_hash] = array("f", blob).tolist()
+        return found
+
+    def _store(self, model: str, vectors: Dict[str, List[float]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)",
+                [(model, text_hash, array("f", vector).tobytes()) for text_hash, vector in vectors.items()],
+            )
+            self._conn.commit()
+
+    def _embed(self, texts: List[str], model: str, embed) -> List[List[float]]:
+        hashes = [content_hash(text) for text in texts]
+        vectors = self._lookup(model, list(set(hashes)))
+
+        # Embed each missing text once, even if it appears several times in the batch
+        missing = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in vectors:
+                missing.setdefault(text_hash, text)
+        with self._lock:
+            self.hits += len(texts) - sum(1 for text_hash in hashes if text_hash in missing)
+            self.misses += len(missing)
+
+        if missing:
+            new_vectors = dict(zip(missing, embed(list(missing.values()))))
+            self._store(model, new_vectors)
+            vectors.update(new_vectors)
+        return [vectors[text_hash] for text_hash in hashes]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, self.model_name, self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        # Some models embed queries differently from documents, so keep them apart
+        return self._embed([text], f"{self.model_name}:query", lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
@@ -0,0 +1,168 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+KEYWORD_INDEX_FILE = "keyword_index.sqlite3"
+
+# Words, plus ticket ids and error codes such as ABC-123, E_TIMEOUT or v1.2.3 kept as one phrase
+TERM_PATTERN = re.compile(r"\w+(?:[-_./:]\w+)*")
+
+
+def match_query(query: str) -> str:
+    """Turn free text into an FTS5 query matching any of its terms.
+
+    Every term is quoted, so punctuation and FTS5 keywords in the query are
+    taken literally and a hyphenated id only matches as a phrase.
+    """
+    terms = dict.fromkeys(term.lower() for term in TERM_PATTERN.findall(query))
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+class KeywordIndex:
+    """BM25 inverted index of the chunks of one channel, kept next to its vector store.
+
+    Chunks live in a plain SQLite table keyed by their vector store id, with
+    an external-content FTS5 table over their text that is kept in sync by
+    triggers. Writes replace whole threads, so the keyword index always holds
+    exactly the chunks the vector store holds.
+    """
+
+    def __init__(self, directory: str):
+        """Initialize the KeywordIndex class.
+
+        Args:
+            directory: Persist directory of the channel
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, KEYWORD_INDEX_FILE)
+        self._lock = threading.Lock()
+        # Backfill workers and the live indexer may write while the MCP server reads
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                rowid INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                message_ts TEXT NOT NULL,
+                user TEXT,
+                timestamp REAL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_message_ts ON chunks (message_ts);
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(text, content='chunks', content_rowid='rowid');
+            CREATE TRIGGER IF NOT EXISTS chunks_insert AFTER INSERT ON chunks BEGIN
+                INSERT INTO chunks_fts (rowid, text) VALUES (new.rowid, new.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunks_delete AFTER DELETE ON chunks BEGIN
+                INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+            END;
+            """
+        )
+        self._conn.commit()
+
+    def _delete_threads(self, message_ts: List[str]):
+        for start in range(0, len(message_ts), 500):
+            batch = message_ts[start:start + 500]
+            self._conn.execute(
+                f"DELETE FROM chunks WHERE message_ts IN ({','.join('?' * len(batch))})", batch
+            )
+
+    def upsert(self, documents: List[Document]):
+        """Replace every thread the documents belong to with the given chunks."""
+        rows = [
+            (
+                document.id,
+                document.metadata["message_ts"],
+                document.metadata.get("user"),
+                document.metadata.get("timestamp", float(document.metadata["message_ts"])),
+                document.page_content,
+                json.dumps(document.metadata),
+            )
+            for document in documents
+        ]
+        with self._lock:
+            self._delete_threads(list({row[1] for row in rows}))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, message_ts, user, timestamp, text, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def delete_thread(self, message_ts: str):
+        with self._lock:
+            self._delete_threads([message_ts])
+            self._conn.commit()
+
+    def rebuild(self, documents: List[Document]):
+        """Replace the whole index, e.g. from the contents of the vector store."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.commit()
+        for start in range(0, len(documents), 1000):
+            self.upsert(documents[start:start + 1000])
+
+    def get(self, doc_ids: List[str]) -> List[Document]:
+        """Chunks by vector store id, in the order asked for; unknown ids are skipped."""
+        rows = {}
+        with self._lock:
+            for start in range(0, len(doc_ids), 500):
+                batch = doc_ids[start:start + 500]
+                for doc_id, text, metadata in self._conn.execute(
+                    f"SELECT id, text, metadata FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+                ):
+                    rows[doc_id] = Document(id=doc_id, page_content=text, metadata=json.loads(metadata))
+        return [rows[doc_id] for doc_id in doc_ids if doc_id in rows]
+
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        user: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> List[Tuple[Document, float]]:
+        """Rank chunks by BM25 against the terms of the query.
+
+        Args:
+            query: Free text query
+            k: Number of chunks to return
+            user: Only chunks of threads started by this user
+            since: Only threads started at or after this Unix timestamp
+            until: Only threads started before this Unix timestamp
+
+        Returns:
+            List of (document, bm25 score) tuples, best first; lower scores are better
+        """
+        expression = match_query(query)
+        if not expression:
+            return []
+        sql = (
+            "SELECT chunks.id, chunks.text, chunks.metadata, bm25(chunks_fts) AS score "
+            "FROM chunks_fts JOIN chunks ON chunks.rowid = chunks_fts.rowid WHERE chunks_fts MATCH ?"
+        )
+        params = [expression]
+        if user is not None:
+            sql += " AND chunks.user = ?"
+            params.append(user)
+        if since is not None:
+            sql += " AND chunks.timestamp >= ?"
+            params.append(since)
+        if until is not None:
+            sql += " AND chunks.timestamp < ?"
+            params.append(until)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(k)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            (Document(id=doc_id, page_content=text, metadata=json.loads(metadata)), score)
+            for doc_id, text, metadata, score in rows
+        ]
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from src.ai.create_vector_db import SlackVectorDB
+from src.ai.retrieval import save_channel_info
+from src.slack.rate_limiter import RateLimitedAsyncClient
+from src.slack.slack_channel_history import AsyncSlackChannelHistory
+from src.utils.shared_state import SharedState, get_shared_state
+from src.utils.settings import env
+
+logger = logging.getLogger(__name__)
+
+LIVE_INDEXING = env("LIVE_INDEXING", "true").lower() in ("1", "true", "yes")
+# Seconds to collect changes before a batch of threads is re-indexed
+LIVE_INDEXING_INTERVAL = float(env("LIVE_INDEXING_INTERVAL", "2"))
+LIVE_INDEXING_CONCURRENCY = int(env("LIVE_INDEXING_CONCURRENCY", "4"))
+
+# Conversation types that are indexed; direct messages are left out
+INDEXED_CHANNEL_TYPES = ("channel", "group")
+
+
+def changed_thread_ts(event: Dict) -> Optional[str]:
+    """Timestamp of the top-level message whose thread a message event changes."""
+    subtype = event.get("subtype")
+    if subtype == "message_changed":
+        message = event.get("message") or {}
+        return message.get("thread_ts") or message.get("ts")
+    if subtype == "message_deleted":
+        previous = event.get("previous_message") or {}
+        return previous.get("thread_ts") or event.get("deleted_ts")
+    return event.get("thread_ts") or event.get("ts")
+
+
+class LiveIndexer:
+    def __init__(self, interval: float = LIVE_INDEXING_INTERVAL, concurrency: int = LIVE_INDEXING_CONCURRENCY, state: SharedState = None):
+        """Keep the vector store fresh from Slack message events.
+
+        Message, edit and delete events only mark their thread as changed;
+        events about the bot's own messages are dropped.
+        A background task collects changes for ``interval`` seconds, then
+        re-chunks and upserts each changed thread once, however many events
+        it received. Every channel the bot is in gets its own index, opened
+        on its first event. A channel's index has one writing process at a
+        time, so each batch writes to a channel under a shared lock.
+
+        Args:
+            interval: Seconds to collect changes before indexing them
+            concurrency: Number of threads re-indexed at the same time
+            state: State shared with other bot processes, this process's by default
+        """
+        self.interval = interval
+        self.concurrency = concurrency
+        self.state = state or get_shared_state()
+        self.client = None
+        # Identity of the bot, whose own messages are never indexed
+        self.bot_user_id = ""
+        self.bot_id = ""
+        self._indexes: Dict[str, asyncio.Task] = {}
+        self._pending: Dict[Tuple[str, str], None] = {}
+        self._wakeup = None
+        self._task = None
+
+    async def start(self):
+        """Start the background indexing task."""
+        if self._task is not None:
+            return
+        self.client = RateLimitedAsyncClient()
+        try:
+            auth = await self.client.auth_test()
+            self.bot_user_id, self.bot_id = auth.get("user_id", ""), auth.get("bot_id", "")
+        except Exception as e:
+            logger.warning(f"Could not identify the bot, its own messages will be indexed: {e}")
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Live indexing started")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _open_index(self, channel_id: str) -> Tuple[SlackVectorDB, AsyncSlackChannelHistory]:
+        history = AsyncSlackChannelHistory("", channel_id=channel_id, client=self.client)
+        info = await history.get_channel_info()
+        history.channel_name = info.get("name", "")
+        if not history.channel_name:
+            raise ValueError(f"Cannot resolve the name of channel {channel_id}")
+        # Opening the store is a blocking call
+        vector_db = await asyncio.to_thread(SlackVectorDB, history.channel_name, channel_id)
+        # A channel made private since it was backfilled stops being searched from elsewhere
+        await asyncio.to_thread(save_channel_info, history.channel_name, channel_id, info.get("is_private", True))
+        logger.info(f"Opened live index for #{history.channel_name}")
+        return vector_db, history
+
+    def _index(self, channel_id: str) -> asyncio.Task:
+        # Share one opening task per channel so concurrent batches do not race
+        task = self._indexes.get(channel_id)
+        if task is None or (task.done() and (task.cancelled() or task.exception() is not None)):
+            task = asyncio.ensure_future(self._open_index(channel_id))
+            self._indexes[channel_id] = task
+        return task
+
+    def is_own_message(self, event: Dict) -> bool:
+        """Whether a message event is about a message the bot posted, such as an answer being streamed."""
+        message = event.get("message") or event.get("previous_message") or {}
+        return any(
+            (self.bot_id and candidate.get("bot_id") == self.bot_id)
+            or (self.bot_user_id and candidate.get("user") == self.bot_user_id)
+            for candidate in (event, message)
+        )
+
+    def submit(self, event: Dict):
+        """Mark the thread changed by a message event for re-indexing."""
+        if self._task is None or event.get("channel_type") not in INDEXED_CHANNEL_TYPES:
+            return
+        if self.is_own_message(event):
+            # Placeholders and every streamed edit of an answer would each re-index the thread
+            return
+        thread_ts = changed_thread_ts(event)
+        if thread_ts and event.get("channel"):
+            self._pending[(event["channel"], thread_ts)] = None
+            self._wakeup.set()
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def reindex(channel_id: str, thread_ts: str):
+            async with semaphore:
+                try:
+                    vector_db, history = await self._index(channel_id)
+                    await vector_db.reindex_thread(history, thread_ts)
+                except Exception as e:
+                    logger.error(f"Error re-indexing thread {thread_ts} in {channel_id}: {e}")
+
+        async def reindex_channel(channel_id: str, threads: List[str]):
+            async with self.state.lock(f"index:{channel_id}"):
+                await asyncio.gather(*(reindex(channel_id, thread_ts) for thread_ts in threads))
+
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.interval)
+            self._wakeup.clear()
+            batch, self._pending = list(self._pending), {}
+            logger.info(f"Re-indexing {len(batch)} changed threads")
+            by_channel = defaultdict(list)
+            for channel_id, thread_ts in batch:
+                by_channel[channel_id].append(thread_ts)
+            await asyncio.gather(*(reindex_channel(channel_id, threads) for channel_id, threads in by_channel.items()))
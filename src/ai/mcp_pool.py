@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledSession:
+    def __init__(self, session: ClientSession, slot: int):
+        self.session = session
+        self.slot = slot
+        self.closed = asyncio.Event()
+        self.last_used = time.monotonic()
+
+
+class MCPSessionPool:
+    """Pool of long-lived MCP client sessions over SSE.
+
+    Every session is owned by a background task that opens the connection,
+    initializes it and keeps it alive until it is marked broken, then reconnects
+    with exponential backoff. The pool exposes ``list_tools``, ``call_tool``
+    and ``read_resource`` so it can be passed to ``load_mcp_tools`` in place
+    of a single session.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        size: int = 2,
+        reconnect_delay: float = 1.0,
+        max_reconnect_delay: float = 30.0,
+        ping_interval: float = 30.0,
+        ping_timeout: float = 5.0,
+        acquire_timeout: float = 30.0,
+        max_retries: int = 1,
+    ):
+        """Initialize the MCPSessionPool class.
+
+        Args:
+            url: SSE endpoint of the MCP server
+            size: Number of sessions kept open
+            reconnect_delay: Initial delay before reconnecting a dropped session
+            max_reconnect_delay: Upper bound for the reconnect backoff
+            ping_interval: Idle time after which a session is pinged before reuse
+            ping_timeout: Time allowed for the health-check ping
+            acquire_timeout: Time to wait for a free session
+            max_retries: Extra retries, on top of one per slot, when a call fails
+        """
+        self.url = url
+        self.size = max(1, size)
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.acquire_timeout = acquire_timeout
+        self.max_retries = max_retries
+
+        self._available = None
+        self._ready = None
+        self._tasks = []
+        self._in_use = set()
+        self._closing = False
+
+    async def start(self, timeout: float = None):
+        """Spawn the session tasks and wait until at least one session is ready."""
+        if not self._tasks:
+            self._closing = False
+            self._available = asyncio.Queue()
+            self._ready = asyncio.Event()
+            self._tasks = [asyncio.create_task(self._run_slot(slot)) for slot in range(self.size)]
+        await asyncio.wait_for(self._ready.wait(), timeout)
+
+    async def close(self):
+        """Close every session and stop reconnecting."""
+        self._closing = True
+        while self._available is not None and not self._available.empty():
+            self._available.get_nowait().closed.set()
+        for pooled in self._in_use:
+            pooled.closed.set()
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=5)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+
+    async def _run_slot(self, slot: int):
+        delay = self.reconnect_delay
+        while not self._closing:
+            pooled = None
+            try:
+                async with sse_client(url=self.url) as streams:
+                    async with ClientSession(*streams) as session:
+                        await session.initialize()
+                        pooled = _PooledSession(session, slot)
+                        self._available.put_nowait(pooled)
+                        self._ready.set()
+                        delay = self.reconnect_delay
+                        logger.info(f"MCP session {slot} connected to {self.url}")
+                        await pooled.closed.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"MCP session {slot} failed: {e!r}")
+            finally:
+                # The connection is gone, so a session still waiting in the pool must not be handed out
+                if pooled is not None:
+                    pooled.closed.set()
+
+            if self._closing:
+                break
+            logger.info(f"Reconnecting MCP session {slot} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _acquire(self) -> _PooledSession:
+        if not self._tasks:
+            await self.start(timeout=self.acquire_timeout)
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("No healthy MCP session available")
+            pooled = await asyncio.wait_for(self._available.get(), remaining)
+            if pooled.closed.is_set():
+                continue
+            if time.monotonic() - pooled.last_used > self.ping_interval:
+                try:
+                    await asyncio.wait_for(pooled.session.send_ping(), self.ping_timeout)
+                except Exception as e:
+                    logger.warning(f"MCP session {pooled.slot} failed health check: {e!r}")
+                    pooled.closed.set()
+                    continue
+            return pooled
+
+    @asynccontextmanager
+    async def session(self):
+        """Borrow a healthy session; it is discarded and reconnected if the caller fails."""
+        pooled = await self._acquire()
+        self._in_use.add(pooled)
+        try:
+            yield pooled.session
+        except BaseException:
+            # The request may have been interrupted mid-flight, so the stream
+            # state is unknown: drop the session and let its task reconnect.
+            pooled.closed.set()
+            raise
+        else:
+            pooled.last_used = time.monotonic()
+            if not self._closing:
+                self._available.put_nowait(pooled)
+            else:
+                pooled.closed.set()
+        finally:
+            self._in_use.discard(pooled)
+
+    async def _with_retry(self, method: str, *args, **kwargs):
+        # After a server restart every pooled session is stale, so allow one
+        # attempt per slot before the reconnected sessions come back.
+        attempts = self.size + self.max_retries
+        for attempt in range(attempts):
+            try:
+                async with self.session() as session:
+                    return await getattr(session, method)(*args, **kwargs)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt >= attempts - 1:
+                    raise
+                logger.warning(f"MCP {method} failed, retrying on another session: {e!r}")
+
+    async def list_tools(self, *args, **kwargs):
+        return await self._with_retry("list_tools", *args, **kwargs)
+
+    async def call_tool(self, name: str, arguments: dict = None, **kwargs):
+        return await self._with_retry("call_tool", name, arguments, **kwargs)
+
+    async def read_resource(self, uri):
+        return await self._with_retry("read_resource", uri)
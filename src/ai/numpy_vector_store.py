@@ -0,0 +1,408 @@
+import os
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from src.ai.vector_store import VectorStore, matches_where
+
+logger = logging.getLogger(__name__)
+
+HEADER_FILE = "index.json"
+VECTORS_FILE = "vectors.bin"
+SCALES_FILE = "scales.f32"
+LOG_FILE = "metadata.jsonl"
+DTYPES = {"float32": np.float32, "int8": np.int8}
+# Rows of an int8 matrix scored at a time, so their float32 copy stays in the CPU cache
+SCORE_BLOCK_ROWS = 1024
+
+
+class NumpyVectorStore(VectorStore):
+    """In-process vector store over a memory-mapped embedding matrix.
+
+    Unit-normalized embeddings are appended, one row per chunk, to a raw
+    float32 file, or to an int8 file with one float32 scale per row. Ids,
+    texts and metadata go to an append-only JSON-lines sidecar, which is the
+    commit point: a row only exists once its sidecar line is complete.
+    Replacing or deleting a chunk appends to the sidecar and masks the old
+    row; ``vacuum`` rewrites the files without the dead rows as a new
+    generation, which the header switches to in a single rename.
+
+    A query is one matrix-vector product over the mapped matrix, so opening
+    is just replaying the sidecar and the OS page cache is shared between
+    processes. Readers in other processes pick up appended rows on their
+    next call. A channel must only have one writing process at a time.
+    Distances are cosine distances, 1 - cosine similarity.
+    """
+
+    def __init__(self, directory: str, embedding_function: Embeddings, dtype: str = "float32"):
+        """Initialize the NumpyVectorStore class.
+
+        Args:
+            directory: Directory of the index files
+            embedding_function: Embeddings used for documents without precomputed embeddings
+            dtype: "float32", or "int8" for a quarter of the size at a small loss of precision;
+                an existing index keeps the dtype it was created with
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}, expected one of {list(DTYPES)}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.embedding_function = embedding_function
+        self.requested_dtype = dtype
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _reset(self):
+        self.dim = None
+        self.dtype = self.requested_dtype
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict] = []
+        self._rows: Dict[str, int] = {}
+        self._live = np.zeros(0, dtype=bool)
+        self._vectors = None
+        self._scales = None
+        self._log_offset = 0
+        # Generation of the data files, and the header it was read from
+        self.generation = 0
+        self._header = None
+
+    def _file(self, name: str, generation: int = None) -> str:
+        """Path of a data file of a generation, the current one by default; generation 0 has the plain names."""
+        generation = self.generation if generation is None else generation
+        root, extension = os.path.splitext(name)
+        return self._path(f"{root}.{generation}{extension}" if generation else name)
+
+    def _read_header(self) -> bool:
+        """Load the header if it was replaced since it was last read, resetting everything read from older files."""
+        try:
+            with open(self._path(HEADER_FILE), "r") as f:
+                header = json.load(f)
+        except FileNotFoundError:
+            if self._header is not None:
+                self._reset()
+            return False
+        # Generations only go up, so unlike an inode a header is never the same as an older one
+        if header == self._header:
+            return True
+        # First load, or another process vacuumed the index
+        self._reset()
+        self._header = header
+        self.dim = header["dim"]
+        self.dtype = header["dtype"]
+        self.generation = header.get("generation", 0)
+        if self.dtype != self.requested_dtype:
+            logger.warning(f"Vector index {self.directory} is {self.dtype}, ignoring requested {self.requested_dtype}")
+        return True
+
+    def _write_header(self, generation: int = None):
+        """Write the header, which switches readers to ``generation`` at once if it is a new one."""
+        tmp_path = self._path(f"{HEADER_FILE}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"dim": self.dim, "dtype": self.dtype, "generation": self.generation if generation is None else generation}, f)
+        os.replace(tmp_path, self._path(HEADER_FILE))
+
+    def _apply(self, record: Dict):
+        doc_id = record["id"]
+        previous = self._rows.pop(doc_id, None)
+        if previous is not None:
+            self._live[previous] = False
+        if record.get("deleted"):
+            return
+        row = record["row"]
+        assert row == len(self._ids), f"Vector index sidecar out of order at row {row}"
+        self._ids.append(doc_id)
+        self._documents.append(record["document"])
+        self._metadatas.append(record["metadata"])
+        self._rows[doc_id] = row
+        if row >= len(self._live):
+            self._live = np.concatenate([self._live, np.zeros(max(1024, len(self._live)), dtype=bool)])
+        self._live[row] = True
+
+    def _refresh(self):
+        """Replay sidecar lines appended since the last call and map any new rows."""
+        if not self._read_header():
+            return
+        try:
+            with open(self._file(LOG_FILE), "rb") as f:
+                f.seek(self._log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            # Nothing written yet, or a generation already vacuumed away; the next header is read next time
+            return
+        if not data:
+            return
+        # A line still being written by another process is picked up next time
+        complete = data.rfind(b"\n") + 1
+        for line in data[:complete].splitlines():
+            if line:
+                self._apply(json.loads(line))
+        self._log_offset += complete
+
+        rows = len(self._ids)
+        if rows and (self._vectors is None or len(self._vectors) != rows):
+            self._vectors = np.memmap(self._file(VECTORS_FILE), dtype=DTYPES[self.dtype], mode="r", shape=(rows, self.dim))
+            if self.dtype == "int8":
+                self._scales = np.memmap(self._file(SCALES_FILE), dtype=np.float32, mode="r", shape=(rows,))
+
+    def _encode(self, embeddings: List[List[float]]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        if self.dtype != "int8":
+            return vectors, None
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _append(self, name: str, array: np.ndarray, rows: int):
+        # Drop bytes of rows a crashed writer never committed to the sidecar
+        row_bytes = array.itemsize * (array.shape[1] if array.ndim == 2 else 1)
+        with open(self._file(name), "ab") as f:
+            f.truncate(rows * row_bytes)
+            f.write(array.tobytes())
+
+    def _append_log(self, lines: str):
+        # Drop a partial line a crashed writer left, it was never committed
+        with open(self._file(LOG_FILE), "ab") as f:
+            f.truncate(self._log_offset)
+            f.write(lines.encode())
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[Dict], embeddings: List[List[float]] = None):
+        if not ids:
+            return
+        if embeddings is None:
+            embeddings = self.embedding_function.embed_documents(documents)
+        with self._lock:
+            self._refresh()
+            vectors, scales = self._encode(embeddings)
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._write_header()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+
+            rows = len(self._ids)
+            # Vectors first, then the sidecar lines that make them visible
+            self._append(VECTORS_FILE, vectors, rows)
+            if scales is not None:
+                self._append(SCALES_FILE, scales, rows)
+            lines = "".join(
+                json.dumps({"id": doc_id, "row": rows + i, "document": document, "metadata": metadata}) + "\n"
+                for i, (doc_id, document, metadata) in enumerate(zip(ids, documents, metadatas))
+            )
+            self._append_log(lines)
+            self._refresh()
+
+    def get(self, where: Optional[Dict] = None, include_embeddings: bool = False) -> Dict[str, List]:
+        with self._lock:
+            self._refresh()
+            rows = [row for row in np.flatnonzero(self._live[:len(self._ids)]) if matches_where(self._metadatas[row], where)]
+            result = {
+                "ids": [self._ids[row] for row in rows],
+                "documents": [self._documents[row] for row in rows],
+                "metadatas": [self._metadatas[row] for row in rows],
+            }
+            if include_embeddings:
+                result["embeddings"] = [self._decode(row).tolist() for row in rows]
+            return result
+
+    def _decode(self, row: int) -> np.ndarray:
+        vector = np.asarray(self._vectors[row], dtype=np.float32)
+        return vector * self._scales[row] if self.dtype == "int8" else vector
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            self._refresh()
+            lines = "".join(json.dumps({"id": doc_id, "deleted": True}) + "\n" for doc_id in ids if doc_id in self._rows)
+            if lines:
+                self._append_log(lines)
+                self._refresh()
+
+    def _scores(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every row to every query, as a rows x queries matrix."""
+        if self.dtype != "int8":
+            return self._vectors @ queries.T
+        scores = np.empty((len(self._vectors), len(queries)), dtype=np.float32)
+        for start in range(0, len(self._vectors), SCORE_BLOCK_ROWS):
+            block = self._vectors[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = (block.astype(np.float32) @ queries.T) * self._scales[start:start + len(block), None]
+        return scores
+
+    def search_by_vector(self, embedding: List[float], k: int = 4, where: Optional[Dict] = None) -> List[Tuple[Document, float]]:
+        return self.search_by_vectors([embedding], k=k, where=where)[0]
+
+    def search_by_vectors(self, embeddings: List[List[float]], k: int = 4, where: Optional[Dict] = None) -> List[List[Tuple[Document, float]]]:
+        """Scores every query in one matrix product over the mapped matrix."""
+        with self._lock:
+            self._refresh()
+            if self._vectors is None or k <= 0 or not embeddings:
+                return [[] for _ in embeddings]
+            queries = np.asarray(embeddings, dtype=np.float32)
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            queries /= np.where(norms == 0, 1, norms)
+            scores = self._scores(queries)
+            scores[~self._live[:len(scores)]] = -np.inf
+            # Filters are evaluated once per row, not once per row and query
+            matching = {}
+            results = []
+            for column in scores.T:
+                if where is None and k < len(column):
+                    candidates = np.argpartition(-column, k)[:k]
+                    order = candidates[np.argsort(-column[candidates])]
+                else:
+                    order = np.argsort(-column)
+                hits = []
+                for row in order:
+                    if column[row] == -np.inf or len(hits) == k:
+                        break
+                    if row not in matching:
+                        matching[row] = matches_where(self._metadatas[row], where)
+                    if matching[row]:
+                        hits.append((
+                            Document(id=self._ids[row], page_content=self._documents[row], metadata=self._metadatas[row]),
+                            float(1 - column[row]),
+                        ))
+                results.append(hits)
+            return results
+
+    def vacuum(self):
+        """Rewrite the index without deleted and replaced rows.
+
+        The live rows are written as the files of the next generation, which
+        nobody reads yet, and the header is then replaced to point at them.
+        Readers in other processes reload the index when they notice the new
+        header, so they see either generation whole, never a mix of the two.
+        The previous generation is kept for readers still loading it and
+        removed by the next vacuum.
+        """
+        with self._lock:
+            self._refresh()
+            live_rows = np.flatnonzero(self._live[:len(self._ids)])
+            if len(live_rows) == len(self._ids):
+                return
+            generation = self.generation + 1
+            # Leftovers of a vacuum that crashed before switching
+            self._remove_generation(generation)
+            if len(live_rows):
+                self._write_rows(self._file(VECTORS_FILE, generation), np.asarray(self._vectors[live_rows]))
+                if self.dtype == "int8":
+                    self._write_rows(self._file(SCALES_FILE, generation), np.asarray(self._scales[live_rows]))
+            lines = "".join(
+                json.dumps({"id": self._ids[row], "row": i, "document": self._documents[row], "metadata": self._metadatas[row]}) + "\n"
+                for i, row in enumerate(live_rows)
+            )
+            with open(self._file(LOG_FILE, generation), "w") as f:
+                f.write(lines)
+            self._write_header(generation)
+            self._remove_generation(generation - 2)
+            logger.info(f"Vacuumed vector index {self.directory}: kept {len(live_rows)} of {len(self._ids)} rows")
+            self._refresh()
+
+    def _write_rows(self, path: str, array: np.ndarray):
+        with open(path, "wb") as f:
+            f.write(array.tobytes())
+
+    def _remove_generation(self, generation: int):
+        if generation < 0:
+            return
+        for name in (VECTORS_FILE, SCALES_FILE, LOG_FILE):
+            try:
+                os.remove(self._file(name, generation))
+            except FileNotFoundError:
+                pass
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _open_backend(backend: str, directory: str):
+    if backend == "chroma":
+        from src.ai.vector_store import ChromaVectorStore
+        return ChromaVectorStore("benchmark", directory, embedding_function=None)
+    return NumpyVectorStore(directory, embedding_function=None, dtype=backend.split("-")[1])
+
+
+def _build(backend: str, directory: str, rows: int, dim: int) -> float:
+    import time
+    rng = np.random.default_rng(0)
+    store = _open_backend(backend, directory)
+    started = time.perf_counter()
+    for start in range(0, rows, 5000):
+        count = min(5000, rows - start)
+        store.upsert(
+            ids=[f"doc{start + i}" for i in range(count)],
+            documents=[f"chunk {start + i}" for i in range(count)],
+            metadatas=[{"channel": "benchmark", "timestamp": float(start + i)} for i in range(count)],
+            embeddings=rng.standard_normal((count, dim), dtype=np.float32).tolist(),
+        )
+    return time.perf_counter() - started
+
+
+def _query(backend: str, directory: str, dim: int, queries: int, k: int) -> Dict[str, float]:
+    import time
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    store = _open_backend(backend, directory)
+    # The first query pays for any lazy loading, so it counts towards startup
+    store.search_by_vector(np.ones(dim).tolist(), k=k)
+    startup = time.perf_counter() - started
+
+    rng = np.random.default_rng(1)
+    latencies = []
+    for _ in range(queries):
+        embedding = rng.standard_normal(dim).tolist()
+        started = time.perf_counter()
+        store.search_by_vector(embedding, k=k)
+        latencies.append(time.perf_counter() - started)
+    latencies = np.array(latencies) * 1000
+    return {
+        "startup_ms": startup * 1000,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "rss_mb": _rss_mb(),
+        "rss_growth_mb": _rss_mb() - rss_before,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+    import multiprocessing
+
+    parser = argparse.ArgumentParser(description="Compare query latency and memory of vector store backends")
+    parser.add_argument("--rows", type=int, default=20000, help="Number of chunks in the index")
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Number of timed queries")
+    parser.add_argument("-k", type=int, default=20, help="Results per query")
+    parser.add_argument("--backends", nargs="+", default=["chroma", "numpy-float32", "numpy-int8"])
+    args = parser.parse_args()
+
+    # Every build and query runs in a fresh process so startup cost and RSS are not shared
+    context = multiprocessing.get_context("spawn")
+    print(f"{args.rows} rows x {args.dim} dims, {args.queries} queries, k={args.k}")
+    print(f"{'backend':<15}{'build s':>9}{'startup ms':>12}{'p50 ms':>9}{'p95 ms':>9}{'RSS MB':>9}{'+RSS MB':>9}")
+    for backend in args.backends:
+        with tempfile.TemporaryDirectory() as directory:
+            with context.Pool(1) as pool:
+                build = pool.apply(_build, (backend, directory, args.rows, args.dim))
+            with context.Pool(1) as pool:
+                result = pool.apply(_query, (backend, directory, args.dim, args.queries, args.k))
+        print(
+            f"{backend:<15}{build:>9.1f}{result['startup_ms']:>12.1f}{result['p50_ms']:>9.2f}"
+            f"{result['p95_ms']:>9.2f}{result['rss_mb']:>9.0f}{result['rss_growth_mb']:>9.0f}"
+        )
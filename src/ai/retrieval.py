@@ -1,23 +1,437 @@
 # Load DB chroma_slack_db and retrieve the most relevant documents for a given query
 
-from langchain_chroma.vectorstores import Chroma
+import os
+import re
+import json
+import time
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
+
 from langchain_openai import OpenAIEmbeddings
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from src.ai.keyword_index import KeywordIndex
+from src.ai.numpy_vector_store import NumpyVectorStore
+from src.ai.vector_store import ChromaVectorStore, VectorStore
+from src.utils.cache import TTLCache
+from src.utils.settings import env
+
+logger = logging.getLogger(__name__)
+
+PERSIST_DIRECTORY = "./chroma_slack_db"
+# Each channel is stored in its own sub-directory, so backfill processes never share a database
+CHANNELS_DIRECTORY = os.path.join(PERSIST_DIRECTORY, "channels")
+# Touched by ingestion after every write so other processes can drop stale results
+INDEX_VERSION_FILE = os.path.join(PERSIST_DIRECTORY, "index_version")
+# Id and privacy of a channel, next to its index
+CHANNEL_INFO_FILE = "channel.json"
+# "chroma", or "numpy" for the in-process memory-mapped index
+VECTOR_STORE_BACKEND = env("VECTOR_STORE_BACKEND", "chroma")
+# "float32", or "int8" to quantize the numpy index to a quarter of the size
+NUMPY_VECTOR_DTYPE = env("NUMPY_VECTOR_DTYPE", "float32")
+
+QUERY_EMBEDDING_CACHE_SIZE = int(env("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+QUERY_EMBEDDING_CACHE_TTL = float(env("QUERY_EMBEDDING_CACHE_TTL", "86400"))
+# Set to 0 to disable caching of search results
+RETRIEVAL_RESULT_CACHE_TTL = float(env("RETRIEVAL_RESULT_CACHE_TTL", "300"))
+# Candidates taken from each of the vector and keyword rankings before fusion
+HYBRID_CANDIDATES = int(env("HYBRID_CANDIDATES", "20"))
+# Damping constant of reciprocal-rank fusion
+RRF_K = 60
+
+query_embedding_cache = TTLCache(maxsize=QUERY_EMBEDDING_CACHE_SIZE, ttl=QUERY_EMBEDDING_CACHE_TTL)
+result_cache = TTLCache(maxsize=256, ttl=RETRIEVAL_RESULT_CACHE_TTL)
+_result_cache_version = None
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+def bump_index_version():
+    """Mark the vector store as changed, invalidating cached results in every process."""
+    os.makedirs(PERSIST_DIRECTORY, exist_ok=True)
+    with open(INDEX_VERSION_FILE, "a"):
+        os.utime(INDEX_VERSION_FILE)
+
+
+def index_version() -> int:
+    """Changes whenever any process writes to a vector store."""
+    try:
+        return os.stat(INDEX_VERSION_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def channel_persist_directory(channel: str) -> str:
+    # Channel names never contain separators, so a name can only point inside CHANNELS_DIRECTORY
+    if not channel or channel.startswith(".") or "/" in channel or "\\" in channel:
+        raise ValueError(f"Invalid channel name {channel!r}")
+    return os.path.join(CHANNELS_DIRECTORY, channel)
+
+
+def collection_name(channel: str) -> str:
+    return f"slack_{channel}_history"
+
+
+def list_channels() -> List[str]:
+    """Names of all channels that have been indexed."""
+    try:
+        return sorted(
+            entry.name for entry in os.scandir(CHANNELS_DIRECTORY)
+            if entry.is_dir() and not entry.name.startswith(".")
+        )
+    except FileNotFoundError:
+        return []
+
+
+def save_channel_info(channel: str, channel_id: str, is_private: bool):
+    """Record the id and privacy of an indexed channel, which decide who may search it."""
+    directory = channel_persist_directory(channel)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f"{CHANNEL_INFO_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"id": channel_id, "is_private": is_private}, f)
+    os.replace(tmp_path, os.path.join(directory, CHANNEL_INFO_FILE))
+
+
+def load_channel_info(channel: str) -> Dict:
+    try:
+        with open(os.path.join(channel_persist_directory(channel), CHANNEL_INFO_FILE), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def searchable_channels(mention_channel: Optional[str] = None) -> List[str]:
+    """Indexed channels a mention in ``mention_channel``, a channel id, may search.
+
+    Public channels are searched from anywhere, a private channel only from
+    a mention in it. A channel whose privacy was never recorded counts as
+    private until it is indexed again.
+    """
+    channels = []
+    for channel in list_channels():
+        info = load_channel_info(channel)
+        if not info.get("is_private", True) or (mention_channel and info.get("id") == mention_channel):
+            channels.append(channel)
+    return channels
+
+
+def open_vector_store(channel: str, embedding_function: Embeddings) -> VectorStore:
+    """Open the vector store of a channel with the configured backend."""
+    if VECTOR_STORE_BACKEND == "numpy":
+        return NumpyVectorStore(
+            os.path.join(channel_persist_directory(channel), "vectors"), embedding_function, dtype=NUMPY_VECTOR_DTYPE
+        )
+    if VECTOR_STORE_BACKEND == "chroma":
+        return ChromaVectorStore(collection_name(channel), channel_persist_directory(channel), embedding_function)
+    raise ValueError(f"Unknown VECTOR_STORE_BACKEND {VECTOR_STORE_BACKEND!r}, expected 'chroma' or 'numpy'")
+
+
+@lru_cache(maxsize=None)
+def get_embeddings():
+    return OpenAIEmbeddings(model="text-embedding-3-small")
+
+
+@lru_cache(maxsize=None)
+def load_db(channel: str = "social") -> VectorStore:
+    """Open the vector store of a channel once per process."""
+    return open_vector_store(channel, get_embeddings())
+
+
+@lru_cache(maxsize=None)
+def load_keyword_index(channel: str = "social") -> KeywordIndex:
+    """Open the keyword index of a channel once per process."""
+    return KeywordIndex(channel_persist_directory(channel))
+
+
+def embed_query(query: str) -> List[float]:
+    """Embed a query, reusing the embedding of any earlier query with the same normalized text."""
+    key = normalize_query(query)
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = get_embeddings().embed_query(query)
+        query_embedding_cache.set(key, embedding)
+    return embedding
+
 
+def embed_queries(queries: List[str]) -> List[List[float]]:
+    """Embed many queries with one embeddings call, reusing the cached embedding of any seen before."""
+    keys = [normalize_query(query) for query in queries]
+    embeddings = {key: query_embedding_cache.get(key) for key in keys}
+    missing = {key: query for key, query in zip(keys, queries) if embeddings[key] is None}
+    if missing:
+        for key, embedding in zip(missing, get_embeddings().embed_documents(list(missing.values()))):
+            query_embedding_cache.set(key, embedding)
+            embeddings[key] = embedding
+    return [embeddings[key] for key in keys]
 
-def load_db():
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-    vectordb = Chroma(collection_name="slack_social_history", persist_directory="./chroma_slack_db", embedding_function=embeddings)
-    return vectordb
 
-def retrieve(query: str, k: int = 1) -> list[Document]:
-    vectordb = load_db()
-    docs = vectordb.similarity_search(query, k=k)
+def _resolve_channels(channels: Union[str, List[str], None], mention_channel: Optional[str] = None) -> List[str]:
+    """Channels to search; names come from the model, so channels it may not search are rejected rather than opened."""
+    searchable = searchable_channels(mention_channel)
+    if channels is None or channels == "all":
+        return searchable
+    if isinstance(channels, str):
+        channels = [channels]
+    requested = list(dict.fromkeys(channel.lstrip("#") for channel in channels))
+    # Private channels the mention may not search are reported like channels that do not exist
+    unknown = [channel for channel in requested if channel not in searchable]
+    if unknown:
+        raise ValueError(f"Unknown channels {', '.join(unknown)}; searchable channels are {', '.join(searchable)}")
+    return requested
+
+
+def parse_date(value: Union[str, float, None], end: bool = False) -> Optional[float]:
+    """Unix timestamp of an ISO date or datetime.
+
+    With ``end``, a bare date such as 2024-05-31 means the end of that day,
+    so the date range includes it.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed.timestamp()
+
+
+def metadata_filter(user: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None) -> Optional[Dict]:
+    """Vector store where clause for the thread author and a [since, until) range of thread start times."""
+    conditions = []
+    if user is not None:
+        conditions.append({"user": user})
+    if since is not None:
+        conditions.append({"timestamp": {"$gte": since}})
+    if until is not None:
+        conditions.append({"timestamp": {"$lt": until}})
+    if len(conditions) > 1:
+        return {"$and": conditions}
+    return conditions[0] if conditions else None
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int = RRF_K) -> List[Tuple[Document, float]]:
+    """Merge rankings by summing 1 / (k + rank) per document id, highest first."""
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            scores[document.id] = scores.get(document.id, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(document.id, document)
+    return sorted(((documents[doc_id], score) for doc_id, score in scores.items()), key=lambda hit: -hit[1])
+
+
+@contextmanager
+def _timed(timings: Dict[str, float], stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - started) * 1000
+
+
+def search_with_scores(
+    query: str,
+    k: int = 3,
+    channels: Union[str, List[str], None] = None,
+    user: Optional[str] = None,
+    since: Union[str, float, None] = None,
+    until: Union[str, float, None] = None,
+    mention_channel: Optional[str] = None,
+) -> List[Tuple[Document, float]]:
+    """Hybrid vector and BM25 search over one channel, a list of channels or all indexed channels.
+
+    The query is embedded once. Each channel contributes its top candidates
+    from the vector store and from the keyword index, both restricted by the
+    metadata filters; the two rankings are merged across channels and fused
+    with reciprocal-rank fusion, so exact ticket ids, error codes and names
+    are found even when their embedding is not close to the query.
+
+    Args:
+        query: Query to search for
+        k: Number of documents to return
+        channels: Channel name, list of channel names, or None / "all" for every searchable channel
+        user: Only threads started by this user, as named in the transcript
+        since: Only threads started on or after this date or Unix timestamp
+        until: Only threads started on or before this date, or before this Unix timestamp
+        mention_channel: Id of the channel the question was asked in, which may be private
+
+    Returns:
+        List of (document, fused score) tuples, highest score first
+    """
+    return search_many_with_scores(
+        [query], k=k, channels=channels, user=user, since=since, until=until, mention_channel=mention_channel
+    )[0]
+
+
+def search_many_with_scores(
+    queries: List[str],
+    k: int = 3,
+    channels: Union[str, List[str], None] = None,
+    user: Optional[str] = None,
+    since: Union[str, float, None] = None,
+    until: Union[str, float, None] = None,
+    mention_channel: Optional[str] = None,
+) -> List[List[Tuple[Document, float]]]:
+    """Hybrid search for many queries at once, with the same filters.
+
+    The queries are embedded in one call and each channel's vector store is
+    searched for all of them in one pass; keyword search and fusion then run
+    per query as in ``search_with_scores``.
+
+    Returns:
+        One list of (document, fused score) tuples per query, highest score first
+    """
+    since, until = parse_date(since), parse_date(until, end=True)
+    # An empty name from the model means no author filter, for the vector and the keyword search alike
+    user = user or None
+    where = metadata_filter(user, since, until)
+    candidates = max(k, HYBRID_CANDIDATES)
+    timings = {}
+    vector_hits = [[] for _ in queries]
+    keyword_hits = [[] for _ in queries]
+
+    with _timed(timings, "embed"):
+        embeddings = embed_queries(queries) if queries else []
+    for channel in _resolve_channels(channels, mention_channel):
+        with _timed(timings, "vector"):
+            for hits, channel_hits in zip(vector_hits, load_db(channel).search_by_vectors(embeddings, k=candidates, where=where)):
+                hits.extend(channel_hits)
+        with _timed(timings, "keyword"):
+            keyword_index = load_keyword_index(channel)
+            for hits, query in zip(keyword_hits, queries):
+                hits.extend(keyword_index.search(query, k=candidates, user=user, since=since, until=until))
+
+    results = []
+    with _timed(timings, "fuse"):
+        for query_vector_hits, query_keyword_hits in zip(vector_hits, keyword_hits):
+            # Both scores are lower-is-better; keyword hits of different channels are ranked by BM25 alike
+            query_vector_hits.sort(key=lambda hit: hit[1])
+            query_keyword_hits.sort(key=lambda hit: hit[1])
+            results.append(reciprocal_rank_fusion([
+                [doc for doc, _ in query_vector_hits[:candidates]],
+                [doc for doc, _ in query_keyword_hits[:candidates]],
+            ])[:k])
+
+    logger.info(
+        f"Hybrid search for {len(queries)} queries returned {sum(len(hits) for hits in results)} of "
+        f"{sum(len(hits) for hits in vector_hits)} vector and {sum(len(hits) for hits in keyword_hits)} keyword hits in "
+        f"{sum(timings.values()):.1f}ms (" + ", ".join(f"{stage} {ms:.1f}ms" for stage, ms in timings.items()) + ")"
+    )
+    return results
+
+
+def search(query: str, k: int = 3, channels: Union[str, List[str], None] = None, **filters) -> List[Document]:
+    return [doc for doc, _ in search_with_scores(query, k=k, channels=channels, **filters)]
+
+
+def retrieve(
+    query: str,
+    k: int = 3,
+    channels: Union[str, List[str], None] = None,
+    user: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    mention_channel: Optional[str] = None,
+) -> list[Document]:
+    global _result_cache_version
+    resolved_channels = tuple(sorted(_resolve_channels(channels, mention_channel)))
+    cache_key = (normalize_query(query), k, resolved_channels, user, since, until)
+    if RETRIEVAL_RESULT_CACHE_TTL:
+        version = index_version()
+        if version != _result_cache_version:
+            result_cache.clear()
+            _result_cache_version = version
+        output = result_cache.get(cache_key)
+        if output is not None:
+            return output
+
+    docs = search(
+        query, k=k, channels=list(resolved_channels), user=user, since=since, until=until, mention_channel=mention_channel
+    )
     output = ""
     for doc in docs:
         output += doc.page_content + "\n"
         output += f"Link: {doc.metadata['permalink_to_message']}\n"
+
+    if RETRIEVAL_RESULT_CACHE_TTL:
+        result_cache.set(cache_key, output)
     return output
 
+def document_result(doc: Document) -> Dict:
+    """Structured form of a chunk returned to the agent."""
+    metadata = doc.metadata
+    return {
+        "id": doc.id,
+        "channel": metadata.get("channel"),
+        "user": metadata.get("user"),
+        "date": datetime.fromtimestamp(float(metadata["message_ts"])).strftime("%Y-%m-%d %H:%M") if metadata.get("message_ts") else None,
+        "link": metadata.get("permalink_to_message"),
+        "content": doc.page_content,
+    }
+
+
+def retrieve_many(
+    queries: List[str],
+    k: int = 3,
+    channels: Union[str, List[str], None] = None,
+    user: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    mention_channel: Optional[str] = None,
+) -> List[Dict]:
+    """Search for several queries at once and merge their hits.
+
+    A chunk found by more than one query is returned once, with its best
+    fused score and every query that found it.
+
+    Returns:
+        Structured results, highest score first
+    """
+    queries = list(dict.fromkeys(query for query in queries if query.strip()))
+    merged = {}
+    hits_per_query = search_many_with_scores(
+        queries, k=k, channels=channels, user=user, since=since, until=until, mention_channel=mention_channel
+    )
+    for query, hits in zip(queries, hits_per_query):
+        for doc, score in hits:
+            result = merged.get(doc.id)
+            if result is None:
+                merged[doc.id] = result = {**document_result(doc), "score": score, "queries": []}
+            result["score"] = max(result["score"], score)
+            result["queries"].append(query)
+    results = sorted(merged.values(), key=lambda result: -result["score"])
+    for result in results:
+        result["score"] = round(result["score"], 4)
+    return results
+
+
+def get_document(doc_id: str, mention_channel: Optional[str] = None) -> Optional[Dict]:
+    """A chunk by id, with the ids of the chunks before and after it in the same thread.
+
+    Ids are ``channel:message_ts:chunk_index``, as given in search results,
+    and only chunks of channels the mention may search are returned.
+    """
+    parts = doc_id.rsplit(":", 2)
+    if len(parts) != 3 or parts[0] not in searchable_channels(mention_channel) or not parts[2].isdigit():
+        return None
+    channel, message_ts, chunk_index = parts[0], parts[1], int(parts[2])
+    previous_id, next_id = (f"{channel}:{message_ts}:{index}" for index in (chunk_index - 1, chunk_index + 1))
+    found = {doc.id: doc for doc in load_keyword_index(channel).get([doc_id, previous_id, next_id])}
+    if doc_id not in found:
+        return None
+    return {
+        **document_result(found[doc_id]),
+        "previous_id": previous_id if previous_id in found else None,
+        "next_id": next_id if next_id in found else None,
+    }
+
 if __name__ == "__main__":
     retrieve("Unit testing")
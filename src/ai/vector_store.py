@@ -0,0 +1,132 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_chroma.vectorstores import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+
+class VectorStore(ABC):
+    """Storage of chunk embeddings used by ingestion and retrieval.
+
+    Metadata filters use Chroma's ``where`` syntax, whatever the backend.
+    Distances are lower-is-better and comparable within one backend only.
+    """
+
+    embedding_function: Embeddings
+
+    @abstractmethod
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[Dict], embeddings: List[List[float]] = None):
+        """Insert or replace chunks, embedding the documents if no embeddings are given."""
+
+    @abstractmethod
+    def get(self, where: Optional[Dict] = None, include_embeddings: bool = False) -> Dict[str, List]:
+        """Chunks matching the filter, as parallel ``ids``, ``documents`` and ``metadatas`` lists (and ``embeddings``)."""
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """Delete chunks by id; unknown ids are ignored."""
+
+    @abstractmethod
+    def search_by_vector(self, embedding: List[float], k: int = 4, where: Optional[Dict] = None) -> List[Tuple[Document, float]]:
+        """Top k chunks closest to the embedding, as (document, distance) tuples, closest first."""
+
+    def search_by_vectors(self, embeddings: List[List[float]], k: int = 4, where: Optional[Dict] = None) -> List[List[Tuple[Document, float]]]:
+        """Top k chunks for each of many embeddings, in one pass where the backend allows it."""
+        return [self.search_by_vector(embedding, k=k, where=where) for embedding in embeddings]
+
+    def add_documents(self, documents: List[Document]):
+        """Upsert documents under their ``id``."""
+        self.upsert(
+            ids=[document.id for document in documents],
+            documents=[document.page_content for document in documents],
+            metadatas=[document.metadata for document in documents],
+        )
+
+    def vacuum(self):
+        """Reclaim space left by deleted and replaced chunks, if the backend needs it."""
+
+
+class ChromaVectorStore(VectorStore):
+    """VectorStore backed by a persistent Chroma collection."""
+
+    def __init__(self, collection_name: str, persist_directory: str, embedding_function: Embeddings):
+        """Initialize the ChromaVectorStore class.
+
+        Args:
+            collection_name: Name of the Chroma collection
+            persist_directory: Directory of the Chroma database
+            embedding_function: Embeddings used for documents without precomputed embeddings
+        """
+        self.embedding_function = embedding_function
+        self.db = Chroma(
+            collection_name=collection_name,
+            persist_directory=persist_directory,
+            embedding_function=embedding_function,
+        )
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[Dict], embeddings: List[List[float]] = None):
+        if not ids:
+            return
+        if embeddings is None:
+            embeddings = self.embedding_function.embed_documents(documents)
+        self.db._collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def get(self, where: Optional[Dict] = None, include_embeddings: bool = False) -> Dict[str, List]:
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        return self.db.get(where=where, include=include)
+
+    def delete(self, ids: List[str]):
+        if ids:
+            self.db.delete(ids=ids)
+
+    def search_by_vector(self, embedding: List[float], k: int = 4, where: Optional[Dict] = None) -> List[Tuple[Document, float]]:
+        return self.db.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=where)
+
+    def search_by_vectors(self, embeddings: List[List[float]], k: int = 4, where: Optional[Dict] = None) -> List[List[Tuple[Document, float]]]:
+        if not embeddings:
+            return []
+        results = self.db._collection.query(
+            query_embeddings=embeddings, n_results=k, where=where, include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [
+                (Document(id=doc_id, page_content=document, metadata=metadata or {}), distance)
+                for doc_id, document, metadata, distance in zip(ids, documents, metadatas, distances)
+            ]
+            for ids, documents, metadatas, distances in zip(
+                results["ids"], results["documents"], results["metadatas"], results["distances"]
+            )
+        ]
+
+
+_OPERATORS = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$gt": lambda value, operand: value is not None and value > operand,
+    "$gte": lambda value, operand: value is not None and value >= operand,
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$lte": lambda value, operand: value is not None and value <= operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+}
+
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict]) -> bool:
+    """Evaluate a Chroma ``where`` filter against one metadata dict, for in-process backends."""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            if not all(_OPERATORS[operator](value, operand) for operator, operand in condition.items()):
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
@@ -0,0 +1,196 @@
+import json
+import time
+import random
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, List, Set
+
+from aiohttp import web
+
+from src.bench.workspace import BOT_USER_ID, Workspace
+
+logger = logging.getLogger(__name__)
+
+# Methods that answer 429 with the configured probability
+RATE_LIMITED_METHODS = {"conversations.history", "conversations.replies", "conversations.list", "users.list", "users.info"}
+
+
+def _public(message: Dict) -> Dict:
+    return {key: value for key, value in message.items() if key != "topic"}
+
+
+class FakeSlackServer:
+    """Slack Web API server over a synthetic workspace, for offline benchmarks.
+
+    Serves the methods the bot calls under ``/api/``, with cursor pagination,
+    a configurable response latency and randomly injected 429s carrying a
+    Retry-After header. Messages posted with chat.postMessage become part of
+    the workspace, and the time of every chat.postMessage and chat.update is
+    recorded so time to first visible reply can be measured.
+    """
+
+    def __init__(
+        self,
+        workspace: Workspace,
+        latency: float = 0.02,
+        jitter: float = 0.01,
+        max_page_size: int = 200,
+        rate_limit_probability: float = 0.0,
+        retry_after: float = 0.2,
+        rate_limited_methods: Set[str] = RATE_LIMITED_METHODS,
+        seed: int = 0,
+    ):
+        """Initialize the FakeSlackServer class.
+
+        Args:
+            workspace: The workspace to serve
+            latency: Seconds every response is delayed by
+            jitter: Up to this many more seconds, drawn uniformly per response
+            max_page_size: Largest page returned, whatever ``limit`` is asked for
+            rate_limit_probability: Chance a call of a rate-limited method gets a 429
+            retry_after: Retry-After seconds sent with a 429
+            rate_limited_methods: Methods 429s are injected into
+            seed: Seed of the latency and 429 draws
+        """
+        self.workspace = workspace
+        self.latency = latency
+        self.jitter = jitter
+        self.max_page_size = max_page_size
+        self.rate_limit_probability = rate_limit_probability
+        self.retry_after = retry_after
+        self.rate_limited_methods = rate_limited_methods
+        self.random = random.Random(seed)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.rate_limited: Dict[str, int] = defaultdict(int)
+        # Monotonic times of replies posted and edited, by message ts
+        self.posted_at: Dict[str, float] = {}
+        self.updated_at: Dict[str, List[float]] = defaultdict(list)
+        # Replies the bot posted, by (channel, thread_ts)
+        self.bot_replies: Dict[tuple, List[str]] = defaultdict(list)
+        self.url = ""
+        self._runner = None
+
+    async def start(self, port: int = 0) -> str:
+        """Start serving on localhost.
+
+        Returns:
+            Base URL to use as SLACK_API_URL
+        """
+        server = web.Application()
+        server.router.add_route("*", "/api/{method}", self.handle)
+        self._runner = web.AppRunner(server, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/api/"
+        return self.url
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def reset_counts(self):
+        self.calls.clear()
+        self.rate_limited.clear()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(request.query)
+        if request.content_type == "application/json":
+            params.update(await request.json())
+        else:
+            params.update(await request.post())
+        self.calls[method] += 1
+        await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+        if method in self.rate_limited_methods and self.random.random() < self.rate_limit_probability:
+            self.rate_limited[method] += 1
+            return web.json_response(
+                {"ok": False, "error": "ratelimited"}, status=429, headers={"Retry-After": str(self.retry_after)}
+            )
+        handler = getattr(self, "_" + method.replace(".", "_"), None)
+        if handler is None:
+            return web.json_response({"ok": False, "error": "unknown_method"})
+        try:
+            return web.json_response({"ok": True, **handler(params)}, dumps=json.dumps)
+        except KeyError as e:
+            return web.json_response({"ok": False, "error": str(e.args[0])})
+
+    def _page(self, items: List, params: Dict, key: str) -> Dict:
+        start = int(params.get("cursor") or 0)
+        limit = min(int(params.get("limit") or 100), self.max_page_size)
+        page = items[start:start + limit]
+        more = start + limit < len(items)
+        return {key: page, "has_more": more, "response_metadata": {"next_cursor": str(start + limit) if more else ""}}
+
+    def _channel(self, params: Dict) -> str:
+        channel = params.get("channel", "")
+        if channel not in self.workspace.channels:
+            raise KeyError("channel_not_found")
+        return channel
+
+    def _auth_test(self, params: Dict) -> Dict:
+        return {"url": "https://bench.slack.com/", "team": "bench", "team_id": "TBENCH", "user": "botai", "user_id": BOT_USER_ID, "bot_id": "BBENCH"}
+
+    def _conversations_list(self, params: Dict) -> Dict:
+        # Like Slack, only public channels unless private ones are asked for
+        types = set((params.get("types") or "public_channel").split(","))
+        channels = [
+            {**channel, "is_channel": True, "is_member": True} for channel in self.workspace.channels.values()
+            if ("private_channel" if channel["is_private"] else "public_channel") in types
+        ]
+        return self._page(channels, params, "channels")
+
+    def _conversations_info(self, params: Dict) -> Dict:
+        return {"channel": self.workspace.channels[self._channel(params)]}
+
+    def _conversations_history(self, params: Dict) -> Dict:
+        oldest = float(params.get("oldest") or 0)
+        latest = float(params.get("latest") or "inf")
+        messages = [
+            _public(message) for message in reversed(self.workspace.messages[self._channel(params)])
+            if oldest < float(message["ts"]) <= latest
+        ]
+        return self._page(messages, params, "messages")
+
+    def _conversations_replies(self, params: Dict) -> Dict:
+        channel = self._channel(params)
+        root = self.workspace.find(channel, params.get("ts", ""))
+        if root is None:
+            raise KeyError("thread_not_found")
+        oldest = float(params.get("oldest") or 0)
+        thread = [root] + [reply for reply in self.workspace.replies.get((channel, root["ts"]), []) if float(reply["ts"]) > oldest]
+        return self._page([_public(message) for message in thread], params, "messages")
+
+    def _users_list(self, params: Dict) -> Dict:
+        return self._page(list(self.workspace.users.values()), params, "members")
+
+    def _users_info(self, params: Dict) -> Dict:
+        user = self.workspace.users.get(params.get("user", ""))
+        if user is None:
+            raise KeyError("user_not_found")
+        return {"user": user}
+
+    def _chat_getPermalink(self, params: Dict) -> Dict:
+        channel = self._channel(params)
+        return {"channel": channel, "permalink": f"https://bench.slack.com/archives/{channel}/p{params['message_ts'].replace('.', '')}"}
+
+    def _chat_postMessage(self, params: Dict) -> Dict:
+        channel = self._channel(params)
+        thread_ts = params.get("thread_ts", "")
+        message = self.workspace.post(channel, BOT_USER_ID, params.get("text", ""), thread_ts=thread_ts)
+        message["bot_id"] = "BBENCH"
+        self.posted_at[message["ts"]] = time.monotonic()
+        self.bot_replies[(channel, thread_ts or message["ts"])].append(message["ts"])
+        return {"channel": channel, "ts": message["ts"], "message": _public(message)}
+
+    def _chat_update(self, params: Dict) -> Dict:
+        channel = self._channel(params)
+        message = self.workspace.find(channel, params.get("ts", ""))
+        if message is None:
+            raise KeyError("message_not_found")
+        message["text"] = params.get("text", "")
+        self.updated_at[message["ts"]].append(time.monotonic())
+        return {"channel": channel, "ts": message["ts"], "text": message["text"]}
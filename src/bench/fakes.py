@@ -0,0 +1,152 @@
+import re
+import json
+import time
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+WORD_PATTERN = re.compile(r"[\w-]+")
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic embeddings from hashed words, with no model or network.
+
+    Each word adds a signed one to a dimension picked by its hash, so texts
+    sharing words are close and the same text always gets the same vector.
+    """
+
+    def __init__(self, dim: int = 256, latency: float = 0.0):
+        """Initialize the HashEmbeddings class.
+
+        Args:
+            dim: Embedding dimension
+            latency: Seconds every call takes, to stand in for an embeddings API
+        """
+        self.dim = dim
+        self.latency = latency
+        self.model = f"hash-{dim}"
+        self.calls = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in WORD_PATTERN.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def _prompt_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(message.content if isinstance(message.content, str) else str(message.content) for message in messages)
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic chat model that calls tools the way the agent expects.
+
+    With tools bound and no tool result in the prompt yet, it calls the first
+    tool with the last words of the conversation as the query. Once a tool
+    result is in the prompt it answers in the JSON format of the answer
+    parser, quoting the start of that result. Without tools, for example for
+    summaries, it returns a short summary. Responses wait ``latency`` seconds
+    before the first token and then stream ``chunk_size`` characters every
+    ``token_interval`` seconds, and report token usage.
+    """
+
+    model_name: str = "gpt-4o-mini"
+    latency: float = 0.3
+    token_interval: float = 0.01
+    chunk_size: int = 8
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _respond(self, messages: List[BaseMessage], tools: Optional[List] = None) -> AIMessage:
+        self.calls += 1
+        prompt = _prompt_text(messages)
+        conversation = prompt.split("Conversation:", 1)[-1]
+        if tools and "ToolMessage(" not in conversation:
+            # The conversation is the repr of the thread message, so its lines are escaped
+            thread = conversation.split("AIMessage(", 1)[0].split("additional_kwargs", 1)[0]
+            query = " ".join(WORD_PATTERN.findall(thread.replace("\\n", "\n").strip().splitlines()[-1])[-12:])
+            name = tools[0]["function"]["name"]
+            return AIMessage(content="", tool_calls=[{"name": name, "args": {"query": query}, "id": f"call_{self.calls}"}])
+        if tools:
+            result = conversation.split("ToolMessage(content=", 1)[-1][1:]
+            quote = " ".join(result.replace("\\n", " ").split()[:30])
+            content = json.dumps({
+                "analysis": "The search results mention this topic, so I summarize the most relevant thread.",
+                "answer": f"Based on earlier discussions: {quote}",
+            }, ensure_ascii=False)
+            return AIMessage(content=f"```json\n{content}\n```")
+        words = WORD_PATTERN.findall(prompt)
+        return AIMessage(content="Summary: " + " ".join(words[-40:]))
+
+    def _usage(self, messages: List[BaseMessage], message: AIMessage) -> dict:
+        output = message.content + json.dumps([call["args"] for call in message.tool_calls])
+        input_tokens, output_tokens = len(_prompt_text(messages)) // 4, len(output) // 4
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        message = self._respond(messages, kwargs.get("tools"))
+        message.usage_metadata = self._usage(messages, message)
+        time.sleep(self.token_interval * len(message.content) / self.chunk_size)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        chunks = [chunk.message async for chunk in self._astream(messages, stop, run_manager, **kwargs)]
+        message = chunks[0]
+        for chunk in chunks[1:]:
+            message += chunk
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(
+            content=message.content, tool_calls=message.tool_calls, usage_metadata=message.usage_metadata
+        ))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        result = self._generate(messages, stop, run_manager, **kwargs)
+        message = result.generations[0].message
+        yield ChatGenerationChunk(message=AIMessageChunk(content=message.content, tool_calls=message.tool_calls, usage_metadata=message.usage_metadata))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        message = self._respond(messages, kwargs.get("tools"))
+        usage = self._usage(messages, message)
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": index}
+                    for index, call in enumerate(message.tool_calls)
+                ],
+                usage_metadata=usage,
+            ))
+            return
+        content = message.content
+        for start in range(0, len(content), self.chunk_size):
+            if start:
+                await asyncio.sleep(self.token_interval)
+            last = start + self.chunk_size >= len(content)
+            chunk = AIMessageChunk(content=content[start:start + self.chunk_size], usage_metadata=usage if last else None)
+            yield ChatGenerationChunk(message=chunk)
@@ -0,0 +1,245 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+from typing import Dict, List
+
+from src.bench.fake_slack import FakeSlackServer
+from src.bench.fakes import FakeChatModel, HashEmbeddings
+from src.bench.workspace import Workspace
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+
+def peak_memory_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark against a fake Slack workspace")
+    parser.add_argument("--users", type=int, default=50, help="Users in the workspace")
+    parser.add_argument("--channels", type=int, default=4, help="Channels in the workspace")
+    parser.add_argument("--threads", type=int, default=150, help="Top-level messages per channel")
+    parser.add_argument("--mean-replies", type=float, default=5, help="Mean replies per thread")
+    parser.add_argument("--max-replies", type=int, default=300, help="Longest thread")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds added to every Slack API response")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Up to this many more seconds per response")
+    parser.add_argument("--page-size", type=int, default=200, help="Largest page the fake Slack API returns")
+    parser.add_argument("--rate-limit", type=float, default=0.02, help="Chance of a 429 per read call during ingestion")
+    parser.add_argument("--rate-share", type=float, default=100.0,
+                        help="Multiple of the real Slack rate tiers the bot may use; 1 reproduces production pacing")
+    parser.add_argument("--backend", default="chroma", choices=["chroma", "numpy"], help="Vector store backend")
+    parser.add_argument("--queries", type=int, default=200, help="Timed retrieval queries")
+    parser.add_argument("--mentions", type=int, default=20, help="Mentions answered")
+    parser.add_argument("--concurrency", type=int, default=4, help="Mentions answered at the same time")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds before the fake model's first token")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Seconds per fake embeddings call")
+    parser.add_argument("--prefetch", action="store_true", help="Search for the question during the first LLM call")
+    parser.add_argument("--stream-interval", type=float, default=0.2, help="Seconds between streamed edits")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Keep the application's INFO logs")
+    return parser.parse_args(argv)
+
+
+async def ingest(workspace: Workspace, server: FakeSlackServer, embeddings: HashEmbeddings, args) -> Dict:
+    from src.ai.create_vector_db import SlackVectorDB
+
+    server.reset_counts()
+    server.rate_limit_probability = args.rate_limit
+    started = time.monotonic()
+    for channel in workspace.channels.values():
+        db = SlackVectorDB(channel_name=channel["name"], channel_id=channel["id"], embeddings=embeddings)
+        await db.aprocess_channel_history(rate_share=args.rate_share)
+    elapsed = time.monotonic() - started
+    server.rate_limit_probability = 0.0
+    return {
+        "messages": workspace.message_count,
+        "seconds": round(elapsed, 3),
+        "messages_per_second": round(workspace.message_count / elapsed, 1),
+        "api_calls": sum(server.calls.values()),
+        "rate_limited": sum(server.rate_limited.values()),
+        "peak_memory_mb": round(peak_memory_mb(), 1),
+    }
+
+
+async def search(workspace: Workspace, args) -> Dict:
+    from src.ai import retrieval
+
+    queries = workspace.queries(args.queries)
+    # Open every store and warm the code paths before timing
+    await asyncio.to_thread(retrieval.retrieve, queries[0], 3)
+    latencies = []
+    started = time.monotonic()
+    for query in queries:
+        query_started = time.perf_counter()
+        await asyncio.to_thread(retrieval.retrieve, query, 3)
+        latencies.append((time.perf_counter() - query_started) * 1000)
+    elapsed = time.monotonic() - started
+    return {
+        "queries": len(queries),
+        "qps": round(len(queries) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.5), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "peak_memory_mb": round(peak_memory_mb(), 1),
+    }
+
+
+async def answer_mentions(workspace: Workspace, server: FakeSlackServer, model: FakeChatModel, args) -> Dict:
+    from langchain_core.tools import tool
+    from slack_bolt.context.say.async_say import AsyncSay
+
+    from src.ai import ai_agent, retrieval
+    from src.core import app as bot
+    from src.utils.metrics import metrics
+
+    @tool
+    async def retrieve_related_docs(query: str, k: int = 3) -> str:
+        """Retrieve related documents by meaning and by exact keywords such as ticket ids, error codes and names"""
+        return await asyncio.to_thread(retrieval.retrieve, query, k)
+
+    # The agent and conversation summaries run on the fake model, with retrieval in-process instead of over MCP
+    ai_agent.llm = model
+    ai_agent.agent_manager._graph = ai_agent.build_graph([retrieve_related_docs])
+    bot.conversation_builder.model = model
+    bot.reply_client.rate_share = args.rate_share
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    totals, first_posts, first_updates = [], [], []
+
+    async def mention(channel_id: str, thread_ts: str, text: str):
+        async with semaphore:
+            message = workspace.post(channel_id, workspace.random.choice(list(workspace.users)), text, thread_ts=thread_ts)
+            event = {"type": "app_mention", "channel": channel_id, "ts": message["ts"], "user": message["user"], "text": text}
+            if thread_ts:
+                event["thread_ts"] = thread_ts
+            started = time.monotonic()
+            await bot.answer_mention(event, AsyncSay(client=bot.app.client, channel=channel_id))
+            totals.append((time.monotonic() - started) * 1000)
+            replies = [ts for ts in server.bot_replies[(channel_id, thread_ts or message["ts"])] if server.posted_at[ts] >= started]
+            if replies:
+                first_posts.append((server.posted_at[replies[0]] - started) * 1000)
+                updates = [at for ts in replies for at in server.updated_at.get(ts, [])]
+                if updates:
+                    first_updates.append((min(updates) - started) * 1000)
+
+    started = time.monotonic()
+    await asyncio.gather(*(mention(*target) for target in workspace.mention_targets(args.mentions)))
+    elapsed = time.monotonic() - started
+    stages = {
+        name: {"p50": histogram["p50"], "p95": histogram["p95"], "count": histogram["count"]}
+        for name, histogram in metrics.snapshot()["histograms_ms"].items()
+    }
+    return {
+        "mentions": len(totals),
+        "seconds": round(elapsed, 3),
+        "p50_ms": round(percentile(totals, 0.5), 1),
+        "p95_ms": round(percentile(totals, 0.95), 1),
+        "placeholder_p50_ms": round(percentile(first_posts, 0.5), 1),
+        "first_update_p50_ms": round(percentile(first_updates, 0.5), 1),
+        "first_update_p95_ms": round(percentile(first_updates, 0.95), 1),
+        "llm_calls": model.calls,
+        "stages_ms": stages,
+        "peak_memory_mb": round(peak_memory_mb(), 1),
+    }
+
+
+async def run(args) -> Dict:
+    workspace = Workspace(
+        users=args.users, channels=args.channels, threads_per_channel=args.threads,
+        mean_replies=args.mean_replies, max_replies=args.max_replies, seed=args.seed,
+    )
+    server = FakeSlackServer(workspace, latency=args.latency, jitter=args.jitter, max_page_size=args.page_size, seed=args.seed)
+    url = await server.start()
+
+    # Settings are read at import time, so they must be in place before the first src import
+    os.environ.update({
+        "SLACK_API_URL": url,
+        "SLACK_BOT_TOKEN": "xoxb-bench",
+        "SLACK_APP_TOKEN": "xapp-bench",
+        "OPENAI_API_KEY": "sk-bench",
+        "VECTOR_STORE_BACKEND": args.backend,
+        "RETRIEVAL_RESULT_CACHE_TTL": "0",
+        "ANSWER_CACHE": "false",
+        "LIVE_INDEXING": "false",
+        "STREAM_ANSWERS": "true",
+        "STREAM_UPDATE_INTERVAL": str(args.stream_interval),
+        "PREFETCH_RETRIEVAL": "true" if args.prefetch else "false",
+        "METRICS_LOG": os.path.abspath("metrics.jsonl"),
+    })
+    from src.ai import retrieval
+    from src.slack.slack_channel_history import close_async_client
+
+    embeddings = HashEmbeddings(latency=args.embed_latency)
+    # Queries are embedded with the same fake model the history was indexed with
+    retrieval.get_embeddings = lambda: embeddings
+    model = FakeChatModel(latency=args.llm_latency)
+    results = {"workspace": {
+        "users": len(workspace.users), "channels": len(workspace.channels),
+        "threads": len(workspace.replies), "messages": workspace.message_count,
+    }}
+    try:
+        results["ingestion"] = await ingest(workspace, server, embeddings, args)
+        results["retrieval"] = await search(workspace, args)
+        results["mentions"] = await answer_mentions(workspace, server, model, args)
+    finally:
+        await close_async_client()
+        await server.close()
+    results["slack_calls"] = dict(server.calls)
+    results["peak_memory_mb"] = round(peak_memory_mb(), 1)
+    return results
+
+
+def print_report(results: Dict):
+    workspace, ingestion, retrieval, mentions = (results[key] for key in ("workspace", "ingestion", "retrieval", "mentions"))
+    print(f"Workspace: {workspace['users']} users, {workspace['channels']} channels, {workspace['threads']} threads, {workspace['messages']} messages")
+    print(
+        f"Ingestion: {ingestion['messages_per_second']} messages/s ({ingestion['messages']} in {ingestion['seconds']}s, "
+        f"{ingestion['api_calls']} API calls, {ingestion['rate_limited']} rate limited)"
+    )
+    print(f"Retrieval: {retrieval['qps']} queries/s (p50 {retrieval['p50_ms']}ms, p95 {retrieval['p95_ms']}ms)")
+    print(
+        f"Mentions:  p50 {mentions['p50_ms']}ms, p95 {mentions['p95_ms']}ms; placeholder p50 {mentions['placeholder_p50_ms']}ms, "
+        f"first update p50 {mentions['first_update_p50_ms']}ms, p95 {mentions['first_update_p95_ms']}ms"
+    )
+    print(f"{'stage':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, stage in mentions["stages_ms"].items():
+        print(f"{name:<28}{stage['count']:>7}{stage['p50']:>10.1f}{stage['p95']:>10.1f}")
+    print(
+        f"Peak memory: {results['peak_memory_mb']} MB (after ingestion {ingestion['peak_memory_mb']} MB, "
+        f"retrieval {retrieval['peak_memory_mb']} MB)"
+    )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    directory = tempfile.TemporaryDirectory(prefix="slack-bot-bench-")
+    # Indexes, snapshots and watermarks are written relative to the working directory
+    cwd = os.getcwd()
+    os.chdir(directory.name)
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        os.chdir(cwd)
+        directory.cleanup()
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import random
+import time
+from typing import Dict, List, Tuple
+
+BOT_USER_ID = "UBENCHBOT"
+BOT_NAME = "BotAI"
+
+FIRST_NAMES = ["An", "Binh", "Chi", "Dung", "Giang", "Hai", "Hoa", "Khanh", "Lan", "Minh", "Nam", "Phuong", "Quan", "Thao", "Trang", "Tuan", "Vy", "Yen"]
+LAST_NAMES = ["Nguyen", "Tran", "Le", "Pham", "Hoang", "Vo", "Dang", "Bui", "Do", "Ngo"]
+TOPICS = [
+    "deploy", "release", "rollback", "database", "migration", "login", "checkout", "payment", "invoice", "search",
+    "cache", "latency", "timeout", "queue", "worker", "cron", "backup", "staging", "production", "feature flag",
+    "dashboard", "alert", "incident", "postmortem", "sprint", "retro", "roadmap", "onboarding", "API", "webhook",
+]
+VERBS = ["is failing", "looks slow", "needs review", "was fixed", "is blocked", "got merged", "is flaky", "was rolled back", "is scheduled", "needs a decision"]
+FILLERS = ["please take a look", "any update?", "I think it is related to the last change", "let's sync tomorrow", "thanks!", "see the logs", "can we ship it on Friday?", "+1"]
+
+
+class Workspace:
+    """A synthetic Slack workspace: users, channels and threads of messages.
+
+    Everything is drawn from a seeded random generator, so the same arguments
+    always give the same users, threads and texts; only the timestamps move
+    with the clock. Thread lengths follow a long-tailed distribution around
+    ``mean_replies``, with a few threads far longer, and messages mix topic
+    words with ticket ids and error codes so both vector and keyword search
+    have something to find.
+    """
+
+    def __init__(
+        self,
+        users: int = 50,
+        channels: int = 4,
+        private_channels: int = 0,
+        threads_per_channel: int = 150,
+        mean_replies: float = 5,
+        max_replies: int = 300,
+        days: int = 90,
+        seed: int = 0,
+    ):
+        """Initialize the Workspace class.
+
+        Args:
+            users: Number of users
+            channels: Number of channels
+            private_channels: How many of them, the last ones, are private
+            threads_per_channel: Top-level messages per channel
+            mean_replies: Mean number of replies per top-level message
+            max_replies: Longest thread
+            days: Days of history the messages are spread over
+            seed: Seed of the random generator
+        """
+        self.random = random.Random(seed)
+        self.users: Dict[str, Dict] = {}
+        for index in range(users):
+            user_id = f"U{index:08d}"
+            name = f"{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}"
+            self.users[user_id] = {"id": user_id, "name": name.lower().replace(" ", "."), "real_name": name, "profile": {"real_name": name, "display_name": name}}
+        self.users[BOT_USER_ID] = {"id": BOT_USER_ID, "name": "botai", "real_name": BOT_NAME, "is_bot": True, "profile": {"real_name": BOT_NAME}}
+        self.channels: Dict[str, Dict] = {
+            f"C{index:08d}": {"id": f"C{index:08d}", "name": f"bench-{index}", "is_private": index >= channels - private_channels}
+            for index in range(channels)
+        }
+        # Top-level messages per channel, oldest first, and replies per (channel, thread_ts)
+        self.messages: Dict[str, List[Dict]] = {channel_id: [] for channel_id in self.channels}
+        self.replies: Dict[Tuple[str, str], List[Dict]] = {}
+        self.tickets: List[str] = []
+        self._last_ts = 0.0
+
+        start = time.time() - days * 86400
+        span = days * 86400 - 3600
+        for channel_id in self.channels:
+            for offset in sorted(self.random.uniform(0, span) for _ in range(threads_per_channel)):
+                root = self._message(start + offset)
+                replies = min(max_replies, int(self.random.expovariate(1 / mean_replies)) if mean_replies else 0)
+                # One thread in fifty is a long incident or planning thread
+                if self.random.random() < 0.02:
+                    replies = max_replies
+                self.messages[channel_id].append(root)
+                if replies:
+                    root["thread_ts"] = root["ts"]
+                    root["reply_count"] = replies
+                    ts = float(root["ts"])
+                    thread = []
+                    for _ in range(replies):
+                        ts += self.random.uniform(1, 600)
+                        reply = self._message(ts, topic_of=root)
+                        reply["thread_ts"] = root["ts"]
+                        thread.append(reply)
+                    self.replies[(channel_id, root["ts"])] = thread
+
+    @property
+    def message_count(self) -> int:
+        return sum(len(messages) for messages in self.messages.values()) + sum(len(thread) for thread in self.replies.values())
+
+    def _user(self) -> str:
+        return self.random.choice([user_id for user_id in self.users if user_id != BOT_USER_ID])
+
+    def _ts(self, ts: float) -> str:
+        # Slack timestamps are unique per channel; keep them unique workspace-wide
+        formatted = f"{max(ts, self._last_ts + 0.000001):.6f}"
+        self._last_ts = float(formatted)
+        return formatted
+
+    def _text(self, topic_of: Dict = None) -> str:
+        topic = topic_of["topic"] if topic_of else self.random.choice(TOPICS)
+        words = [f"The {topic} {self.random.choice(VERBS)}"]
+        if self.random.random() < 0.3:
+            ticket = f"PROJ-{self.random.randint(100, 9999)}"
+            self.tickets.append(ticket)
+            words.append(f"see {ticket}")
+        if self.random.random() < 0.1:
+            words.append(f"error ERR_{self.random.choice([400, 401, 403, 404, 409, 500, 502, 503, 504])}")
+        if self.random.random() < 0.2:
+            words.append(f"cc <@{self._user()}>")
+        words.append(self.random.choice(FILLERS))
+        return ", ".join(words) + "."
+
+    def _message(self, ts: float, topic_of: Dict = None) -> Dict:
+        message = {"type": "message", "user": self._user(), "ts": self._ts(ts)}
+        message["topic"] = topic_of["topic"] if topic_of else self.random.choice(TOPICS)
+        message["text"] = self._text(message)
+        return message
+
+    def queries(self, count: int) -> List[str]:
+        """Search queries: topic questions, and ticket ids that exist in the history."""
+        queries = []
+        for index in range(count):
+            if index % 3 == 2 and self.tickets:
+                queries.append(f"what is the status of {self.random.choice(self.tickets)}")
+            else:
+                queries.append(f"why the {self.random.choice(TOPICS)} {self.random.choice(VERBS)} in {self.random.choice(TOPICS)}")
+        return queries
+
+    def mention_targets(self, count: int) -> List[Tuple[str, str, str]]:
+        """Where and what to ask the bot: (channel_id, thread_ts or "", question).
+
+        Most mentions start a new thread; a third follow up in an existing
+        thread, favouring long ones so conversation summaries are exercised.
+        """
+        threads = sorted(self.replies, key=lambda key: len(self.replies[key]), reverse=True)
+        targets = []
+        for index, query in enumerate(self.queries(count)):
+            if index % 3 == 1 and threads:
+                channel_id, thread_ts = threads[self.random.randrange(min(len(threads), 10))]
+            else:
+                channel_id, thread_ts = self.random.choice(list(self.channels)), ""
+            targets.append((channel_id, thread_ts, f"<@{BOT_USER_ID}> {query}?"))
+        return targets
+
+    def post(self, channel_id: str, user: str, text: str, thread_ts: str = "") -> Dict:
+        """Add a message now, as a top-level message or a reply."""
+        message = {"type": "message", "user": user, "ts": self._ts(time.time()), "text": text}
+        if thread_ts:
+            message["thread_ts"] = thread_ts
+            self.replies.setdefault((channel_id, thread_ts), []).append(message)
+            for root in self.messages[channel_id]:
+                if root["ts"] == thread_ts:
+                    root["thread_ts"] = thread_ts
+                    root["reply_count"] = len(self.replies[(channel_id, thread_ts)])
+                    break
+        else:
+            self.messages[channel_id].append(message)
+        return message
+
+    def find(self, channel_id: str, ts: str) -> Dict:
+        for message in self.messages.get(channel_id, []):
+            if message["ts"] == ts:
+                return message
+        for (channel, _), thread in self.replies.items():
+            if channel == channel_id:
+                for message in thread:
+                    if message["ts"] == ts:
+                        return message
+        return None
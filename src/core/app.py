@@ -1,14 +1,27 @@
 import os
-import json
+import time
 import logging
 import asyncio
 
 from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
 from slack_bolt.async_app import AsyncApp
-from src.slack.slack_channel_history import SlackChannelHistory
+from slack_bolt.request.async_request import AsyncBoltRequest
+from src.slack.slack_channel_history import SLACK_API_URL, AsyncSlackChannelHistory, close_async_client
+from src.slack.rate_limiter import RateLimitedAsyncClient
+from src.slack.streaming_reply import StreamingReply
 
-from src.ai.ai_agent import create_agent
-from src.utils.parser import answer_parser
+from src.ai.ai_agent import create_agent, agent_manager, agent_config, llm, astream_answer, final_answer
+from src.ai.answer_cache import ANSWER_CACHE, PUBLIC_SCOPE, SemanticAnswerCache, question_text
+from src.ai.conversation import ConversationBuilder
+from src.ai.live_indexer import LiveIndexer, LIVE_INDEXING
+from src.core.dispatcher import MentionDispatcher
+from src.utils.metrics import METRICS_LOG, METRICS_PORT, count, metrics, report_periodically, serve_metrics, span, trace
+from src.utils.shared_state import get_shared_state
+from src.slack.user_directory import UserDirectory
+from src.utils.mention_resolver import MentionResolver
+from src.utils.cache import TTLCache
+from src.utils.tools import current_thread
+from src.utils.settings import env
 
 # Configure logging
 logging.basicConfig(
@@ -19,6 +32,9 @@ logger = logging.getLogger(__name__)
 
 SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
 SLACK_APP_TOKEN = os.getenv("SLACK_APP_TOKEN")
+# Edit the placeholder message as the answer is generated instead of once at the end
+STREAM_ANSWERS = env("STREAM_ANSWERS", "true").lower() in ("1", "true", "yes")
+ERROR_MESSAGE = "Sorry, I encountered an error while processing your request."
 
 if not SLACK_BOT_TOKEN or not SLACK_APP_TOKEN:
     raise ValueError("SLACK_BOT_TOKEN and SLACK_APP_TOKEN must be set in environment variables")
@@ -28,60 +44,210 @@ app = AsyncApp(
     # This must be set to handle bot message events
     ignoring_self_assistant_message_events_enabled=False,
 )
+# Bolt takes no base URL, so point its client at SLACK_API_URL afterwards
+app.client.base_url = SLACK_API_URL
 
-channel_social = SlackChannelHistory("social")
+# Event claims, thread locks and caches, shared with the other bot processes when there are several
+shared_state = get_shared_state()
 
-# Load users list from file
-with open("users.json", "r") as f:
-    users_store = json.load(f)
+# Users are served from the users.json snapshot and refreshed from Slack in the background
+user_directory = UserDirectory(state=shared_state)
+mention_resolver = MentionResolver(user_directory.users_store)
 
-@app.event("app_mention")
-async def handle_app_mention(event, say):
-    """Handle app mention events in Slack.
+live_indexer = LiveIndexer(state=shared_state)
+# Paces chat.update across all replies being streamed at the same time
+reply_client = RateLimitedAsyncClient(client=app.client)
+# Long threads are sent as a cached rolling summary plus the latest messages
+conversation_builder = ConversationBuilder(llm)
+# Answers to questions that start a thread, reused for near-identical questions
+answer_cache = SemanticAnswerCache(state=shared_state) if ANSWER_CACHE else None
+# Whether a channel is private, per channel id, read once an hour
+channel_privacy = TTLCache(maxsize=1024, ttl=3600)
+
+async def is_private_channel(channel_id: str) -> bool:
+    """Whether a channel is private, or a DM; a channel whose info cannot be read counts as private."""
+    private = channel_privacy.get(channel_id)
+    if private is None:
+        info = await AsyncSlackChannelHistory("", channel_id=channel_id).get_channel_info()
+        private = info.get("is_private", True) or info.get("is_im", False) or info.get("is_mpim", False)
+        if info:
+            channel_privacy.set(channel_id, private)
+    return private
+
+@app.event("message")
+async def handle_message_events(event):
+    """Queue threads changed by new, edited or deleted messages for re-indexing."""
+    live_indexer.submit(event)
+
+async def answer_mention(event, say):
+    """Answer one app mention.
     
     Args:
         event: The Slack event data
         say: Function to send a message back to Slack
     """
+    thread_ts = event.get("thread_ts") or event["ts"]
+    # Seen by the summary tool, which caches summaries per thread
+    token = current_thread.set(f"{event['channel']}:{thread_ts}")
     try:
+        with trace("mention", channel=event["channel"], thread_ts=thread_ts, ts=event["ts"]) as current:
+            await _answer_mention(event, say, thread_ts, current)
+    finally:
+        current_thread.reset(token)
+
+async def _answer_mention(event, say, thread_ts, current):
+    started = time.monotonic()
+    typing_message = None
+    # Whether the placeholder shows its final text, the answer or an error
+    settled = False
+    question = question_text(event.get("text"))
+    # Only questions that start a thread are cached, later ones depend on the conversation
+    cache_question = question if answer_cache is not None and not event.get("thread_ts") else ""
+    try:
+        # Answers in a private channel may quote its documents, so they are neither cached nor reused
+        if cache_question and await is_private_channel(event["channel"]):
+            cache_question = ""
+        if cache_question:
+            with span("answer_cache.lookup"):
+                cached = await answer_cache.lookup(cache_question, PUBLIC_SCOPE)
+            if cached is not None:
+                current.fields["answer_cache"] = "hit"
+                await say(text=cached[0], thread_ts=thread_ts)
+                return
+
         async with create_agent() as agent:
-            thread_ts = event.get("thread_ts") or event["ts"]
-            
             # Get thread history
-            response = channel_social.get_thread_history(thread_ts)
-            conversation = ""
-            for message in response:
-                # Replace any user id in message["text"] with user name
-                message_text = message["text"]
-                for user_id, user_name in users_store.items():
-                    message_text = message_text.replace(user_id, user_name)
-                
-                conversation += users_store[message["user"]] + ": " + message_text + "\n"
+            channel_history = AsyncSlackChannelHistory("", channel_id=event["channel"])
+            with span("slack.thread_fetch"):
+                response = await channel_history.get_thread_history(thread_ts)
+            with span("mentions.resolve"):
+                await user_directory.ensure_fresh()
+                await user_directory.ensure_users(user_directory.user_ids_in(response))
+                lines = []
+                for message in response:
+                    # Replace any user id in message["text"] with user name
+                    message_text = mention_resolver.resolve(message.get("text", ""))
+                    
+                    lines.append((message["ts"], user_directory.author(message) + ": " + message_text + "\n"))
+            with span("conversation.build"):
+                conversation = await conversation_builder.build(event["channel"], thread_ts, lines)
+            current.fields["thread_messages"] = len(lines)
 
             # Send a typing message to the channel
-            typing_message = await say(text="Bot is typing...", thread_ts=thread_ts)
-
-            response = await agent.ainvoke({"messages": conversation})
-            response_content = response["messages"][-1].content
-            text = answer_parser.parse(response_content).answer
-
-            await app.client.chat_update(
-                channel=event["channel"],
-                ts=typing_message["ts"],  # Timestamp of the "typing" message
-                text=text,
-                thread_ts=thread_ts
-            )
+            with span("slack.placeholder"):
+                typing_message = await say(text="Bot is typing...", thread_ts=thread_ts)
+
+            if STREAM_ANSWERS:
+                reply = StreamingReply(reply_client, event["channel"], typing_message["ts"], thread_ts=thread_ts)
+                reply.start()
+                text = ""
+                try:
+                    with span("agent.run"):
+                        async for kind, text in astream_answer(agent, {"messages": conversation, "question": question}):
+                            if kind != "final":
+                                reply.update(text)
+                except BaseException:
+                    # Replace the partial answer, it must not read as the final one
+                    await reply.finish(ERROR_MESSAGE)
+                    settled = True
+                    raise
+                await reply.finish(text or ERROR_MESSAGE)
+                settled = True
+            else:
+                with span("agent.run"):
+                    response = await agent.ainvoke({"messages": conversation, "question": question}, config=agent_config)
+                response_content = response["messages"][-1].content
+                text = final_answer(response_content)
+
+                with span("slack.chat_update"):
+                    await app.client.chat_update(
+                        channel=event["channel"],
+                        ts=typing_message["ts"],  # Timestamp of the "typing" message
+                        text=text,
+                        thread_ts=thread_ts
+                    )
+                settled = True
+
+        if cache_question:
+            await answer_cache.store(cache_question, text, time.monotonic() - started, PUBLIC_SCOPE)
             
     except Exception as e:
         logger.error(f"Error handling app mention: {str(e)}")
-        await say(text="Sorry, I encountered an error while processing your request.", thread_ts=thread_ts)
+        count("mention.errors")
+        if typing_message is None:
+            await say(text=ERROR_MESSAGE, thread_ts=thread_ts)
+        elif not settled:
+            # Show the error in the placeholder rather than in a second message
+            await app.client.chat_update(channel=event["channel"], ts=typing_message["ts"], text=ERROR_MESSAGE, thread_ts=thread_ts)
 
-if __name__ == "__main__":
+# Answers mentions on a bounded worker pool, one run per thread at a time
+mention_dispatcher = MentionDispatcher(answer_mention, state=shared_state)
+metrics.register_gauge("mention_dispatcher", mention_dispatcher.stats)
+
+@app.event("app_mention")
+async def handle_app_mention(body, event, say):
+    """Hand app mention events to the dispatcher, which drops redeliveries and coalesces bursts per thread."""
+    await mention_dispatcher.submit(event, say, event_id=body.get("event_id"))
+
+async def warm_up_agent(timeout: float = 30.0):
+    """Connect to the MCP server and compile the agent before the first mention arrives."""
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        handler = AsyncSocketModeHandler(app, SLACK_APP_TOKEN, loop=loop)
-        loop.run_until_complete(handler.start_async())
+        await agent_manager.start(timeout=timeout)
+    except Exception as e:
+        # The pool keeps reconnecting in the background; the first mention retries.
+        logger.warning(f"Agent warm-up failed, will retry on first mention: {str(e)}")
+
+async def start_services():
+    """Connect everything a bot process needs before it takes events.
+
+    Returns:
+        The metrics server runner, if one was started
+    """
+    await warm_up_agent()
+    # Without a snapshot there are no names yet, so wait for the first load
+    await user_directory.ensure_fresh(wait=not user_directory.users_store)
+    if LIVE_INDEXING:
+        await live_indexer.start()
+    metrics_runner = await serve_metrics() if METRICS_PORT else None
+    if METRICS_LOG:
+        asyncio.create_task(report_periodically())
+    return metrics_runner
+
+async def stop_services(metrics_runner=None):
+    await mention_dispatcher.close()
+    await live_indexer.close()
+    await agent_manager.close()
+    await close_async_client()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+
+async def serve(events=None):
+    """Run the bot until cancelled.
+
+    Args:
+        events: Queue of (payload, headers) of Socket Mode requests relayed by
+            the launcher, None to open a Socket Mode connection of this process's own
+    """
+    metrics_runner = None
+    handler = None
+    try:
+        metrics_runner = await start_services()
+        if events is None:
+            handler = AsyncSocketModeHandler(app, SLACK_APP_TOKEN)
+            await handler.start_async()
+            return
+        # The launcher has already acknowledged these requests, so Bolt's responses are dropped
+        while (request := await asyncio.to_thread(events.get)) is not None:
+            payload, headers = request
+            await app.async_dispatch(AsyncBoltRequest(mode="socket_mode", body=payload, headers=headers))
     except Exception as e:
         logger.error(f"Error starting Slack app: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+    finally:
+        if handler is not None:
+            # Take no new events while the ones already taken are answered
+            await handler.close_async()
+        await stop_services(metrics_runner)
+
+if __name__ == "__main__":
+    asyncio.run(serve())
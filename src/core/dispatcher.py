@@ -0,0 +1,181 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from src.utils.shared_state import SharedState, get_shared_state
+from src.utils.settings import env
+
+logger = logging.getLogger(__name__)
+
+MENTION_CONCURRENCY = int(env("MENTION_CONCURRENCY", "4"))
+MENTION_QUEUE_SIZE = int(env("MENTION_QUEUE_SIZE", "32"))
+# Seconds a new mention waits for room in a full queue before it is turned away
+MENTION_QUEUE_TIMEOUT = float(env("MENTION_QUEUE_TIMEOUT", "5"))
+BUSY_MESSAGE = "I'm handling a lot of requests right now, please mention me again in a minute."
+
+
+class MentionJob:
+    def __init__(self, event: Dict, say: Callable, event_id: str):
+        self.event = event
+        self.say = say
+        self.event_id = event_id
+        self.enqueued_at = time.monotonic()
+
+
+class MentionDispatcher:
+    """Run mention handlers on a bounded worker pool, one run per thread at a time.
+
+    Events redelivered by Slack are dropped by event id, claimed in the
+    shared state so no other bot process answers them either, and a thread
+    is answered under a shared lock. Mentions are keyed by
+    channel and thread_ts: a mention arriving while its thread is queued or
+    being answered replaces any mention still waiting there, so a burst of
+    mentions in one thread is answered once, after the run in progress, from
+    the latest one. When the queue is full a new thread waits for room up to
+    ``queue_timeout`` and is then told the bot is busy. On close, mentions
+    already taken are answered first.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Dict, Callable], Awaitable],
+        concurrency: int = MENTION_CONCURRENCY,
+        queue_size: int = MENTION_QUEUE_SIZE,
+        queue_timeout: float = MENTION_QUEUE_TIMEOUT,
+        state: SharedState = None,
+    ):
+        """Initialize the MentionDispatcher class.
+
+        Args:
+            handler: Coroutine function answering one mention, called with the event and say
+            concurrency: Number of mentions answered at the same time
+            queue_size: Number of threads that may wait for a worker
+            queue_timeout: Seconds to wait for room in a full queue
+            state: State shared with other bot processes, this process's by default
+        """
+        self.handler = handler
+        self.concurrency = concurrency
+        self.queue_timeout = queue_timeout
+        self._queue: asyncio.Queue = None
+        self._queue_size = queue_size
+        self._workers = []
+        # Latest unanswered mention per thread, and threads being answered
+        self._pending: Dict[Tuple[str, str], MentionJob] = {}
+        self._running: Set[Tuple[str, str]] = set()
+        self._queued: Set[Tuple[str, str]] = set()
+        # Mention being answered per thread
+        self._current: Dict[Tuple[str, str], MentionJob] = {}
+        self._closing = False
+        self.state = state or get_shared_state()
+        self._wait_times = deque(maxlen=1000)
+        self.counts = {"received": 0, "duplicates": 0, "coalesced": 0, "rejected": 0, "answered": 0, "failed": 0}
+
+    def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def close(self, timeout: float = 60.0):
+        """Stop taking mentions and answer the ones already taken, for up to ``timeout`` seconds.
+
+        Mentions still unanswered after that have their event claims released,
+        so a redelivery or another bot process can answer them.
+        """
+        self._closing = True
+        if self._workers:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                unanswered = list(self._current.values()) + list(self._pending.values())
+                logger.warning(f"Closing mention dispatcher with {len(unanswered)} mentions unanswered")
+                for job in unanswered:
+                    await self.state.arelease(f"event:{job.event_id}")
+        logger.info(f"Mention dispatcher: {self.stats()}")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    @staticmethod
+    def thread_key(event: Dict) -> Tuple[str, str]:
+        return event["channel"], event.get("thread_ts") or event["ts"]
+
+    async def submit(self, event: Dict, say: Callable, event_id: Optional[str] = None):
+        """Queue a mention, unless it is a redelivery or its thread already has one waiting."""
+        event_id = event_id or f"{event['channel']}:{event['ts']}"
+        if self._closing:
+            # Left unclaimed, so a redelivery or another bot process answers it
+            logger.warning(f"Mention dispatcher is closing, not taking event {event_id}")
+            return
+        self.start()
+        self.counts["received"] += 1
+        if not await self.state.aclaim(f"event:{event_id}", ttl=3600):
+            self.counts["duplicates"] += 1
+            logger.info(f"Dropped redelivered event {event_id}")
+            return
+
+        key = self.thread_key(event)
+        scheduled = key in self._queued or key in self._running
+        if key in self._pending:
+            self.counts["coalesced"] += 1
+            logger.info(f"Mention {event['ts']} replaces the one waiting in thread {key[1]}")
+        self._pending[key] = MentionJob(event, say, event_id)
+        if scheduled:
+            return
+
+        self._queued.add(key)
+        try:
+            await asyncio.wait_for(self._queue.put(key), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._queued.discard(key)
+            job = self._pending.pop(key, None)
+            self.counts["rejected"] += 1
+            logger.warning(f"Mention queue full ({self._queue.qsize()} threads), turning away thread {key[1]}")
+            if job is not None:
+                await job.say(text=BUSY_MESSAGE, thread_ts=key[1])
+
+    async def _worker(self):
+        while True:
+            key = await self._queue.get()
+            self._queued.discard(key)
+            self._running.add(key)
+            try:
+                # Mentions that arrived while this thread was being answered run next, on this worker
+                while (job := self._pending.pop(key, None)) is not None:
+                    wait = time.monotonic() - job.enqueued_at
+                    self._wait_times.append(wait)
+                    logger.info(
+                        f"Answering mention in thread {key[1]} after {wait * 1000:.0f}ms in queue "
+                        f"({self._queue.qsize()} threads queued, {len(self._running)} running)"
+                    )
+                    self._current[key] = job
+                    try:
+                        # Another process may be answering a mention in the same thread
+                        async with self.state.lock(f"thread:{key[0]}:{key[1]}"):
+                            await self.handler(job.event, job.say)
+                        self.counts["answered"] += 1
+                    except Exception as e:
+                        self.counts["failed"] += 1
+                        logger.error(f"Error answering mention in thread {key[1]}: {e}")
+            finally:
+                self._current.pop(key, None)
+                self._running.discard(key)
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, float]:
+        """Queue depth, wait-time percentiles over the last 1000 mentions, and event counts."""
+        waits = sorted(self._wait_times)
+
+        def percentile(p: float) -> float:
+            return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "running": len(self._running),
+            "wait_p50": percentile(0.5),
+            "wait_p95": percentile(0.95),
+            **self.counts,
+        }
@@ -0,0 +1,163 @@
+import os
+import zlib
+import signal
+import asyncio
+import logging
+import argparse
+import multiprocessing
+from typing import List, Optional
+
+from slack_bolt.adapter.socket_mode.internals import build_headers
+from slack_sdk.socket_mode.aiohttp import SocketModeClient
+from slack_sdk.socket_mode.request import SocketModeRequest
+from slack_sdk.socket_mode.response import SocketModeResponse
+from slack_sdk.web.async_client import AsyncWebClient
+from src.utils.settings import env
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BOT_WORKERS = int(env("BOT_WORKERS", "2"))
+# Seconds between checks for worker processes that died
+WORKER_CHECK_INTERVAL = 5.0
+
+
+def run_worker(index: int, events: Optional[multiprocessing.Queue]):
+    """Run one bot process; events is None when it opens its own Socket Mode connection."""
+    # Workers must agree on claims and locks, which the in-memory state cannot do
+    if not os.getenv("SHARED_STATE"):
+        os.environ["SHARED_STATE"] = "sqlite"
+    metrics_port = int(env("METRICS_PORT", "0"))
+    if metrics_port:
+        os.environ["METRICS_PORT"] = str(metrics_port + index)
+
+    from src.core.app import serve
+
+    async def main():
+        # Shut down like on Ctrl-C, so mentions already taken are answered first
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        await serve(events)
+
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+def worker_for(payload: dict, workers: int) -> int:
+    """Index of the worker for an event; all events of a thread go to the same worker."""
+    event = payload.get("event") or {}
+    thread = event.get("thread_ts") or event.get("ts") or payload.get("event_id", "")
+    return zlib.crc32(f"{event.get('channel', '')}:{thread}".encode()) % workers
+
+
+class Launcher:
+    """Runs several bot processes for one workspace.
+
+    By default the launcher holds the only Socket Mode connection: it
+    acknowledges each request at once and relays it to a worker chosen by
+    thread, so a thread's events are handled in order by one process.
+    With ``connection_per_worker`` every worker opens its own connection
+    and Slack spreads the requests between them. Either way the workers
+    share event claims, thread locks and caches through the SQLite shared
+    state, so a redelivered event is answered once and a thread is
+    answered by one process at a time.
+    """
+
+    def __init__(self, workers: int = BOT_WORKERS, connection_per_worker: bool = False):
+        """Initialize the Launcher class.
+
+        Args:
+            workers: Number of bot processes
+            connection_per_worker: Let every worker open its own Socket Mode connection
+        """
+        self.workers = max(1, workers)
+        self.connection_per_worker = connection_per_worker
+        # Spawn rather than fork, the parent holds client threads and an event loop
+        self._context = multiprocessing.get_context("spawn")
+        self._queues: List[Optional[multiprocessing.Queue]] = [
+            None if connection_per_worker else self._context.Queue() for _ in range(self.workers)
+        ]
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * self.workers
+        self._client: Optional[SocketModeClient] = None
+
+    def _start_worker(self, index: int):
+        process = self._context.Process(
+            target=run_worker, args=(index, self._queues[index]), name=f"bot-worker-{index}", daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+        logger.info(f"Started bot worker {index} (pid {process.pid})")
+
+    def _check_workers(self):
+        """Restart workers that died; requests queued for them are kept."""
+        for index, process in enumerate(self._processes):
+            if process is not None and not process.is_alive():
+                logger.warning(f"Bot worker {index} exited with code {process.exitcode}, restarting")
+                self._start_worker(index)
+
+    async def _relay(self, client: SocketModeClient, req: SocketModeRequest):
+        # Slack redelivers requests not acknowledged within 3 seconds, so do it before anything else
+        await client.send_socket_mode_response(SocketModeResponse(envelope_id=req.envelope_id))
+        if req.type != "events_api":
+            # Interactivity and slash commands are not used by the bot
+            return
+        index = worker_for(req.payload, self.workers)
+        self._queues[index].put((req.payload, build_headers(req)))
+
+    async def run(self):
+        """Start the workers and relay requests until cancelled."""
+        for index in range(self.workers):
+            self._start_worker(index)
+        try:
+            if not self.connection_per_worker:
+                from src.slack.slack_channel_history import SLACK_API_URL
+
+                self._client = SocketModeClient(
+                    app_token=os.getenv("SLACK_APP_TOKEN"),
+                    web_client=AsyncWebClient(token=os.getenv("SLACK_BOT_TOKEN"), base_url=SLACK_API_URL),
+                )
+                self._client.socket_mode_request_listeners.append(self._relay)
+                await self._client.connect()
+            while True:
+                await asyncio.sleep(WORKER_CHECK_INTERVAL)
+                self._check_workers()
+        finally:
+            await self.close()
+
+    async def close(self, timeout: float = 90.0):
+        """Close the connection and let each worker finish the requests it was given.
+
+        Args:
+            timeout: Seconds to wait for each worker, longer than a worker takes to drain its mentions
+        """
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+        for queue in self._queues:
+            if queue is not None:
+                queue.put(None)
+        for process in self._processes:
+            if process is None:
+                continue
+            if self.connection_per_worker:
+                process.terminate()
+            await asyncio.to_thread(process.join, timeout)
+            if process.is_alive():
+                process.kill()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run several bot processes for one Slack workspace")
+    parser.add_argument("--workers", type=int, default=BOT_WORKERS, help="Number of bot processes")
+    parser.add_argument(
+        "--connection-per-worker",
+        action="store_true",
+        help="Open a Socket Mode connection in every worker instead of one shared by all",
+    )
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(Launcher(args.workers, connection_per_worker=args.connection_per_worker).run())
+    except KeyboardInterrupt:
+        pass
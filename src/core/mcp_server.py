@@ -1,5 +1,7 @@
+import json
+
 from mcp.server.fastmcp import FastMCP
-from ai.retrieval import retrieve
+from src.ai.retrieval import get_document, retrieve, retrieve_many
 from langchain_core.documents import Document
 
 
@@ -13,20 +15,63 @@ def add_two_numbers(a: int, b: int) -> int:
     return a + b
 
 @mcp.tool()
-def retrieve_related_docs(query: str, k: int = 1) -> list[Document]:
-    """Retrieve related documents from the vector database
+def retrieve_related_docs(
+    query: str,
+    k: int = 3,
+    channels: list[str] | None = None,
+    user: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    mention_channel: str | None = None,
+) -> list[Document]:
+    """Retrieve related documents by meaning and by exact keywords such as ticket ids, error codes and names
     
     Args:
         query: Query to retrieve related documents
         k: Number of documents to retrieve
+        channels: Names of the Slack channels to search, the public channels and the one asked in if omitted
+        user: Only threads started by this person, by full name
+        since: Only threads started on or after this date (YYYY-MM-DD)
+        until: Only threads started on or before this date (YYYY-MM-DD)
+        mention_channel: Id of the channel the question was asked in, set by the bot
         
     Returns:
         Content of the related documents
     """
-    docs = retrieve(query, k = k)
+    docs = retrieve(
+        query, k = k, channels = channels, user = user, since = since, until = until, mention_channel = mention_channel
+    )
 
     return docs
 
+@mcp.tool()
+def retrieve_related_docs_batch(
+    queries: list[str],
+    k: int = 3,
+    channels: list[str] | None = None,
+    user: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    mention_channel: str | None = None,
+) -> list[dict]:
+    """Retrieve related documents for several phrasings or sub-questions at once, in one call
+    
+    Args:
+        queries: Queries to retrieve related documents for, such as different angles on the question
+        k: Number of documents to retrieve per query
+        channels: Names of the Slack channels to search, the public channels and the one asked in if omitted
+        user: Only threads started by this person, by full name
+        since: Only threads started on or after this date (YYYY-MM-DD)
+        until: Only threads started on or before this date (YYYY-MM-DD)
+        mention_channel: Id of the channel the question was asked in, set by the bot
+        
+    Returns:
+        Documents found by any query, each once, best first, with their id, score, link and the queries that found them
+    """
+    return retrieve_many(
+        queries, k = k, channels = channels, user = user, since = since, until = until, mention_channel = mention_channel
+    )
+
 # More tools can be added here
 
 #### Resources ####
@@ -37,6 +82,19 @@ def get_static_resource() -> str:
     return "Any static data can be returned"
 
 
+# A document from search results, with the ids of its neighbouring chunks. The channel asked in
+# is a path segment, "-" for none, since the host part of the URI is lowercased and ids are not
+@mcp.resource("document://{channel}/{message_ts}/{chunk_index}/{mention_channel}")
+def get_document_resource(channel: str, message_ts: str, chunk_index: str, mention_channel: str) -> str:
+    """Get a document by the parts of the id given in search results, channel:message_ts:chunk_index"""
+    doc_id = f"{channel}:{message_ts}:{chunk_index}"
+    # Not an error, so clients do not retry it
+    document = get_document(doc_id, mention_channel if mention_channel != "-" else None) or {
+        "id": doc_id, "error": "Unknown document"
+    }
+    return json.dumps(document, ensure_ascii=False)
+
+
 # Add a dynamic greeting resource
 @mcp.resource("greeting://{name}")
 def get_greeting(name: str) -> str:
@@ -61,7 +119,7 @@ def debug_error(error: str) -> list[tuple]:
 
 def get_tools():
     # Only include tools that are working
-    base_tools = [add_two_numbers, retrieve_related_docs]
+    base_tools = [add_two_numbers, retrieve_related_docs, retrieve_related_docs_batch]
     
     return base_tools
 
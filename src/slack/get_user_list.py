@@ -1,40 +1,28 @@
-import json
-import os
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
-
+import asyncio
 import logging
 
+from src.slack.slack_channel_history import close_async_client
+from src.slack.user_directory import UserDirectory
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
-SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
-client = WebClient(token=SLACK_BOT_TOKEN)
-
-users_store = {}
-
-# Put users into the dict
-def save_users(users_array):
-    for user in users_array:
-        # Key user info on their unique user ID
-        user_id = user["id"]
-        # Store the entire user object (you may not need all of the info)
-        users_store[user_id] = user["real_name"]
 
-    # Save the users to a file
-    with open("users.json", "w") as f:
-        json.dump(users_store, f)
-        
+async def main():
+    """Reload every user from Slack and write the users.json snapshot.
 
-try:
-    # Call the users.list method using the WebClient
-    # users.list requires the users:read scope
-    result = client.users_list()
-    save_users(result["members"])
+    users.list requires the users:read scope.
+    """
+    try:
+        directory = UserDirectory()
+        count = await directory.refresh()
+        logger.info(f"Saved {count} users to {directory.snapshot_path}")
+    finally:
+        await close_async_client()
 
-except SlackApiError as e:
-    logger.error("Error creating conversation: {}".format(e))
 
+if __name__ == "__main__":
+    asyncio.run(main())
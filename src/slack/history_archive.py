@@ -0,0 +1,406 @@
+import os
+import json
+import time
+import zlib
+import fcntl
+import gzip
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from slack_sdk.errors import SlackApiError
+
+from src.slack.slack_channel_history import AsyncSlackChannelHistory, build_permalink
+from src.utils.settings import env
+
+logger = logging.getLogger(__name__)
+
+HISTORY_ARCHIVE = env("HISTORY_ARCHIVE", "false").lower() in ("1", "true", "yes")
+HISTORY_ARCHIVE_DIRECTORY = env("HISTORY_ARCHIVE_DIRECTORY", "./slack_archive")
+THREADS_FILE = "threads.jsonl.gz"
+INDEX_FILE = "index.jsonl"
+META_FILE = "meta.json"
+LOCK_FILE = ".lock"
+# Threads fetched from Slack at the same time while syncing
+ARCHIVE_FETCH_CONCURRENCY = int(env("SLACK_FETCH_CONCURRENCY", "8"))
+
+
+def thread_version(message: Dict) -> list:
+    """What changes on a top-level message when its thread does: replies, and edits of the message itself."""
+    return [message.get("reply_count", 0), message.get("latest_reply", ""), (message.get("edited") or {}).get("ts", "")]
+
+
+def archived_channels(directory: str = HISTORY_ARCHIVE_DIRECTORY) -> List[str]:
+    """Names of the channels with a history archive."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        name for name in os.listdir(directory)
+        if any(os.path.exists(os.path.join(directory, name, file)) for file in (META_FILE, INDEX_FILE))
+    )
+
+
+def generation_file(name: str, generation: int) -> str:
+    """File name of an archive file in a generation; generation 0 has the plain names."""
+    root, extension = name.split(".", 1)
+    return f"{root}.{generation}.{extension}" if generation else name
+
+
+def _compress(records: List[Dict]) -> bytes:
+    """One gzip member of JSON lines."""
+    lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+    return gzip.compress(lines.encode("utf-8"), compresslevel=6)
+
+
+def _read_member(f, offset: int) -> List[Dict]:
+    """Decompress the one gzip member starting at ``offset``."""
+    f.seek(offset)
+    decompressor = zlib.decompressobj(wbits=31)
+    data = b""
+    while not decompressor.eof:
+        chunk = f.read(65536)
+        if not chunk:
+            raise EOFError(f"Truncated archive member at offset {offset}")
+        data += decompressor.decompress(chunk)
+    return [json.loads(line) for line in data.splitlines() if line]
+
+
+class HistoryArchive:
+    """Append-only, compressed archive of the raw messages of one channel.
+
+    Every thread is stored as it came from Slack: the top-level message from
+    conversations.history and the replies from conversations.replies. Each
+    append is one gzip member of JSON lines added to ``threads.jsonl.gz``,
+    followed by one line per thread in ``index.jsonl`` mapping its ts to the
+    member. The index line is the commit point, so a member whose index lines
+    were never written is ignored. A later record of a thread replaces the
+    earlier one and deletions are tombstones; ``compact`` rewrites the files
+    without them as a new generation, which ``meta.json`` switches to.
+
+    ``sync`` fetches what is new in Slack into the archive, and
+    ``ArchivedChannelHistory`` replays it to ingestion in place of the Slack
+    API, so re-indexing needs no API calls. Appends from several processes
+    are serialized with a file lock, and readers pick them up on their next call.
+    """
+
+    def __init__(self, channel_name: str, directory: str = HISTORY_ARCHIVE_DIRECTORY):
+        """Initialize the HistoryArchive class.
+
+        Args:
+            channel_name: Name of the channel, the archive subdirectory
+            directory: Root directory of all channel archives
+        """
+        self.channel_name = channel_name
+        self.directory = os.path.join(directory, channel_name)
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _file(self, name: str, generation: int = None) -> str:
+        return self._path(generation_file(name, self._generation if generation is None else generation))
+
+    def _reset(self, generation: int = 0):
+        # Latest index entry per thread ts: {"ts", "offset", "version"} or a tombstone
+        self._entries: Dict[str, Dict] = {}
+        self._index_offset = 0
+        # Generation of the files the entries were read from, changed by compact
+        self._generation = generation
+
+    @contextmanager
+    def _file_lock(self):
+        with self._lock, open(self._path(LOCK_FILE), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Apply index lines appended since the last call, by this or another process."""
+        generation = self.meta.get("generation", 0)
+        if generation != self._generation:
+            # The archive was compacted
+            self._reset(generation)
+        try:
+            with open(self._file(INDEX_FILE), "rb") as f:
+                f.seek(self._index_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # A line still being written is picked up next time
+        complete = data.rfind(b"\n") + 1
+        for line in data[:complete].splitlines():
+            if line:
+                entry = json.loads(line)
+                self._entries[entry["ts"]] = entry
+        self._index_offset += complete
+
+    @property
+    def meta(self) -> Dict:
+        """Channel id, workspace URL and the ts up to which the channel was synced."""
+        try:
+            with open(self._path(META_FILE), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def update_meta(self, **fields):
+        with self._file_lock():
+            self._write_meta({**self.meta, **fields})
+
+    def _write_meta(self, meta: Dict):
+        """Replace the meta file at once; the caller holds the file lock."""
+        tmp_path = self._path(f"{META_FILE}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path(META_FILE))
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return sum(1 for entry in self._entries.values() if not entry.get("deleted"))
+
+    def __contains__(self, ts: str) -> bool:
+        with self._lock:
+            self._refresh()
+            entry = self._entries.get(ts)
+            return entry is not None and not entry.get("deleted")
+
+    def is_current(self, message: Dict) -> bool:
+        """Whether the archived copy of a top-level message's thread is up to date."""
+        with self._lock:
+            self._refresh()
+            entry = self._entries.get(message["ts"])
+            return entry is not None and not entry.get("deleted") and entry["version"] == thread_version(message)
+
+    def _append(self, records: List[Dict], entries: List[Dict]):
+        with self._file_lock():
+            # Append to the generation a compaction in another process may have switched to
+            self._refresh()
+            data = _compress(records)
+            with open(self._file(THREADS_FILE), "ab") as f:
+                offset = os.fstat(f.fileno()).st_size
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self._file(INDEX_FILE), "a", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps({**entry, "offset": offset}) + "\n")
+            self._refresh()
+
+    def append(self, threads: List[Tuple[Dict, List[Dict]]]):
+        """Archive threads as (top-level message, conversations.replies messages) pairs.
+
+        The replies are empty for a message without a thread.
+        """
+        if not threads:
+            return
+        archived_at = time.time()
+        records = [{"ts": root["ts"], "root": root, "thread": thread, "archived_at": archived_at} for root, thread in threads]
+        self._append(records, [{"ts": root["ts"], "version": thread_version(root)} for root, _ in threads])
+
+    def delete(self, ts: str):
+        """Record that a top-level message and its thread were deleted."""
+        self._append([{"ts": ts, "deleted": True}], [{"ts": ts, "deleted": True}])
+
+    def get(self, ts: str) -> Optional[Tuple[Dict, List[Dict]]]:
+        """The latest archived copy of a thread, or None."""
+        with self._lock:
+            self._refresh()
+            entry = self._entries.get(ts)
+            path = self._file(THREADS_FILE)
+        if entry is None or entry.get("deleted"):
+            return None
+        # The previous generation outlives a compaction, so the path stays valid
+        with open(path, "rb") as f:
+            for record in _read_member(f, entry["offset"]):
+                if record["ts"] == ts:
+                    return record["root"], record["thread"]
+        return None
+
+    def iter_members(self, cursor: str = "") -> Iterator[Tuple[List[Dict], str]]:
+        """Replay the archive from a cursor, in the order it was written.
+
+        A cursor is the generation of the archive and the offset of a member
+        in it. Compaction rewrites the members at other offsets, so a cursor
+        from before the last compaction replays from the first member.
+
+        Yields:
+            The current, non-deleted thread records of each member, and the
+            cursor of the next member to resume from, "" after the last one
+        """
+        with self._lock:
+            self._refresh()
+            generation = self._generation
+            path = self._file(THREADS_FILE)
+            current = {entry["offset"]: [] for entry in self._entries.values() if not entry.get("deleted")}
+            for ts, entry in self._entries.items():
+                if not entry.get("deleted"):
+                    current[entry["offset"]].append(ts)
+        # Cursors from before generations were numbered are plain offsets of generation 0
+        cursor_generation, _, start = (cursor or "").rpartition(":")
+        start = int(start or 0)
+        if start and int(cursor_generation or 0) != generation:
+            logger.info(f"History archive of #{self.channel_name} was compacted since cursor {cursor}, replaying it from the start")
+            start = 0
+        offsets = sorted(offset for offset in current if offset >= start)
+        if not offsets:
+            return
+        with open(path, "rb") as f:
+            for position, offset in enumerate(offsets):
+                wanted = set(current[offset])
+                records = [record for record in _read_member(f, offset) if record["ts"] in wanted and not record.get("deleted")]
+                # A thread archived twice in one member keeps its last record
+                latest = {record["ts"]: record for record in records}
+                next_cursor = f"{generation}:{offsets[position + 1]}" if position + 1 < len(offsets) else ""
+                yield list(latest.values()), next_cursor
+
+    def compact(self) -> int:
+        """Rewrite the archive with only the latest record of every live thread.
+
+        The threads and index files of the next generation are written first
+        and ``meta.json`` is then replaced to point at them, so readers switch
+        to both at once, and cursors into the old files, which carry their
+        generation, stop being resumed from in the same step. The previous
+        generation is kept for readers still replaying it and removed by the
+        next compaction.
+
+        Returns:
+            Number of threads kept
+        """
+        with self._file_lock():
+            self._refresh()
+            generation = self._generation + 1
+            records = sorted(
+                (record for records, _ in self.iter_members() for record in records), key=lambda record: float(record["ts"])
+            )
+            # Files of a compaction that crashed before switching are overwritten
+            threads_path, index_path = self._file(THREADS_FILE, generation), self._file(INDEX_FILE, generation)
+            with open(threads_path, "wb") as threads_file, open(index_path, "w", encoding="utf-8") as index_file:
+                for start in range(0, len(records), 500):
+                    batch = records[start:start + 500]
+                    offset = threads_file.tell()
+                    threads_file.write(_compress(batch))
+                    for record in batch:
+                        index_file.write(json.dumps({"ts": record["ts"], "version": thread_version(record["root"]), "offset": offset}) + "\n")
+                threads_file.flush()
+                os.fsync(threads_file.fileno())
+                index_file.flush()
+                os.fsync(index_file.fileno())
+            self._write_meta({**self.meta, "generation": generation})
+            if generation >= 2:
+                for name in (THREADS_FILE, INDEX_FILE):
+                    try:
+                        os.remove(self._file(name, generation - 2))
+                    except FileNotFoundError:
+                        pass
+            self._refresh()
+        logger.info(f"Compacted history archive of #{self.channel_name} to {len(records)} threads")
+        return len(records)
+
+    async def sync(self, history: AsyncSlackChannelHistory, concurrency: int = ARCHIVE_FETCH_CONCURRENCY) -> bool:
+        """Fetch top-level messages posted since the last sync, with their threads, into the archive.
+
+        Threads whose archived copy is current are not fetched again, so an
+        interrupted sync resumes at the cost of re-listing history pages. The
+        sync watermark only moves once every thread in the range is archived.
+
+        Args:
+            history: Slack history client to fetch with
+            concurrency: Number of threads fetched at the same time
+
+        Returns:
+            Whether the whole range was archived
+        """
+        meta = self.meta
+        if not meta.get("channel_id") or not meta.get("workspace_url"):
+            self.update_meta(
+                channel_id=await history._ensure_channel_id(),
+                workspace_url=await history.get_workspace_url(),
+            )
+        oldest = meta.get("synced_until")
+        latest = f"{time.time():.6f}"
+        semaphore = asyncio.Semaphore(concurrency)
+        started = time.monotonic()
+        archived = skipped = failed = 0
+
+        async def fetch(message: Dict) -> Optional[Tuple[Dict, List[Dict]]]:
+            nonlocal failed
+            if not message.get("thread_ts"):
+                return message, []
+            async with semaphore:
+                try:
+                    return message, [reply async for reply in history.iter_thread_history(message["thread_ts"])]
+                except SlackApiError as e:
+                    logger.error(f"Error archiving thread {message['ts']}: {e}")
+                    failed += 1
+                    return None
+
+        try:
+            async for page, _ in history.iter_channel_history_pages(oldest=oldest, latest=latest):
+                stale = [message for message in page if not self.is_current(message)]
+                skipped += len(page) - len(stale)
+                threads = [thread for thread in await asyncio.gather(*(fetch(message) for message in stale)) if thread]
+                await asyncio.to_thread(self.append, threads)
+                archived += len(threads)
+        except SlackApiError as e:
+            logger.error(f"Error fetching channel history, archive sync can be resumed: {e}")
+            return False
+
+        logger.info(
+            f"Archived {archived} threads of #{self.channel_name} in {time.monotonic() - started:.1f}s "
+            f"({skipped} already current, {failed} failed, {len(self)} in archive)"
+        )
+        if failed:
+            return False
+        self.update_meta(synced_until=latest)
+        return True
+
+
+class ArchivedChannelHistory:
+    """Read side of a HistoryArchive with the interface ingestion uses on AsyncSlackChannelHistory.
+
+    Pages hold the top-level messages of one archive member each, and their
+    cursor points at the next member, so an interrupted replay resumes where
+    it stopped, or from the start if the archive was compacted since.
+    """
+
+    def __init__(self, archive: HistoryArchive):
+        self.archive = archive
+        self.channel_name = archive.channel_name
+        self.channel_id = archive.meta.get("channel_id", "")
+        # Replies of replayed top-level messages, handed out once to get_thread_history
+        self._threads: Dict[str, List[Dict]] = {}
+
+    async def iter_channel_history_pages(self, oldest: str = None, latest: str = None, cursor: str = None) -> AsyncIterator[Tuple[List[Dict], str]]:
+        members = self.archive.iter_members(cursor or "")
+        while True:
+            # Decompressing is CPU work, keep it off the event loop
+            item = await asyncio.to_thread(next, members, None)
+            if item is None:
+                return
+            records, next_cursor = item
+            page = []
+            for record in records:
+                if (oldest is None or float(record["ts"]) > float(oldest)) and (latest is None or float(record["ts"]) <= float(latest)):
+                    page.append(record["root"])
+                    self._threads[record["ts"]] = record["thread"]
+            yield page, next_cursor
+
+    async def get_thread_history(self, thread_ts: str) -> List[Dict]:
+        thread = self._threads.pop(thread_ts, None)
+        if thread is None:
+            archived = await asyncio.to_thread(self.archive.get, thread_ts)
+            thread = archived[1] if archived else []
+        return thread
+
+    async def get_workspace_url(self) -> str:
+        return self.archive.meta.get("workspace_url", "")
+
+    async def get_permalink(self, message_ts: str, thread_ts: str = None) -> str:
+        return build_permalink(await self.get_workspace_url(), self.channel_id, message_ts, thread_ts)
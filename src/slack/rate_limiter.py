@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import time
+from typing import Dict
+
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
+
+from src.slack.slack_channel_history import get_async_client
+
+logger = logging.getLogger(__name__)
+
+# Requests per minute allowed by each Slack Web API rate tier
+# https://api.slack.com/apis/rate-limits
+RATE_TIERS = {1: 1, 2: 20, 3: 50, 4: 100}
+
+METHOD_TIERS = {
+    "auth.test": 4,
+    "chat.getPermalink": 4,
+    "chat.update": 3,
+    "conversations.history": 3,
+    "conversations.info": 3,
+    "conversations.list": 2,
+    "conversations.replies": 3,
+    "team.info": 3,
+    "users.info": 4,
+    "users.list": 2,
+}
+DEFAULT_TIER = 3
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst: float = None):
+        """Initialize the TokenBucket class.
+
+        Args:
+            per_minute: Sustained number of requests allowed per minute
+            burst: Bucket capacity, defaults to a tenth of the per-minute budget
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1.0, per_minute / 10.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for the given time, e.g. after a 429."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self) -> float:
+        """Wait for a token.
+
+        Returns:
+            Seconds spent waiting
+        """
+        start = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return time.monotonic() - start
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _retry_after(error: SlackApiError, default: float) -> float:
+    headers = getattr(error.response, "headers", None) or {}
+    for key, value in headers.items():
+        if key.lower() == "retry-after":
+            try:
+                return float(value if not isinstance(value, list) else value[0])
+            except (TypeError, ValueError):
+                break
+    return default
+
+
+class RateLimitedAsyncClient:
+    """AsyncWebClient wrapper that paces every Web API method with its own token bucket.
+
+    Attribute access mirrors AsyncWebClient, so ``client.conversations_replies(...)``
+    waits for a ``conversations.replies`` token first. A 429 pauses the bucket
+    of that method for the ``Retry-After`` period and the call is retried.
+    """
+
+    def __init__(
+        self,
+        client: AsyncWebClient = None,
+        method_tiers: Dict[str, int] = None,
+        max_retries: int = 5,
+        rate_share: float = 1.0,
+    ):
+        """Initialize the RateLimitedAsyncClient class.
+
+        Args:
+            client: Client to wrap, defaults to the shared AsyncWebClient
+            method_tiers: Overrides of the rate tier per API method
+            max_retries: Number of retries after a rate-limited response
+            rate_share: Fraction of each tier's budget this client may use, for
+                processes that share the workspace limits
+        """
+        self._client = client
+        self.method_tiers = {**METHOD_TIERS, **(method_tiers or {})}
+        self.max_retries = max_retries
+        self.rate_share = rate_share
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._started = time.monotonic()
+
+    @property
+    def client(self) -> AsyncWebClient:
+        return self._client or get_async_client()
+
+    def _bucket(self, api_method: str) -> TokenBucket:
+        if api_method not in self._buckets:
+            tier = self.method_tiers.get(api_method, DEFAULT_TIER)
+            self._buckets[api_method] = TokenBucket(RATE_TIERS[tier] * self.rate_share)
+        return self._buckets[api_method]
+
+    def __getattr__(self, name: str):
+        target = getattr(self.client, name)
+        if name.startswith("_") or not callable(target):
+            return target
+        api_method = name.replace("_", ".", 1)
+
+        async def call(**kwargs):
+            return await self._call(api_method, name, **kwargs)
+
+        return call
+
+    async def _call(self, api_method: str, name: str, **kwargs):
+        bucket = self._bucket(api_method)
+        stats = self._stats.setdefault(api_method, {"requests": 0, "rate_limited": 0, "waited": 0.0})
+        for attempt in range(self.max_retries + 1):
+            stats["waited"] += await bucket.acquire()
+            stats["requests"] += 1
+            try:
+                return await getattr(self.client, name)(**kwargs)
+            except SlackApiError as e:
+                if e.response.status_code != 429 or attempt >= self.max_retries:
+                    raise
+                delay = _retry_after(e, default=60.0 / RATE_TIERS[self.method_tiers.get(api_method, DEFAULT_TIER)])
+                stats["rate_limited"] += 1
+                logger.warning(f"{api_method} rate limited, retrying in {delay:.1f}s")
+                bucket.pause(delay)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """Summarize achieved throughput per API method since the client was created.
+
+        Returns:
+            Mapping of API method to requests, requests_per_second, rate_limited and waited seconds
+        """
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        report = {}
+        for api_method, stats in self._stats.items():
+            report[api_method] = {**stats, "requests_per_second": stats["requests"] / elapsed}
+            logger.info(
+                f"{api_method}: {stats['requests']} requests, "
+                f"{stats['requests'] / elapsed:.2f} req/s, "
+                f"{stats['rate_limited']} rate limited, {stats['waited']:.1f}s waiting for tokens"
+            )
+        return report
@@ -1,59 +1,165 @@
 import os
 import dotenv
 import logging
-from typing import List, Dict
+from typing import List, Dict, Iterator, AsyncIterator, Tuple
+
+import aiohttp
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
+from src.utils.settings import env
 
 
 dotenv.load_dotenv()
 
 SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
 SLACK_APP_TOKEN = os.getenv("SLACK_APP_TOKEN")
+SLACK_HTTP_POOL_SIZE = int(env("SLACK_HTTP_POOL_SIZE", "100"))
+# Point every Slack client at another Web API, such as the offline benchmark's fake server
+SLACK_API_URL = os.getenv("SLACK_API_URL") or WebClient.BASE_URL
+
+# Slack recommends no more than 200 items per page for conversations.* methods
+PAGE_SIZE = 200
+
+_async_client = None
+# Workspace URL from auth.test, e.g. https://acme.slack.com/, fetched once per process
+_workspace_url = None
+
+
+def next_cursor(response) -> str:
+    return (response.get("response_metadata") or {}).get("next_cursor", "")
+
+
+def build_permalink(workspace_url: str, channel_id: str, message_ts: str, thread_ts: str = None) -> str:
+    """Build a message permalink without calling chat.getPermalink.
+
+    Args:
+        workspace_url: Workspace URL as returned by auth.test
+        channel_id: The channel ID
+        message_ts: Timestamp of the message
+        thread_ts: Timestamp of the parent message, for thread replies
+
+    Returns:
+        The permalink, or an empty string if it cannot be derived
+    """
+    if not workspace_url or not channel_id or not message_ts:
+        return ""
+    permalink = f"{workspace_url.rstrip('/')}/archives/{channel_id}/p{message_ts.replace('.', '')}"
+    if thread_ts and thread_ts != message_ts:
+        permalink += f"?thread_ts={thread_ts}&cid={channel_id}"
+    return permalink
 
 
 class SlackChannelHistory:
-    def __init__(self, channel_name: str):
+    def __init__(self, channel_name: str = "", channel_id: str = ""):
         """Initialize the SlackChannelHistory class.
-        
+
         Args:
             channel_name: The name of the Slack channel to monitor
+            channel_id: The channel ID, if already known, to skip the lookup by name
         """
-        self.client = WebClient(token=SLACK_BOT_TOKEN)
-        self.channel_id = self.get_channel_id(channel_name)
+        self.client = WebClient(token=SLACK_BOT_TOKEN, base_url=SLACK_API_URL)
+        self.channel_id = channel_id or (self.get_channel_id(channel_name) if channel_name else "")
+
+    def iter_thread_history_pages(self, thread_ts: str, cursor: str = None, oldest: str = None) -> Iterator[Tuple[List[Dict], str]]:
+        """Stream the replies of a thread page by page.
 
+        Args:
+            thread_ts: Timestamp of the parent message
+            cursor: Cursor to resume from, as yielded by a previous page
+            oldest: Only include replies after this timestamp
+
+        Yields:
+            Tuples of (messages, next_cursor); next_cursor is empty on the last page
+
+        Raises:
+            SlackApiError: If a page cannot be fetched
+        """
+        while True:
+            response = self.client.conversations_replies(
+                channel=self.channel_id, ts=thread_ts, cursor=cursor, oldest=oldest, limit=PAGE_SIZE
+            )
+            cursor = next_cursor(response)
+            yield response['messages'], cursor
+            if not cursor:
+                break
+
+    def iter_thread_history(self, thread_ts: str, oldest: str = None) -> Iterator[Dict]:
+        for messages, _ in self.iter_thread_history_pages(thread_ts, oldest=oldest):
+            yield from messages
 
     def get_thread_history(self, thread_ts: str) -> List[Dict]:
         try:
-            response = self.client.conversations_replies(channel=self.channel_id, ts=thread_ts)
-            return response['messages']
+            return list(self.iter_thread_history(thread_ts))
         except SlackApiError as e:
             logging.error(f"Error fetching thread history: {e}")
             return []
-        
+
+    def iter_channel_history_pages(self, oldest: str = None, latest: str = None, cursor: str = None) -> Iterator[Tuple[List[Dict], str]]:
+        """Stream the channel history page by page, newest messages first.
+
+        A cursor is only valid together with the bounds it was issued for, so
+        resume with the same oldest/latest that produced it.
+
+        Args:
+            oldest: Only include messages after this timestamp
+            latest: Only include messages before this timestamp
+            cursor: Cursor to resume from, as yielded by a previous page
+
+        Yields:
+            Tuples of (messages, next_cursor); next_cursor is empty on the last page
+
+        Raises:
+            SlackApiError: If a page cannot be fetched
+        """
+        while True:
+            response = self.client.conversations_history(
+                channel=self.channel_id, oldest=oldest, latest=latest, cursor=cursor, limit=PAGE_SIZE
+            )
+            cursor = next_cursor(response)
+            yield response['messages'], cursor
+            if not cursor:
+                break
+
+    def iter_channel_history(self, oldest: str = None, latest: str = None) -> Iterator[Dict]:
+        for messages, _ in self.iter_channel_history_pages(oldest=oldest, latest=latest):
+            yield from messages
+
     # Slack channel history
-    def get_channel_history(self) -> List[Dict]:
+    def get_channel_history(self, oldest: str = None, latest: str = None) -> List[Dict]:
         try:
-            response = self.client.conversations_history(channel=self.channel_id)
-            return response['messages']
+            return list(self.iter_channel_history(oldest=oldest, latest=latest))
         except SlackApiError as e:
             logging.error(f"Error fetching channel history: {e}")
             return []
 
+    def iter_channels(self, types: str = None) -> Iterator[Dict]:
+        """Stream every channel visible to the bot, one page at a time.
+
+        Args:
+            types: Comma-separated conversation types, defaults to public channels
+        """
+        cursor = None
+        while True:
+            response = self.client.conversations_list(cursor=cursor, limit=PAGE_SIZE, exclude_archived=True, types=types)
+            yield from response['channels']
+            cursor = next_cursor(response)
+            if not cursor:
+                break
+
     # Get channel ID
     def get_channel_id(self, channel_name: str) -> str:
         """Get the channel ID for a given channel name.
-        
+
         Args:
             channel_name: The name of the Slack channel
-            
+
         Returns:
             The channel ID if found, empty string otherwise
         """
         try:
-            response = self.client.conversations_list()
-            # Search through all channels to find matching name
-            for channel in response['channels']:
+            # Search through all channels to find matching name, stopping at the first match
+            for channel in self.iter_channels():
                 if channel['name'] == channel_name:
                     return channel['id']
             logging.warning(f"Channel '{channel_name}' not found")
@@ -61,8 +167,21 @@ class SlackChannelHistory:
         except SlackApiError as e:
             logging.error(f"Error fetching channel ID: {e}")
             return ""
-        
-    def get_permalink(self, message_ts: str) -> str:
+
+    def get_workspace_url(self) -> str:
+        global _workspace_url
+        if _workspace_url is None:
+            try:
+                _workspace_url = self.client.auth_test()['url']
+            except SlackApiError as e:
+                logging.error(f"Error fetching workspace URL: {e}")
+                return ""
+        return _workspace_url
+
+    def get_permalink(self, message_ts: str, thread_ts: str = None) -> str:
+        permalink = build_permalink(self.get_workspace_url(), self.channel_id, message_ts, thread_ts)
+        if permalink:
+            return permalink
         try:
             response = self.client.chat_getPermalink(channel=self.channel_id, message_ts=message_ts)
             return response['permalink']
@@ -71,3 +190,165 @@ class SlackChannelHistory:
             return ""
 
 
+def get_async_client() -> AsyncWebClient:
+    """Return the process-wide AsyncWebClient.
+
+    The client reuses one aiohttp session, so every coroutine shares the same
+    keep-alive connection pool instead of opening a connection per request.
+    Must be called from inside a running event loop.
+    """
+    global _async_client
+    if _async_client is None or _async_client.session.closed:
+        connector = aiohttp.TCPConnector(limit=SLACK_HTTP_POOL_SIZE, ttl_dns_cache=300)
+        session = aiohttp.ClientSession(connector=connector)
+        _async_client = AsyncWebClient(token=SLACK_BOT_TOKEN, base_url=SLACK_API_URL, session=session)
+    return _async_client
+
+
+async def close_async_client():
+    """Close the shared HTTP session of the async client."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.session.close()
+        _async_client = None
+
+
+class AsyncSlackChannelHistory:
+    def __init__(self, channel_name: str, channel_id: str = "", client: AsyncWebClient = None):
+        """Initialize the AsyncSlackChannelHistory class.
+
+        The channel id is resolved lazily on first use, since the lookup is a
+        network call and cannot run in the constructor.
+
+        Args:
+            channel_name: The name of the Slack channel to monitor
+            channel_id: The channel ID, if already known
+            client: AsyncWebClient to use, defaults to the shared client
+        """
+        self.channel_name = channel_name
+        self.channel_id = channel_id
+        self._client = client
+
+    @property
+    def client(self) -> AsyncWebClient:
+        return self._client or get_async_client()
+
+    async def _ensure_channel_id(self) -> str:
+        if not self.channel_id:
+            self.channel_id = await self.get_channel_id(self.channel_name)
+        return self.channel_id
+
+    async def iter_thread_history_pages(self, thread_ts: str, cursor: str = None, oldest: str = None) -> AsyncIterator[Tuple[List[Dict], str]]:
+        """Async counterpart of SlackChannelHistory.iter_thread_history_pages."""
+        channel_id = await self._ensure_channel_id()
+        while True:
+            response = await self.client.conversations_replies(
+                channel=channel_id, ts=thread_ts, cursor=cursor, oldest=oldest, limit=PAGE_SIZE
+            )
+            cursor = next_cursor(response)
+            yield response['messages'], cursor
+            if not cursor:
+                break
+
+    async def iter_thread_history(self, thread_ts: str, oldest: str = None) -> AsyncIterator[Dict]:
+        async for messages, _ in self.iter_thread_history_pages(thread_ts, oldest=oldest):
+            for message in messages:
+                yield message
+
+    async def get_thread_history(self, thread_ts: str) -> List[Dict]:
+        try:
+            return [message async for message in self.iter_thread_history(thread_ts)]
+        except SlackApiError as e:
+            logging.error(f"Error fetching thread history: {e}")
+            return []
+
+    async def iter_channel_history_pages(self, oldest: str = None, latest: str = None, cursor: str = None) -> AsyncIterator[Tuple[List[Dict], str]]:
+        """Async counterpart of SlackChannelHistory.iter_channel_history_pages."""
+        channel_id = await self._ensure_channel_id()
+        while True:
+            response = await self.client.conversations_history(
+                channel=channel_id, oldest=oldest, latest=latest, cursor=cursor, limit=PAGE_SIZE
+            )
+            cursor = next_cursor(response)
+            yield response['messages'], cursor
+            if not cursor:
+                break
+
+    async def iter_channel_history(self, oldest: str = None, latest: str = None) -> AsyncIterator[Dict]:
+        async for messages, _ in self.iter_channel_history_pages(oldest=oldest, latest=latest):
+            for message in messages:
+                yield message
+
+    # Slack channel history
+    async def get_channel_history(self, oldest: str = None, latest: str = None) -> List[Dict]:
+        try:
+            return [message async for message in self.iter_channel_history(oldest=oldest, latest=latest)]
+        except SlackApiError as e:
+            logging.error(f"Error fetching channel history: {e}")
+            return []
+
+    async def iter_channels(self) -> AsyncIterator[Dict]:
+        cursor = None
+        while True:
+            response = await self.client.conversations_list(cursor=cursor, limit=PAGE_SIZE, exclude_archived=True)
+            for channel in response['channels']:
+                yield channel
+            cursor = next_cursor(response)
+            if not cursor:
+                break
+
+    async def get_channel_info(self, channel_id: str = None) -> Dict:
+        """Get the conversations.info record of a channel, this one by default, empty if it cannot be read."""
+        try:
+            response = await self.client.conversations_info(channel=channel_id or await self._ensure_channel_id())
+            return response['channel']
+        except SlackApiError as e:
+            logging.error(f"Error fetching channel info: {e}")
+            return {}
+
+    async def get_channel_name(self, channel_id: str) -> str:
+        """Get the channel name for a given channel ID, empty string if it cannot be read."""
+        return (await self.get_channel_info(channel_id)).get('name', "")
+
+    # Get channel ID
+    async def get_channel_id(self, channel_name: str) -> str:
+        """Get the channel ID for a given channel name.
+
+        Args:
+            channel_name: The name of the Slack channel
+
+        Returns:
+            The channel ID if found, empty string otherwise
+        """
+        try:
+            # Search through all channels to find matching name, stopping at the first match
+            async for channel in self.iter_channels():
+                if channel['name'] == channel_name:
+                    return channel['id']
+            logging.warning(f"Channel '{channel_name}' not found")
+            return ""
+        except SlackApiError as e:
+            logging.error(f"Error fetching channel ID: {e}")
+            return ""
+
+    async def get_workspace_url(self) -> str:
+        global _workspace_url
+        if _workspace_url is None:
+            try:
+                _workspace_url = (await self.client.auth_test())['url']
+            except SlackApiError as e:
+                logging.error(f"Error fetching workspace URL: {e}")
+                return ""
+        return _workspace_url
+
+    async def get_permalink(self, message_ts: str, thread_ts: str = None) -> str:
+        channel_id = await self._ensure_channel_id()
+        permalink = build_permalink(await self.get_workspace_url(), channel_id, message_ts, thread_ts)
+        if permalink:
+            return permalink
+        try:
+            response = await self.client.chat_getPermalink(channel=channel_id, message_ts=message_ts)
+            return response['permalink']
+        except SlackApiError as e:
+            logging.error(f"Error fetching permalink: {e}")
+            return ""
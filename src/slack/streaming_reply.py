@@ -0,0 +1,88 @@
+import asyncio
+import logging
+
+from slack_sdk.errors import SlackApiError
+
+from src.slack.rate_limiter import RateLimitedAsyncClient
+from src.utils.metrics import span
+from src.utils.settings import env
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between two edits of the same message
+STREAM_UPDATE_INTERVAL = float(env("STREAM_UPDATE_INTERVAL", "1.0"))
+
+
+class StreamingReply:
+    """Progressively edit a placeholder message as an answer is generated.
+
+    ``update`` only records the latest text; a background task sends it with
+    chat.update at most once per ``interval``, so intermediate versions are
+    skipped rather than queued. Calls go through a rate-limited client whose
+    chat.update bucket is shared by every reply in the process.
+    """
+
+    def __init__(self, client: RateLimitedAsyncClient, channel: str, ts: str, thread_ts: str = None, interval: float = STREAM_UPDATE_INTERVAL):
+        """Initialize the StreamingReply class.
+
+        Args:
+            client: Rate-limited client used for chat.update
+            channel: Channel of the placeholder message
+            ts: Timestamp of the placeholder message
+            thread_ts: Thread the message belongs to
+            interval: Minimum seconds between two edits
+        """
+        self.client = client
+        self.channel = channel
+        self.ts = ts
+        self.thread_ts = thread_ts
+        self.interval = interval
+        self._text = None
+        self._sent = None
+        self._changed = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def update(self, text: str):
+        """Show this text at the next edit."""
+        if text and text != self._text:
+            self._text = text
+            self._changed.set()
+
+    async def _run(self):
+        while True:
+            await self._changed.wait()
+            if self._stop.is_set():
+                return
+            self._changed.clear()
+            text = self._text
+            if text != self._sent:
+                try:
+                    with span("slack.chat_update"):
+                        await self.client.chat_update(channel=self.channel, ts=self.ts, text=text, thread_ts=self.thread_ts)
+                    self._sent = text
+                except SlackApiError as e:
+                    logger.warning(f"Could not update streamed reply: {e}")
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=self.interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+    async def finish(self, text: str):
+        """Stop streaming and replace the message with the final text.
+
+        An edit already in flight completes first, so it can never overwrite
+        the final text.
+        """
+        self._stop.set()
+        self._changed.set()
+        if self._task is not None:
+            await self._task
+        if text != self._sent:
+            with span("slack.chat_update"):
+                await self.client.chat_update(channel=self.channel, ts=self.ts, text=text, thread_ts=self.thread_ts)
+            self._sent = text
@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import asyncio
+import uuid
+import logging
+from typing import Dict, Iterable, List, Set
+
+from slack_sdk.web.async_client import AsyncWebClient
+
+from src.slack.slack_channel_history import PAGE_SIZE, get_async_client, next_cursor
+from src.utils.mention_resolver import MENTION_PATTERN
+from src.utils.shared_state import SharedState
+from src.utils.settings import env
+
+logger = logging.getLogger(__name__)
+
+USERS_SNAPSHOT = env("USERS_SNAPSHOT", "users.json")
+USERS_TTL = float(env("USERS_TTL", "3600"))
+
+
+def user_display_name(user: Dict) -> str:
+    """Pick the name to show for a users.list / users.info member."""
+    profile = user.get("profile") or {}
+    return user.get("real_name") or profile.get("real_name") or profile.get("display_name") or user.get("name") or user["id"]
+
+
+class UserDirectory:
+    def __init__(self, snapshot_path: str = USERS_SNAPSHOT, ttl: float = USERS_TTL, client: AsyncWebClient = None, state: SharedState = None):
+        """Initialize the UserDirectory class.
+
+        Names are served from memory. The on-disk snapshot gives a fast cold
+        start, the whole directory is reloaded with a paginated users.list in
+        the background once it is older than ``ttl``, and users missing from
+        it are looked up with users.info on demand.
+
+        With a state shared between bot processes, one process reloads the
+        directory and the others pick up its snapshot, and users looked up
+        by one process are shared with the others.
+
+        Args:
+            snapshot_path: JSON file mapping user ID to name
+            ttl: Seconds after which the directory is reloaded from Slack
+            client: AsyncWebClient to use, defaults to the shared client
+            state: State shared with other bot processes, if any
+        """
+        self.snapshot_path = snapshot_path
+        self.ttl = ttl
+        self._client = client
+        # Shared by reference with MentionResolver, so it must only be updated in place
+        self.users_store: Dict[str, str] = {}
+        self.loaded_at = 0.0
+        self._refresh_task = None
+        self._lookups: Dict[str, asyncio.Future] = {}
+        # User IDs that users.info could not resolve, with the time of the attempt
+        self._misses: Dict[str, float] = {}
+        self.state = state
+        self._shared_users = state.cache("users", maxsize=100000, ttl=ttl) if state is not None and state.is_shared else None
+        self.load_snapshot()
+
+    @property
+    def client(self) -> AsyncWebClient:
+        return self._client or get_async_client()
+
+    def load_snapshot(self):
+        """Load the on-disk snapshot, if there is one."""
+        try:
+            with open(self.snapshot_path, "r") as f:
+                self.users_store.update(json.load(f))
+            self.loaded_at = os.path.getmtime(self.snapshot_path)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logger.warning(f"Could not load user snapshot {self.snapshot_path}: {e}")
+
+    def save_snapshot(self):
+        """Write the directory to disk atomically."""
+        # Per process, bot processes sharing the snapshot may save at the same time
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.users_store, f)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def _snapshot_mtime(self) -> float:
+        try:
+            return os.path.getmtime(self.snapshot_path)
+        except FileNotFoundError:
+            return 0.0
+
+    @property
+    def is_stale(self) -> bool:
+        return time.time() - self.loaded_at > self.ttl
+
+    async def refresh(self) -> int:
+        """Reload every user with a paginated users.list and save a new snapshot.
+
+        Returns:
+            Number of users loaded, 0 if the list could not be fetched
+        """
+        users = {}
+        cursor = None
+        try:
+            while True:
+                response = await self.client.users_list(cursor=cursor, limit=PAGE_SIZE)
+                for user in response["members"]:
+                    users[user["id"]] = user_display_name(user)
+                cursor = next_cursor(response)
+                if not cursor:
+                    break
+        except Exception as e:
+            # Network, timeout and decoding errors too, the directory keeps serving the snapshot
+            logger.error(f"Error loading user list: {e!r}")
+            return 0
+
+        self.users_store.update(users)
+        self.loaded_at = time.time()
+        self._misses.clear()
+        try:
+            self.save_snapshot()
+        except OSError as e:
+            logger.error(f"Could not save user snapshot {self.snapshot_path}: {e}")
+        logger.info(f"Loaded {len(users)} users into the directory")
+        return len(users)
+
+    async def _refresh_once(self):
+        """Reload the directory, unless another bot process already is."""
+        owner = uuid.uuid4().hex
+        if not await self.state.aclaim("users:refresh", ttl=self.ttl, owner=owner):
+            return
+        try:
+            await self.refresh()
+        finally:
+            # Others pick up the new snapshot, or try again themselves if this reload failed
+            await self.state.arelease("users:refresh", owner=owner)
+
+    async def ensure_fresh(self, wait: bool = False):
+        """Reload the directory in the background if it is older than the TTL.
+
+        Args:
+            wait: Block until the reload is done, e.g. when there is no snapshot yet
+        """
+        if self.is_stale and self.state is not None and self._snapshot_mtime() > self.loaded_at:
+            # Another bot process reloaded the directory
+            self.load_snapshot()
+        if self.is_stale and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self._refresh_once() if self.state is not None else self.refresh())
+        if wait and self._refresh_task is not None:
+            await self._refresh_task
+
+    async def _lookup(self, user_id: str):
+        if self._shared_users is not None:
+            name = await self._shared_users.aget(user_id)
+            if name is not None:
+                self.users_store[user_id] = name
+                return
+        try:
+            response = await self.client.users_info(user=user_id)
+            self.users_store[user_id] = user_display_name(response["user"])
+            if self._shared_users is not None:
+                await self._shared_users.aset(user_id, self.users_store[user_id])
+        except Exception as e:
+            # Network errors too, an unknown name must not fail the message it appears in
+            logger.warning(f"Could not look up user {user_id}: {e}")
+            self._misses[user_id] = time.time()
+
+    async def ensure_users(self, user_ids: Iterable[str]):
+        """Look up, concurrently, every given user missing from the directory.
+
+        Lookups already in flight are shared, and failed lookups are not
+        retried until the TTL expires.
+        """
+        now = time.time()
+        missing: Set[str] = {
+            user_id for user_id in user_ids
+            if user_id not in self.users_store and now - self._misses.get(user_id, 0) > self.ttl
+        }
+        if not missing:
+            return
+        futures = []
+        for user_id in missing:
+            if user_id not in self._lookups:
+                future = asyncio.ensure_future(self._lookup(user_id))
+                future.add_done_callback(lambda _, user_id=user_id: self._lookups.pop(user_id, None))
+                self._lookups[user_id] = future
+            futures.append(self._lookups[user_id])
+        await asyncio.gather(*futures)
+        # With shared state, lookups are shared through it and the snapshot only changes on reload
+        if self._shared_users is None and any(user_id in self.users_store for user_id in missing):
+            self.save_snapshot()
+
+    @staticmethod
+    def user_ids_in(messages: List[Dict]) -> Set[str]:
+        """Collect authors and mentioned users of the given messages."""
+        user_ids = set()
+        for message in messages:
+            if message.get("user"):
+                user_ids.add(message["user"])
+            user_ids.update(MENTION_PATTERN.findall(message.get("text") or ""))
+        return user_ids
+
+    def name(self, user_id: str) -> str:
+        return self.users_store.get(user_id, user_id)
+
+    def author(self, message: Dict) -> str:
+        """Name of the author of a message, including bot messages without a user field."""
+        if message.get("user"):
+            return self.name(message["user"])
+        bot_profile = message.get("bot_profile") or {}
+        return message.get("username") or bot_profile.get("name") or message.get("bot_id") or "Unknown"
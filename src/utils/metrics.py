@@ -0,0 +1,261 @@
+import json
+import time
+import asyncio
+import logging
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.utils.cache import TTLCache
+from src.utils.settings import env
+
+logger = logging.getLogger(__name__)
+
+# JSON-lines file receiving one record per mention and periodic histogram snapshots
+METRICS_LOG = env("METRICS_LOG", "")
+# Serve GET /metrics with a JSON snapshot on localhost at this port, 0 to disable
+METRICS_PORT = int(env("METRICS_PORT", "0"))
+METRICS_SNAPSHOT_INTERVAL = float(env("METRICS_SNAPSHOT_INTERVAL", "60"))
+# Full LangChain debug output of every prompt and response, for local debugging only
+LANGCHAIN_DEBUG = env("LANGCHAIN_DEBUG", "false").lower() in ("1", "true", "yes")
+
+# Upper bounds in milliseconds of the histogram buckets
+BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+
+class Histogram:
+    """Bucketed counts of observations plus a window of recent values for percentiles."""
+
+    def __init__(self, bounds: List[float] = BUCKETS_MS, window: int = 1024):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        recent = sorted(self.recent)
+
+        def percentile(p: float) -> float:
+            return recent[min(len(recent) - 1, int(p * len(recent)))] if recent else 0.0
+
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "p50": round(percentile(0.5), 3),
+            "p95": round(percentile(0.95), 3),
+            "p99": round(percentile(0.99), 3),
+            "max": round(recent[-1], 3) if recent else 0.0,
+            "buckets": {f"le_{bound}": count for bound, count in zip(self.bounds + ["inf"], self.buckets)},
+        }
+
+
+class MetricsRegistry:
+    """Process-wide histograms, counters and gauges."""
+
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, Callable[[], Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(value)
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def register_gauge(self, name: str, read: Callable[[], Any]):
+        """Report the value returned by ``read`` in every snapshot."""
+        self.gauges[name] = read
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = {
+                "histograms_ms": {name: histogram.snapshot() for name, histogram in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+        snapshot["gauges"] = {}
+        for name, read in self.gauges.items():
+            try:
+                snapshot["gauges"][name] = read()
+            except Exception as e:
+                snapshot["gauges"][name] = repr(e)
+        return snapshot
+
+
+metrics = MetricsRegistry()
+
+
+class Trace:
+    """Stages, loop and tool counts and token usage of one unit of work, such as a mention."""
+
+    def __init__(self, name: str, **fields):
+        self.name = name
+        self.fields = fields
+        self.stages: List[List] = []
+        self.counts: Dict[str, float] = {}
+
+    def add_stage(self, stage: str, ms: float):
+        self.stages.append([stage, round(ms, 3)])
+
+    def add(self, name: str, value: float = 1):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_log_lock = threading.Lock()
+
+
+def write_record(record: Dict[str, Any]):
+    """Append a record to the JSON-lines metrics log, if one is configured."""
+    if not METRICS_LOG:
+        return
+    line = json.dumps({"time": time.time(), **record}, ensure_ascii=False, default=str)
+    with _log_lock, open(METRICS_LOG, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+@contextmanager
+def span(name: str):
+    """Time a stage into the ``name`` histogram and the current trace."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - started) * 1000
+        metrics.observe(name, ms)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_stage(name, ms)
+
+
+def count(name: str, value: float = 1):
+    """Add to the ``name`` counter and to the current trace."""
+    metrics.increment(name, value)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, value)
+
+
+@contextmanager
+def trace(name: str, **fields):
+    """Collect the spans and counts of everything run inside, including tasks it starts.
+
+    The total time goes to the ``{name}.total`` histogram, and the whole trace
+    is written to the metrics log as one record.
+    """
+    current = Trace(name, **fields)
+    token = _current_trace.set(current)
+    started = time.perf_counter()
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        _current_trace.reset(token)
+        total = (time.perf_counter() - started) * 1000
+        metrics.observe(f"{name}.total", total)
+        write_record({
+            "trace": name,
+            **current.fields,
+            "total_ms": round(total, 3),
+            "stages": current.stages,
+            "counts": current.counts,
+            **({"error": error} if error else {}),
+        })
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Times every tool call and counts tokens of every LLM call made by the agent."""
+
+    # Run in the event loop rather than an executor, so the current trace is visible
+    run_inline = True
+
+    def __init__(self):
+        # Bounded, since a tool call cancelled at its deadline never reports an end
+        self._started = TTLCache(maxsize=1024, ttl=3600)
+
+    def on_tool_start(self, serialized: Dict, input_str: str, *, run_id, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._started.set(run_id, (name, time.perf_counter(), _current_trace.get()))
+
+    def _tool_done(self, run_id, failed: bool):
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        name, start, trace = started
+        ms = (time.perf_counter() - start) * 1000
+        metrics.observe(f"tool.{name}", ms)
+        metrics.increment("agent.tool_calls")
+        if failed:
+            metrics.increment("agent.tool_errors")
+        if trace is not None:
+            trace.add_stage(f"tool.{name}", ms)
+            trace.add("agent.tool_calls")
+
+    def on_tool_end(self, output: Any, *, run_id, **kwargs):
+        self._tool_done(run_id, failed=False)
+
+    def on_tool_error(self, error: BaseException, *, run_id, **kwargs):
+        self._tool_done(run_id, failed=True)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    count("llm.prompt_tokens", usage.get("input_tokens", 0))
+                    count("llm.completion_tokens", usage.get("output_tokens", 0))
+
+
+def configure_debug():
+    """Turn on LangChain's verbose debug output if LANGCHAIN_DEBUG is set."""
+    if LANGCHAIN_DEBUG:
+        from langchain_core.globals import set_debug
+        set_debug(True)
+        logger.warning("LANGCHAIN_DEBUG is on, every prompt and response is printed")
+
+
+async def report_periodically(interval: float = METRICS_SNAPSHOT_INTERVAL):
+    """Write a snapshot of all metrics to the metrics log every ``interval`` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        write_record({"snapshot": metrics.snapshot()})
+
+
+async def serve_metrics(port: int = METRICS_PORT):
+    """Serve GET /metrics with a JSON snapshot on localhost.
+
+    Returns:
+        The aiohttp AppRunner, to be cleaned up on shutdown
+    """
+    from aiohttp import web
+
+    async def handle(request):
+        return web.json_response(metrics.snapshot(), dumps=lambda data: json.dumps(data, default=str))
+
+    server = web.Application()
+    server.router.add_get("/metrics", handle)
+    runner = web.AppRunner(server)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    logger.info(f"Serving metrics on http://127.0.0.1:{port}/metrics")
+    return runner
@@ -0,0 +1,10 @@
+import os
+
+
+def env(name: str, default: str = "") -> str:
+    """Value of an environment setting, or ``default`` when it is unset or empty.
+
+    .env.example lists every setting with an empty value, so an empty value
+    means "not configured" rather than an empty string.
+    """
+    return os.getenv(name) or default
@@ -0,0 +1,337 @@
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, List, Tuple
+
+from src.utils.cache import TTLCache
+from src.utils.settings import env
+
+logger = logging.getLogger(__name__)
+
+# "memory" for a single bot process, or "sqlite" to share state between processes on one host
+SHARED_STATE = env("SHARED_STATE", "memory")
+SHARED_STATE_PATH = env("SHARED_STATE_PATH", "shared_state.sqlite3")
+# Seconds after which a lock whose holder died is taken over; a live holder renews it
+SHARED_LOCK_TTL = float(env("SHARED_LOCK_TTL", "60"))
+# Seconds a SQLite statement waits for another process's write before it fails
+SHARED_STATE_BUSY_TIMEOUT = 5.0
+
+
+class SharedState(ABC):
+    """State that bot processes answering the same workspace must agree on.
+
+    A claim is a key held by one owner until it is released or its ttl
+    passes; it deduplicates events and backs the locks. Caches are named
+    namespaces with the get / set / pop / clear interface of TTLCache;
+    keys are strings and values must be JSON-serializable.
+
+    A backend shared between processes may wait on the others, so code on
+    the event loop uses the async forms (``aclaim``, ``arelease`` and the
+    caches' ``aget`` / ``aset`` / ``apop``), which run such calls in a thread.
+    """
+
+    # Whether other processes see this state, so callers can skip work a single process does not need
+    is_shared = False
+
+    @abstractmethod
+    def claim(self, key: str, ttl: float, owner: str = "") -> bool:
+        """Take the key unless someone else holds it; True if this caller now holds it."""
+
+    @abstractmethod
+    def release(self, key: str, owner: str = ""):
+        """Give the key up, if the owner still holds it."""
+
+    @abstractmethod
+    def renew(self, key: str, ttl: float, owner: str = "") -> bool:
+        """Hold the key for another ``ttl`` seconds; False if the owner no longer holds it."""
+
+    @abstractmethod
+    def cache(self, namespace: str, maxsize: int = 1024, ttl: float = None) -> "AsyncCache":
+        """A cache shared under ``namespace``."""
+
+    async def aclaim(self, key: str, ttl: float, owner: str = "") -> bool:
+        return self.claim(key, ttl, owner)
+
+    async def arelease(self, key: str, owner: str = ""):
+        self.release(key, owner)
+
+    async def arenew(self, key: str, ttl: float, owner: str = "") -> bool:
+        return self.renew(key, ttl, owner)
+
+    @asynccontextmanager
+    async def lock(self, name: str, ttl: float = SHARED_LOCK_TTL, poll: float = 0.05):
+        """Hold a named lock, waiting for it if another task or process has it.
+
+        The lock is a lease renewed every third of ``ttl`` while it is held,
+        so it lasts as long as the work under it, and is free again ``ttl``
+        seconds after its holder dies.
+        """
+        owner = uuid.uuid4().hex
+        key = f"lock:{name}"
+        delay = poll
+        while not await self.aclaim(key, ttl, owner):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+        async def keep_alive():
+            while True:
+                await asyncio.sleep(ttl / 3)
+                try:
+                    if not await self.arenew(key, ttl, owner):
+                        logger.warning(f"Lost lock {name}, it was held past its lease")
+                        return
+                except Exception as e:
+                    # The lease is still valid until ttl passes, try again at the next renewal
+                    logger.warning(f"Could not renew lock {name}: {e}")
+
+        renewal = asyncio.create_task(keep_alive())
+        try:
+            yield
+        finally:
+            renewal.cancel()
+            await self.arelease(key, owner)
+
+
+class AsyncCache:
+    """Async forms of get / set / pop, run in a thread when the cache may wait on another process."""
+
+    blocking = False
+
+    async def _run(self, method, *args):
+        if self.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def aget(self, key: str, default: Any = None) -> Any:
+        return await self._run(self.get, key, default)
+
+    async def aset(self, key: str, value: Any):
+        await self._run(self.set, key, value)
+
+    async def apop(self, key: str, default: Any = None) -> Any:
+        return await self._run(self.pop, key, default)
+
+
+class MemoryCache(AsyncCache, TTLCache):
+    """Cache of a MemorySharedState."""
+
+
+class MemorySharedState(SharedState):
+    """SharedState of a single process, kept in memory."""
+
+    def __init__(self, maxsize: int = 100000):
+        """Initialize the MemorySharedState class.
+
+        Args:
+            maxsize: Maximum number of claims kept; the least recently used is evicted first
+        """
+        # (owner, expires_at) per key
+        self._claims = TTLCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def claim(self, key: str, ttl: float, owner: str = "") -> bool:
+        with self._lock:
+            held = self._claims.get(key)
+            if held is not None and held[1] > time.time():
+                return False
+            self._claims.set(key, (owner, time.time() + ttl))
+            return True
+
+    def release(self, key: str, owner: str = ""):
+        with self._lock:
+            held = self._claims.get(key)
+            if held is not None and held[0] == owner:
+                self._claims.pop(key)
+
+    def renew(self, key: str, ttl: float, owner: str = "") -> bool:
+        with self._lock:
+            held = self._claims.get(key)
+            if held is None or held[0] != owner:
+                return False
+            self._claims.set(key, (owner, time.time() + ttl))
+            return True
+
+    def cache(self, namespace: str, maxsize: int = 1024, ttl: float = None) -> MemoryCache:
+        return MemoryCache(maxsize=maxsize, ttl=ttl)
+
+
+class SQLiteCache(AsyncCache):
+    """Namespace of the cache table of a SQLiteSharedState, with the interface of TTLCache."""
+
+    blocking = True
+
+    def __init__(self, state: "SQLiteSharedState", namespace: str, maxsize: int = 1024, ttl: float = None):
+        self.state = state
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        rows = self.state.query(
+            "SELECT value FROM cache WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (self.namespace, key, time.time()),
+        )
+        if not rows:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(rows[0][0])
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        self.state.write(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (self.namespace, key, json.dumps(value), now + self.ttl if self.ttl else None, now),
+        )
+        self._writes += 1
+        # Trimming is a range scan, so only do it every so often
+        if self._writes % 100 == 0:
+            self.trim()
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        value = self.get(key)
+        self.state.write("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+        return default if value is None else value
+
+    def clear(self):
+        self.state.write("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+
+    def trim(self):
+        """Drop expired entries and the least recently written beyond ``maxsize``."""
+        self.state.write(
+            "DELETE FROM cache WHERE namespace = ? AND (expires_at <= ? OR key IN ("
+            "SELECT key FROM cache WHERE namespace = ? ORDER BY updated_at DESC LIMIT -1 OFFSET ?))",
+            (self.namespace, time.time(), self.namespace, self.maxsize),
+        )
+
+    def changed_since(self, since: float) -> List[Tuple[str, Any, float]]:
+        """Live entries written after ``since``, as (key, value, updated_at) in write order."""
+        rows = self.state.query(
+            "SELECT key, value, updated_at FROM cache WHERE namespace = ? AND updated_at > ? "
+            "AND (expires_at IS NULL OR expires_at > ?) ORDER BY updated_at",
+            (self.namespace, since, time.time()),
+        )
+        return [(key, json.loads(value), updated_at) for key, value, updated_at in rows]
+
+    async def achanged_since(self, since: float) -> List[Tuple[str, Any, float]]:
+        return await self._run(self.changed_since, since)
+
+    def __len__(self) -> int:
+        return self.state.query("SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,))[0][0]
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class SQLiteSharedState(SharedState):
+    """SharedState in a SQLite file, for bot processes on one host.
+
+    Claims are a single conditional upsert, so exactly one process wins a
+    key. The database is in WAL mode, so readers never wait for writers,
+    and expired claims are cleaned up as new ones are made. A statement
+    waits at most SHARED_STATE_BUSY_TIMEOUT for another process's write.
+    """
+
+    is_shared = True
+
+    def __init__(self, path: str = SHARED_STATE_PATH):
+        """Initialize the SQLiteSharedState class.
+
+        Args:
+            path: Database file, the same for every process
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._claims = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=SHARED_STATE_BUSY_TIMEOUT)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS claims (
+                key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            );
+            CREATE INDEX IF NOT EXISTS cache_updated_at ON cache (namespace, updated_at);
+            """
+        )
+        self._conn.commit()
+
+    def query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def write(self, sql: str, params: tuple = ()) -> int:
+        """Run one statement in its own transaction; returns the number of rows changed."""
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor.rowcount
+
+    def claim(self, key: str, ttl: float, owner: str = "") -> bool:
+        now = time.time()
+        claimed = self.write(
+            "INSERT INTO claims (key, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE claims.expires_at <= ?",
+            (key, owner, now + ttl, now),
+        )
+        self._claims += 1
+        if self._claims % 1000 == 0:
+            self.write("DELETE FROM claims WHERE expires_at <= ?", (now,))
+        return claimed == 1
+
+    def release(self, key: str, owner: str = ""):
+        self.write("DELETE FROM claims WHERE key = ? AND owner = ?", (key, owner))
+
+    def renew(self, key: str, ttl: float, owner: str = "") -> bool:
+        return self.write(
+            "UPDATE claims SET expires_at = ? WHERE key = ? AND owner = ?", (time.time() + ttl, key, owner)
+        ) == 1
+
+    async def aclaim(self, key: str, ttl: float, owner: str = "") -> bool:
+        return await asyncio.to_thread(self.claim, key, ttl, owner)
+
+    async def arelease(self, key: str, owner: str = ""):
+        await asyncio.to_thread(self.release, key, owner)
+
+    async def arenew(self, key: str, ttl: float, owner: str = "") -> bool:
+        return await asyncio.to_thread(self.renew, key, ttl, owner)
+
+    def cache(self, namespace: str, maxsize: int = 1024, ttl: float = None) -> SQLiteCache:
+        return SQLiteCache(self, namespace, maxsize=maxsize, ttl=ttl)
+
+
+def open_shared_state(backend: str = SHARED_STATE, path: str = SHARED_STATE_PATH) -> SharedState:
+    """Open the shared state with the configured backend."""
+    if backend == "sqlite":
+        return SQLiteSharedState(path)
+    if backend == "memory":
+        return MemorySharedState()
+    raise ValueError(f"Unknown SHARED_STATE {backend!r}, expected 'memory' or 'sqlite'")
+
+
+@lru_cache(maxsize=None)
+def get_shared_state() -> SharedState:
+    """The shared state of this process, opened on first use."""
+    return open_shared_state()
@@ -0,0 +1,30 @@
+import logging
+from functools import lru_cache
+from typing import Optional
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = DEFAULT_MODEL) -> Optional[tiktoken.Encoding]:
+    """Tokenizer of the model, or None if its vocabulary cannot be loaded (it is downloaded on first use)."""
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"Could not load tokenizer for {model}, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    encoding = get_encoding(model)
+    if encoding is None:
+        # Roughly four bytes of UTF-8 per token
+        return len(text.encode("utf-8")) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
@@ -1,10 +1,18 @@
+import re
+import asyncio
+import hashlib
 import logging
-from typing import ClassVar, Type
+from contextvars import ContextVar
+from typing import ClassVar, List, Optional, Type
 
 from langchain.tools import BaseTool
 from langchain_openai import ChatOpenAI
 from pydantic import Field, BaseModel
 
+from src.utils.shared_state import get_shared_state
+from src.utils.tokens import count_tokens
+from src.utils.settings import env
+
 
 # Configure logging
 logging.basicConfig(
@@ -13,6 +21,48 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Longest part of a thread, in tokens, summarized in one call
+SUMMARY_CHUNK_TOKENS = int(env("SUMMARY_CHUNK_TOKENS", "6000"))
+SUMMARY_CONCURRENCY = int(env("SUMMARY_CONCURRENCY", "4"))
+THREAD_SUMMARY_TTL = float(env("THREAD_SUMMARY_TTL", "86400"))
+
+SUMMARY_PROMPT = """Tóm tắt cuộc hội thoại sau trong Slack. Chỉ nêu các ý chính liên quan đến công việc, bao gồm các quyết định được đưa ra, các hành động cần thực hiện, ai chịu trách nhiệm và các mốc thời gian (nếu có). Bỏ qua các đoạn trò chuyện xã giao hoặc không liên quan. Trình bày ngắn gọn, rõ ràng dưới dạng gạch đầu dòng: \n{thread}"""
+UPDATE_PROMPT = """Dưới đây là bản tóm tắt hiện có của một cuộc hội thoại trong Slack và các tin nhắn mới được gửi sau đó. Cập nhật bản tóm tắt với các ý chính từ tin nhắn mới: các quyết định, các hành động cần thực hiện, ai chịu trách nhiệm và các mốc thời gian (nếu có). Giữ nguyên định dạng gạch đầu dòng, ngắn gọn, rõ ràng.
+Bản tóm tắt hiện có:
+{summary}
+
+Tin nhắn mới:
+{thread}"""
+MERGE_PROMPT = """Dưới đây là các bản tóm tắt của những phần liên tiếp trong một cuộc hội thoại Slack, theo thứ tự thời gian. Gộp chúng thành một bản tóm tắt duy nhất dưới dạng gạch đầu dòng, bỏ các ý trùng lặp, giữ các quyết định, hành động cần thực hiện, người chịu trách nhiệm và các mốc thời gian:
+{summaries}"""
+
+# Latest summary per thread, with the number of lines it covers and their hash, shared by every bot process
+summary_cache = get_shared_state().cache("thread_summaries", maxsize=1024, ttl=THREAD_SUMMARY_TTL)
+# "channel:thread_ts" of the thread being answered, the summary cache key; thread timestamps are only unique per channel
+current_thread: ContextVar[Optional[str]] = ContextVar("current_thread", default=None)
+
+
+def current_channel() -> Optional[str]:
+    """Id of the channel of the thread being answered, which decides the private channels it may search."""
+    thread = current_thread.get()
+    return thread.split(":", 1)[0] if thread else None
+
+
+def thread_lines(thread: str) -> List[str]:
+    """Non-empty lines of a thread with whitespace normalized, so retyped copies hash alike."""
+    return [line for line in (re.sub(r"\s+", " ", raw).strip() for raw in thread.splitlines()) if line]
+
+
+def prefix_hashes(lines: List[str]) -> List[str]:
+    """SHA-256 of every prefix of the lines, in a single pass."""
+    digest = hashlib.sha256()
+    hashes = []
+    for line in lines:
+        digest.update(line.encode("utf-8") + b"\n")
+        hashes.append(digest.copy().hexdigest())
+    return hashes
+
+
 class TomTatThreadInput(BaseModel):
     thread: str = Field(description="Nội dung thread cần tóm tắt")
 
@@ -26,9 +76,56 @@ class TomTatThreadTool(BaseTool):
     def __init__(self, model: ChatOpenAI) -> None:
         super().__init__(model=model)
         
+    def _chunks(self, lines: List[str]) -> List[str]:
+        chunks, chunk, chunk_tokens = [], [], 0
+        for line in lines:
+            tokens = count_tokens(line, self.model.model_name)
+            if chunk and chunk_tokens + tokens > SUMMARY_CHUNK_TOKENS:
+                chunks.append("\n".join(chunk))
+                chunk, chunk_tokens = [], 0
+            chunk.append(line)
+            chunk_tokens += tokens
+        if chunk:
+            chunks.append("\n".join(chunk))
+        return chunks
+
+    async def _complete(self, prompt: str) -> str:
+        response = await self.model.ainvoke(prompt)
+        return response.content
+
+    async def _summarize(self, lines: List[str]) -> str:
+        """Summarize in one call, or map-reduce over chunks summarized concurrently."""
+        chunks = self._chunks(lines)
+        if len(chunks) == 1:
+            return await self._complete(SUMMARY_PROMPT.format(thread=chunks[0]))
+
+        semaphore = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+
+        async def summarize_chunk(chunk: str) -> str:
+            async with semaphore:
+                return await self._complete(SUMMARY_PROMPT.format(thread=chunk))
+
+        summaries = await asyncio.gather(*(summarize_chunk(chunk) for chunk in chunks))
+        logger.info(f"Summarized {len(lines)} lines in {len(chunks)} chunks")
+        return await self._complete(MERGE_PROMPT.format(summaries="\n\n".join(summaries)))
+
+    async def _update(self, summary: str, tail: List[str]) -> str:
+        """Fold the new tail of a thread into its earlier summary."""
+        tail_text = "\n".join(tail)
+        if count_tokens(tail_text, self.model.model_name) <= SUMMARY_CHUNK_TOKENS:
+            return await self._complete(UPDATE_PROMPT.format(summary=summary, thread=tail_text))
+        tail_summary = await self._summarize(tail)
+        return await self._complete(MERGE_PROMPT.format(summaries=f"{summary}\n\n{tail_summary}"))
+
     async def _arun(self, thread: str) -> str:
         """Tóm tắt thread
         
+        Unchanged threads are served from the summary cache. If an earlier
+        version of the thread was summarized, only the new messages are sent
+        to the model and merged into that summary. Summaries are cached per
+        thread, or by the first line when no thread is being answered, and
+        only reused while the lines they cover are unchanged.
+
         Args:
             thread: Nội dung thread cần tóm tắt
             
@@ -37,10 +134,24 @@ class TomTatThreadTool(BaseTool):
         """
         try:
             logger.info("Sử dụng tool tom_tat_thread")
-            prompt = f"""Tóm tắt cuộc hội thoại sau trong Slack. Chỉ nêu các ý chính liên quan đến công việc, bao gồm các quyết định được đưa ra, các hành động cần thực hiện, ai chịu trách nhiệm và các mốc thời gian (nếu có). Bỏ qua các đoạn trò chuyện xã giao hoặc không liên quan. Trình bày ngắn gọn, rõ ràng dưới dạng gạch đầu dòng: \n{thread}"""
-            
-            response = await self.model.ainvoke(prompt)
-            return response.content
+            lines = thread_lines(thread)
+            if not lines:
+                return "Thread không có nội dung để tóm tắt."
+            hashes = prefix_hashes(lines)
+            key = current_thread.get() or hashes[0]
+            cached = await summary_cache.aget(key)
+            end = cached["lines"] if cached else 0
+            if cached and end <= len(lines) and hashes[end - 1] == cached["hash"]:
+                if end == len(lines):
+                    logger.info("Summary cache hit")
+                    return cached["summary"]
+                logger.info(f"Summarizing {len(lines) - end} new of {len(lines)} lines")
+                summary = await self._update(cached["summary"], lines[end:])
+            else:
+                summary = await self._summarize(lines)
+
+            await summary_cache.aset(key, {"lines": len(lines), "hash": hashes[-1], "summary": summary})
+            return summary
             
         except Exception as e:
             logger.error(f"Error in tom_tat_thread: {str(e)}")
@@ -0,0 +1,51 @@
+import os
+import socket
+import sys
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+import pytest
+
+# Tests import the application as ``src.*``, like ``python -m`` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Settings are read at import time, so they must be in place before the first src import.
+# Tests that talk to Slack serve a FakeSlackServer on this port.
+os.environ.update({
+    "SLACK_API_URL": f"http://127.0.0.1:{_free_port()}/api/",
+    "SLACK_BOT_TOKEN": "xoxb-test",
+    "SLACK_APP_TOKEN": "xapp-test",
+    "OPENAI_API_KEY": "sk-test",
+    "VECTOR_STORE_BACKEND": "numpy",
+    "HISTORY_ARCHIVE": "false",
+    "SHARED_STATE": "memory",
+    "LIVE_INDEXING": "false",
+    "ANSWER_CACHE": "false",
+    "RETRIEVAL_RESULT_CACHE_TTL": "0",
+})
+
+
+@pytest.fixture
+def fake_slack():
+    """Serve a workspace at SLACK_API_URL for the duration of an ``async with`` block."""
+    from src.bench.fake_slack import FakeSlackServer
+    from src.slack.slack_channel_history import SLACK_API_URL, close_async_client
+
+    @asynccontextmanager
+    async def serve(workspace, **kwargs):
+        server = FakeSlackServer(workspace, latency=0, jitter=0, **kwargs)
+        await server.start(port=urlparse(SLACK_API_URL).port)
+        try:
+            yield server
+        finally:
+            await close_async_client()
+            await server.close()
+
+    return serve
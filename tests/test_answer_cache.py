@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+import pytest
+
+from src.ai import answer_cache
+from src.ai.answer_cache import PUBLIC_SCOPE, SemanticAnswerCache
+from src.bench.fakes import HashEmbeddings
+from src.utils.shared_state import MemorySharedState, SQLiteSharedState
+
+QUESTION = "How do I rotate the staging database password?"
+
+
+@pytest.fixture(autouse=True)
+def embeddings(tmp_path, monkeypatch):
+    # The index version is read relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(answer_cache, "embed_query", HashEmbeddings().embed_query)
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_answers_are_only_reused_in_their_scope(tmp_path, shared):
+    state = SQLiteSharedState(str(tmp_path / "shared_state.sqlite3")) if shared else MemorySharedState()
+    cache = SemanticAnswerCache(state=state)
+
+    async def run():
+        await cache.store(QUESTION, "Ask #ops for the vault path.", 2.0, scope="G-leadership")
+        other_scope = await cache.lookup(QUESTION, PUBLIC_SCOPE)
+        await cache.store(QUESTION, "Run the rotate-password job.", 2.0)
+        return other_scope, await cache.lookup(QUESTION), await cache.lookup(QUESTION, "G-leadership")
+
+    other_scope, public, private = asyncio.run(run())
+    assert other_scope is None
+    assert public[0] == "Run the rotate-password job."
+    assert private[0] == "Ask #ops for the vault path."
+
+
+def test_shared_answers_without_a_scope_are_not_reused(tmp_path):
+    state = SQLiteSharedState(str(tmp_path / "shared_state.sqlite3"))
+    cache = SemanticAnswerCache(state=state)
+
+    async def run():
+        # Stored by a bot from before answers had scopes, possibly in a private channel
+        await state.cache("answers").aset(QUESTION.lower(), {
+            "question": QUESTION, "answer": "From a private channel.", "created_at": time.time(), "latency": 2.0,
+            "vector": answer_cache.embed_query(QUESTION), "version": answer_cache.index_version(),
+        })
+        return await cache.lookup(QUESTION)
+
+    assert asyncio.run(run()) is None
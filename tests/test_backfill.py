@@ -0,0 +1,218 @@
+import asyncio
+import json
+from urllib.parse import urlparse
+
+import pytest
+
+from src.ai import create_vector_db
+from src.ai.backfill import index_channel, member_channels
+from src.ai.create_vector_db import SlackVectorDB
+from src.bench.fake_slack import FakeSlackServer
+from src.bench.fakes import HashEmbeddings
+from src.bench.workspace import Workspace
+from src.slack.slack_channel_history import SLACK_API_URL, close_async_client
+from src.utils.shared_state import MemorySharedState
+
+THREADS = 60
+PAGE_SIZE = 20
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    # State files and stores are written relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    return Workspace(users=10, channels=1, threads_per_channel=THREADS, mean_replies=2, max_replies=10)
+
+
+class Backfill:
+    """One channel backfilled from a FakeSlackServer that can fail history pages."""
+
+    def __init__(self, workspace: Workspace):
+        self.workspace = workspace
+        self.channel = next(iter(workspace.channels.values()))
+        self.server = FakeSlackServer(workspace, latency=0, jitter=0, max_page_size=PAGE_SIZE)
+        self.failing_cursors = set()
+        # Cursors of the history pages asked for, in order
+        self.cursors = []
+        conversations_history = self.server._conversations_history
+
+        def history_page(params):
+            cursor = params.get("cursor") or ""
+            self.cursors.append(cursor)
+            if cursor in self.failing_cursors:
+                raise KeyError("internal_error")
+            return conversations_history(params)
+
+        self.server._conversations_history = history_page
+
+    def vector_db(self) -> SlackVectorDB:
+        return SlackVectorDB(self.channel["name"], channel_id=self.channel["id"], embeddings=HashEmbeddings())
+
+    def run(self, db: SlackVectorDB, **kwargs):
+        async def run():
+            await self.server.start(port=urlparse(SLACK_API_URL).port)
+            try:
+                await db.aprocess_channel_history(rate_share=100.0, **kwargs)
+            finally:
+                await close_async_client()
+                await self.server.close()
+
+        asyncio.run(run())
+
+    def state(self) -> dict:
+        with open(f"last_processed_{self.channel['name']}.json") as f:
+            return json.load(f)
+
+    @staticmethod
+    def indexed_threads(db: SlackVectorDB) -> set:
+        return {metadata["message_ts"] for metadata in db.vector_store.get()["metadatas"]}
+
+
+def test_interrupted_backfill_resumes_from_saved_cursor(workspace):
+    backfill = Backfill(workspace)
+    backfill.failing_cursors = {str(2 * PAGE_SIZE)}
+    db = backfill.vector_db()
+    backfill.run(db)
+
+    state = backfill.state()
+    assert state["last_ts"] == 0
+    assert state["backfill"]["cursor"] == str(2 * PAGE_SIZE)
+    assert len(backfill.indexed_threads(db)) == 2 * PAGE_SIZE
+
+    backfill.failing_cursors.clear()
+    backfill.cursors.clear()
+    db = backfill.vector_db()
+    backfill.run(db)
+
+    # Only the page that failed is fetched again, with the bounds of the first run
+    assert backfill.cursors == [str(2 * PAGE_SIZE)]
+    assert backfill.state() == {"last_ts": float(state["backfill"]["latest"])}
+    assert len(backfill.indexed_threads(db)) == THREADS
+
+
+def test_failed_thread_fetch_keeps_its_page_uncommitted(workspace, monkeypatch):
+    backfill = Backfill(workspace)
+    failing_ts = workspace.messages[backfill.channel["id"]][-PAGE_SIZE - 5]["ts"]
+    fetch_thread = SlackVectorDB.fetch_thread
+
+    async def flaky_fetch_thread(self, history, message, lookup_users=True):
+        if message["ts"] == failing_ts:
+            raise RuntimeError("connection reset")
+        return await fetch_thread(self, history, message, lookup_users=lookup_users)
+
+    monkeypatch.setattr(SlackVectorDB, "fetch_thread", flaky_fetch_thread)
+    db = backfill.vector_db()
+    backfill.run(db, batch_size=1)
+
+    # The thread is on the second page, so the cursor stays after the first one
+    state = backfill.state()
+    assert state["last_ts"] == 0
+    assert state["backfill"]["cursor"] == str(PAGE_SIZE)
+    assert failing_ts not in backfill.indexed_threads(db)
+
+    monkeypatch.setattr(SlackVectorDB, "fetch_thread", fetch_thread)
+    db = backfill.vector_db()
+    backfill.run(db, batch_size=1)
+
+    assert "backfill" not in backfill.state()
+    assert len(backfill.indexed_threads(db)) == THREADS
+
+
+def test_failed_store_keeps_its_page_uncommitted(workspace, monkeypatch):
+    backfill = Backfill(workspace)
+    failing_ts = workspace.messages[backfill.channel["id"]][-PAGE_SIZE - 5]["ts"]
+    add_documents = SlackVectorDB._add_documents
+
+    def flaky_add_documents(self, documents):
+        if any(document.metadata["message_ts"] == failing_ts for document in documents):
+            raise RuntimeError("disk full")
+        add_documents(self, documents)
+
+    monkeypatch.setattr(SlackVectorDB, "_add_documents", flaky_add_documents)
+    # One thread per write, so only the failing thread's write fails
+    monkeypatch.setattr(create_vector_db, "EMBED_CONCURRENCY", 1)
+    db = backfill.vector_db()
+    backfill.run(db, batch_size=1)
+
+    state = backfill.state()
+    assert state["last_ts"] == 0
+    assert state["backfill"]["cursor"] == str(PAGE_SIZE)
+    assert failing_ts not in backfill.indexed_threads(db)
+
+    monkeypatch.setattr(SlackVectorDB, "_add_documents", add_documents)
+    db = backfill.vector_db()
+    backfill.run(db, batch_size=1)
+
+    assert "backfill" not in backfill.state()
+    assert len(backfill.indexed_threads(db)) == THREADS
+
+
+def test_failed_chunking_keeps_its_page_uncommitted(workspace, monkeypatch):
+    backfill = Backfill(workspace)
+    failing_ts = workspace.messages[backfill.channel["id"]][-PAGE_SIZE - 5]["ts"]
+    create_documents = SlackVectorDB.create_documents
+
+    def flaky_create_documents(self, thread_history, metadata):
+        if metadata["message_ts"] == failing_ts:
+            raise RuntimeError("embedding request failed")
+        return create_documents(self, thread_history, metadata)
+
+    monkeypatch.setattr(SlackVectorDB, "create_documents", flaky_create_documents)
+    db = backfill.vector_db()
+    # Finishes instead of hanging once the embedders would have died
+    backfill.run(db, batch_size=1, concurrency=1)
+
+    state = backfill.state()
+    assert state["last_ts"] == 0
+    assert state["backfill"]["cursor"] == str(PAGE_SIZE)
+    assert failing_ts not in backfill.indexed_threads(db)
+
+
+def test_writes_wait_for_the_live_indexer(workspace, fake_slack):
+    channel = next(iter(workspace.channels.values()))
+    state = MemorySharedState()
+    db = SlackVectorDB(channel["name"], channel_id=channel["id"], embeddings=HashEmbeddings(), state=state)
+    lock_key = f"lock:index:{channel['id']}"
+
+    async def run():
+        # A live re-index of the same channel is in progress
+        state.claim(lock_key, ttl=60, owner="live-indexer")
+
+        async def live_indexer():
+            await asyncio.sleep(0.5)
+            written = len(db.vector_store.get()["ids"])
+            state.release(lock_key, owner="live-indexer")
+            return written
+
+        async with fake_slack(workspace):
+            written, _ = await asyncio.gather(live_indexer(), db.aprocess_channel_history(rate_share=100.0))
+        return written
+
+    assert asyncio.run(run()) == 0
+    assert len(Backfill.indexed_threads(db)) == THREADS
+
+
+def test_private_channels_are_listed_and_indexed_by_id(tmp_path, monkeypatch, fake_slack):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(create_vector_db, "OpenAIEmbeddings", lambda model: HashEmbeddings())
+    workspace = Workspace(users=10, channels=2, private_channels=1, threads_per_channel=10, mean_replies=1, max_replies=5)
+
+    async def run():
+        async with fake_slack(workspace) as server:
+            channels = await asyncio.to_thread(member_channels)
+            # Each worker runs its own event loop
+            for channel in channels:
+                await asyncio.to_thread(index_channel, channel, 100.0)
+            return channels, dict(server.calls)
+
+    channels, calls = asyncio.run(run())
+    assert [(channel["name"], channel["id"], channel["is_private"]) for channel in channels] == [
+        ("bench-0", "C00000000", False), ("bench-1", "C00000001", True),
+    ]
+    # Workers never list the channels again to find an id
+    assert calls["conversations.list"] == 1
+    for channel in channels:
+        with open(f"last_processed_{channel['name']}.json") as f:
+            assert "backfill" not in json.load(f)
+        db = SlackVectorDB(channel["name"], channel_id=channel["id"], embeddings=HashEmbeddings())
+        assert len(Backfill.indexed_threads(db)) == 10
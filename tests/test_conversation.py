@@ -0,0 +1,104 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.ai.conversation import ConversationBuilder
+from src.utils.tokens import count_tokens
+
+
+class Summarizer:
+    """Chat model that records the prompts it is asked to summarize."""
+
+    model_name = "gpt-4o-mini"
+
+    def __init__(self, fail: bool = False):
+        self.prompts = []
+        self.fail = fail
+
+    async def ainvoke(self, prompt: str):
+        self.prompts.append(prompt)
+        if self.fail:
+            raise RuntimeError("rate limited")
+        return SimpleNamespace(content=f"summary {len(self.prompts)}")
+
+
+def thread(count: int, start: int = 0) -> list:
+    return [(f"{1700000000 + i}.000100", f"User {i % 3}: message number {i} about the release plan\n") for i in range(start, start + count)]
+
+
+def line_tokens(messages: list) -> list:
+    return [count_tokens(line) for _, line in messages]
+
+
+def build(builder: ConversationBuilder, messages: list, channel: str = "C1", thread_ts: str = "1700000000.000100") -> str:
+    return asyncio.run(builder.build(channel, thread_ts, messages))
+
+
+def test_threads_within_budget_are_sent_verbatim():
+    model = Summarizer()
+    messages = thread(5)
+    builder = ConversationBuilder(model, token_budget=sum(line_tokens(messages)), recent_tokens=10)
+    assert build(builder, messages) == "".join(line for _, line in messages)
+    assert model.prompts == []
+
+
+def test_older_messages_are_summarized_and_recent_ones_kept_within_the_budget():
+    model = Summarizer()
+    messages = thread(40)
+    recent_budget = sum(line_tokens(messages[-5:]))
+    builder = ConversationBuilder(model, token_budget=recent_budget * 2, recent_tokens=recent_budget)
+    conversation = build(builder, messages)
+
+    summary, recent = conversation.split("\n\nRecent messages:\n")
+    assert summary == "Summary of earlier messages:\nsummary 1"
+    assert recent == "".join(line for _, line in messages[-5:])
+    assert len(model.prompts) == 1
+    assert "message number 34 " in model.prompts[0] and "message number 35 " not in model.prompts[0]
+
+
+def test_the_mention_is_kept_even_when_it_alone_exceeds_the_recent_budget():
+    model = Summarizer()
+    messages = thread(10) + [("1700000100.000100", "User 1: " + "a very long question " * 50 + "\n")]
+    builder = ConversationBuilder(model, token_budget=50, recent_tokens=5)
+    assert build(builder, messages).endswith(messages[-1][1])
+
+
+def test_follow_up_only_folds_messages_that_left_the_recent_window():
+    model = Summarizer()
+    messages = thread(40)
+    recent_budget = sum(line_tokens(messages[-5:]))
+    builder = ConversationBuilder(model, token_budget=recent_budget * 2, recent_tokens=recent_budget)
+    build(builder, messages)
+    # The same thread again costs no summary call
+    build(builder, messages)
+    assert len(model.prompts) == 1
+
+    conversation = build(builder, messages + thread(3, start=40))
+    assert conversation.startswith("Summary of earlier messages:\nsummary 2\n")
+    assert len(model.prompts) == 2
+    update = model.prompts[1]
+    assert "Current summary:\nsummary 1" in update
+    assert [i for i in range(43) if f"message number {i} " in update] == [35, 36, 37]
+
+
+def test_summaries_are_kept_per_channel():
+    model = Summarizer()
+    messages = thread(40)
+    recent_budget = sum(line_tokens(messages[-5:]))
+    builder = ConversationBuilder(model, token_budget=recent_budget * 2, recent_tokens=recent_budget)
+    build(builder, messages, channel="C1")
+    # Same thread_ts in another channel is another thread
+    build(builder, messages, channel="C2")
+    assert len(model.prompts) == 2
+    assert "(none yet)" in model.prompts[1]
+
+
+def test_failed_summary_falls_back_to_the_recent_messages():
+    model = Summarizer(fail=True)
+    messages = thread(40)
+    recent_budget = sum(line_tokens(messages[-5:]))
+    builder = ConversationBuilder(model, token_budget=recent_budget * 2, recent_tokens=recent_budget)
+    conversation = build(builder, messages)
+    assert conversation == (
+        "Summary of earlier messages:\n(earlier messages omitted)\n\nRecent messages:\n"
+        + "".join(line for _, line in messages[-5:])
+    )
@@ -0,0 +1,113 @@
+import asyncio
+
+from src.core.dispatcher import BUSY_MESSAGE, MentionDispatcher
+from src.utils.shared_state import MemorySharedState
+
+
+def mention(ts: str, thread_ts: str = "", channel: str = "C1") -> dict:
+    event = {"channel": channel, "ts": ts, "text": f"<@UBOT> question {ts}"}
+    if thread_ts:
+        event["thread_ts"] = thread_ts
+    return event
+
+
+class Handler:
+    """Mention handler that records what it answers and runs until released."""
+
+    def __init__(self):
+        self.answered = []
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def __call__(self, event, say):
+        self.answered.append(event["ts"])
+        self.started.set()
+        await self.release.wait()
+
+
+class Say:
+    def __init__(self):
+        self.messages = []
+
+    async def __call__(self, text, thread_ts=None):
+        self.messages.append((text, thread_ts))
+
+
+def test_mentions_in_a_running_thread_are_answered_once_from_the_latest():
+    async def run():
+        handler = Handler()
+        dispatcher = MentionDispatcher(handler, concurrency=2, state=MemorySharedState())
+        await dispatcher.submit(mention("1.0"), Say())
+        await handler.started.wait()
+        for ts in ("2.0", "3.0", "4.0"):
+            await dispatcher.submit(mention(ts, thread_ts="1.0"), Say())
+        handler.release.set()
+        await dispatcher.close()
+        return handler, dispatcher
+
+    handler, dispatcher = asyncio.run(run())
+    assert handler.answered == ["1.0", "4.0"]
+    assert dispatcher.counts["coalesced"] == 2
+    assert dispatcher.counts["answered"] == 2
+
+
+def test_redelivered_events_are_dropped():
+    async def run():
+        handler = Handler()
+        handler.release.set()
+        state = MemorySharedState()
+        dispatcher = MentionDispatcher(handler, state=state)
+        await dispatcher.submit(mention("1.0"), Say(), event_id="Ev1")
+        await dispatcher.submit(mention("1.0"), Say(), event_id="Ev1")
+        await dispatcher.close()
+        # Another process sharing the state drops it too
+        other = MentionDispatcher(handler, state=state)
+        await other.submit(mention("1.0"), Say(), event_id="Ev1")
+        await other.close()
+        return handler, dispatcher, other
+
+    handler, dispatcher, other = asyncio.run(run())
+    assert handler.answered == ["1.0"]
+    assert dispatcher.counts["duplicates"] == 1
+    assert other.counts["duplicates"] == 1
+
+
+def test_full_queue_turns_new_threads_away():
+    async def run():
+        handler = Handler()
+        dispatcher = MentionDispatcher(
+            handler, concurrency=1, queue_size=1, queue_timeout=0.05, state=MemorySharedState()
+        )
+        await dispatcher.submit(mention("1.0"), Say())
+        await handler.started.wait()
+        await dispatcher.submit(mention("2.0"), Say())
+        say = Say()
+        await dispatcher.submit(mention("3.0"), say)
+        # A thread already queued still takes new mentions without waiting
+        await dispatcher.submit(mention("2.5", thread_ts="2.0"), Say())
+        handler.release.set()
+        await dispatcher.close()
+        return handler, dispatcher, say
+
+    handler, dispatcher, say = asyncio.run(run())
+    assert say.messages == [(BUSY_MESSAGE, "3.0")]
+    assert dispatcher.counts["rejected"] == 1
+    assert handler.answered == ["1.0", "2.5"]
+
+
+def test_close_answers_taken_mentions_and_releases_the_rest():
+    async def run():
+        handler = Handler()
+        state = MemorySharedState()
+        dispatcher = MentionDispatcher(handler, concurrency=1, state=state)
+        await dispatcher.submit(mention("1.0"), Say(), event_id="Ev1")
+        await dispatcher.submit(mention("2.0"), Say(), event_id="Ev2")
+        await handler.started.wait()
+        await dispatcher.close(timeout=0.05)
+        # Mentions submitted while closing are left to a redelivery
+        await dispatcher.submit(mention("3.0"), Say(), event_id="Ev3")
+        return handler, [state.claim(f"event:{event_id}", ttl=3600) for event_id in ("Ev1", "Ev2", "Ev3")]
+
+    handler, claimable = asyncio.run(run())
+    assert handler.answered == ["1.0"]
+    assert claimable == [True, True, True]
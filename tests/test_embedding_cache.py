@@ -0,0 +1,57 @@
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from src.ai.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    """Embeds a text as its length and records every text sent to the model."""
+
+    def __init__(self, offset: float = 0.0):
+        self.offset = offset
+        self.embedded: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded.extend(texts)
+        return [[float(len(text)), self.offset] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.embedded.append(text)
+        return [float(len(text)), self.offset + 1]
+
+
+def test_each_text_is_embedded_once_across_instances(tmp_path):
+    path = str(tmp_path / "embedding_cache.sqlite3")
+    model = CountingEmbeddings()
+    cached = CachedEmbeddings(model, model_name="small", path=path)
+    assert cached.embed_documents(["deploy", "rollback", "deploy"]) == [[6.0, 0.0], [8.0, 0.0], [6.0, 0.0]]
+    assert model.embedded == ["deploy", "rollback"]
+    assert cached.stats() == {"hits": 0, "misses": 2, "hit_rate": 0.0}
+
+    # A later run, e.g. another backfill process, reads the same file
+    reopened = CachedEmbeddings(model, model_name="small", path=path)
+    assert reopened.embed_documents(["rollback", "deploy now"]) == [[8.0, 0.0], [10.0, 0.0]]
+    assert model.embedded == ["deploy", "rollback", "deploy now"]
+    assert reopened.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_changed_text_model_or_kind_is_embedded_again(tmp_path):
+    path = str(tmp_path / "embedding_cache.sqlite3")
+    small = CountingEmbeddings()
+    CachedEmbeddings(small, model_name="small", path=path).embed_documents(["deploy"])
+
+    # Edited text hashes differently
+    cached = CachedEmbeddings(small, model_name="small", path=path)
+    cached.embed_documents(["deploy!"])
+    assert small.embedded == ["deploy", "deploy!"]
+
+    # Queries are cached apart from documents
+    assert cached.embed_query("deploy") == [6.0, 1.0]
+    assert cached.embed_query("deploy") == [6.0, 1.0]
+    assert small.embedded == ["deploy", "deploy!", "deploy"]
+
+    # Another model never gets the first model's vectors
+    large = CountingEmbeddings(offset=5.0)
+    assert CachedEmbeddings(large, model_name="large", path=path).embed_documents(["deploy"]) == [[6.0, 5.0]]
+    assert large.embedded == ["deploy"]
@@ -0,0 +1,72 @@
+import asyncio
+import os
+
+import pytest
+
+from src.slack.history_archive import ArchivedChannelHistory, HistoryArchive, archived_channels
+
+
+def message(index: int, replies: int = 0) -> dict:
+    root = {"ts": f"{1700000000 + index}.000100", "text": f"message {index}"}
+    if replies:
+        root.update(thread_ts=root["ts"], reply_count=replies, latest_reply=f"{1700000000 + index}.000{100 + replies}")
+    return root
+
+
+def thread(index: int, replies: int = 0) -> tuple:
+    root = message(index, replies)
+    return root, [root] + [{"ts": f"{1700000000 + index}.000{101 + i}", "text": f"reply {i}"} for i in range(replies)]
+
+
+@pytest.fixture
+def archive(tmp_path) -> HistoryArchive:
+    archive = HistoryArchive("general", directory=str(tmp_path))
+    # One member per append, superseded and deleted threads included
+    for index in range(6):
+        archive.append([thread(index)])
+    archive.append([thread(1, replies=2)])
+    archive.delete(message(3)["ts"])
+    return archive
+
+
+def pages(archive: HistoryArchive, cursor: str = "") -> list:
+    async def run():
+        return [(page, next_cursor) async for page, next_cursor in ArchivedChannelHistory(archive).iter_channel_history_pages(cursor=cursor)]
+
+    return asyncio.run(run())
+
+
+def replayed(result: list) -> list:
+    return sorted(root["text"] for page, _ in result for root in page)
+
+
+def test_cursor_from_before_compaction_replays_from_the_start(archive):
+    # Saved after the pages of messages 0 and 2, message 1 is live in the last member
+    saved_cursor = pages(archive)[1][1]
+    assert replayed(pages(archive, saved_cursor)) == ["message 1", "message 4", "message 5"]
+
+    assert archive.compact() == 5
+    # Its offset is past every member of the compacted file, so resuming from it would replay nothing
+    assert replayed(pages(archive, saved_cursor)) == ["message 0", "message 1", "message 2", "message 4", "message 5"]
+    assert [cursor for _, cursor in pages(archive)] == [""]
+
+
+def test_other_processes_switch_to_the_compacted_archive(archive, tmp_path):
+    reader = HistoryArchive("general", directory=str(tmp_path))
+    assert len(reader) == 5
+    archive.compact()
+    archive.append([thread(6)])
+
+    assert len(reader) == 6
+    assert reader.get(message(1)["ts"])[1][-1]["text"] == "reply 1"
+    assert reader.get(message(3)["ts"]) is None
+    # An archive that was compacted still counts as one
+    assert archived_channels(str(tmp_path)) == ["general"]
+
+    archive.compact()
+    archive.compact()
+    # The previous generation is kept for replays still reading it, older ones are removed
+    assert sorted(os.listdir(archive.directory)) == [
+        ".lock", "index.2.jsonl", "index.3.jsonl", "meta.json", "threads.2.jsonl.gz", "threads.3.jsonl.gz",
+    ]
+    assert replayed(pages(reader)) == ["message 0", "message 1", "message 2", "message 4", "message 5", "message 6"]
@@ -0,0 +1,36 @@
+import asyncio
+
+from src.ai.live_indexer import LiveIndexer
+from src.bench.workspace import BOT_USER_ID, Workspace
+from src.utils.shared_state import MemorySharedState
+
+
+def test_bot_messages_do_not_mark_threads(fake_slack):
+    workspace = Workspace(users=5, channels=1, threads_per_channel=5)
+    events = [
+        # A user's reply and edit
+        {"type": "message", "channel": "C1", "channel_type": "channel", "user": "U00000001", "ts": "2.0", "thread_ts": "1.0"},
+        {"type": "message", "subtype": "message_changed", "channel": "C1", "channel_type": "channel",
+         "message": {"user": "U00000001", "ts": "3.0", "thread_ts": "3.0"}},
+        # The bot's placeholder, its streamed edits and a deleted answer
+        {"type": "message", "channel": "C1", "channel_type": "channel", "user": BOT_USER_ID, "bot_id": "BBENCH",
+         "ts": "5.0", "thread_ts": "4.0"},
+        {"type": "message", "subtype": "message_changed", "channel": "C1", "channel_type": "channel",
+         "message": {"user": BOT_USER_ID, "bot_id": "BBENCH", "ts": "5.0", "thread_ts": "4.0"}},
+        {"type": "message", "subtype": "message_deleted", "channel": "C1", "channel_type": "channel",
+         "deleted_ts": "6.0", "previous_message": {"bot_id": "BBENCH", "ts": "6.0", "thread_ts": "4.0"}},
+        # Direct messages are never indexed
+        {"type": "message", "channel": "D1", "channel_type": "im", "user": "U00000001", "ts": "7.0"},
+    ]
+
+    async def run():
+        async with fake_slack(workspace):
+            indexer = LiveIndexer(interval=60, state=MemorySharedState())
+            await indexer.start()
+            for event in events:
+                indexer.submit(event)
+            pending = list(indexer._pending)
+            await indexer.close()
+            return pending
+
+    assert asyncio.run(run()) == [("C1", "1.0"), ("C1", "3.0")]
@@ -0,0 +1,65 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import anyio
+
+from src.ai import mcp_pool
+from src.ai.mcp_pool import MCPSessionPool
+
+
+class FakeServer:
+    """SSE transport whose current connection can be dropped, like a restarted MCP server."""
+
+    def __init__(self):
+        self.connections = 0
+        self.dropped = None
+
+    @asynccontextmanager
+    async def sse_client(self, url):
+        self.connections += 1
+        self.dropped = asyncio.Event()
+
+        async def read(dropped):
+            await dropped.wait()
+            raise ConnectionError("SSE stream closed")
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(read, self.dropped)
+            try:
+                yield self.connections, None
+            finally:
+                tg.cancel_scope.cancel()
+
+
+class FakeSession:
+    def __init__(self, connection, _):
+        self.connection = connection
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def initialize(self):
+        pass
+
+
+def test_dropped_connection_is_not_handed_out(monkeypatch):
+    server = FakeServer()
+    monkeypatch.setattr(mcp_pool, "sse_client", server.sse_client)
+    monkeypatch.setattr(mcp_pool, "ClientSession", FakeSession)
+
+    async def run():
+        pool = MCPSessionPool("http://mcp/sse", size=1, reconnect_delay=0.05, acquire_timeout=1.0)
+        await pool.start(timeout=1.0)
+        # The connection drops while its session is idle in the pool
+        server.dropped.set()
+        await asyncio.sleep(0.01)
+        try:
+            async with pool.session() as session:
+                return session.connection
+        finally:
+            await pool.close()
+
+    assert asyncio.run(run()) == 2
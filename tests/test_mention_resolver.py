@@ -0,0 +1,38 @@
+from src.utils.mention_resolver import MENTION_PATTERN, MentionResolver, _replace_loop
+
+
+def test_known_ids_are_replaced_and_unknown_ids_kept():
+    resolver = MentionResolver({"U07VDMP4943": "Lan Tran", "WABCDEF123": "Minh Le"})
+    text = "<@U07VDMP4943> ping <@WABCDEF123>, cc <@U99999999999>"
+    assert resolver.resolve(text) == "<@Lan Tran> ping <@Minh Le>, cc <@U99999999999>"
+    assert resolver.resolve("") == ""
+    assert resolver.resolve(None) == ""
+
+
+def test_only_whole_id_tokens_are_replaced():
+    resolver = MentionResolver({"U07VDMP4943": "Lan Tran"})
+    # Part of a longer token, or too short to be a user id
+    assert resolver.resolve("XU07VDMP4943 U07VDMP49430 U07VDMP") == "XU07VDMP4943 U07VDMP49430 U07VDMP"
+    assert resolver.resolve("U07VDMP4943: done") == "Lan Tran: done"
+
+
+def test_directory_changes_apply_without_rebuilding():
+    users = {"U07VDMP4943": "Lan Tran"}
+    resolver = MentionResolver(users)
+    users["U0ADDED0001"] = "Hai Vo"
+    resolver.update({"U07VDMP4943": "Lan T."})
+    assert resolver.resolve("U07VDMP4943 U0ADDED0001") == "Lan T. Hai Vo"
+    resolver.remove("U0ADDED0001")
+    assert resolver.resolve("U0ADDED0001") == "U0ADDED0001"
+
+
+def test_matches_the_replace_loop():
+    users = {f"U{index:010d}": f"User {index}" for index in range(50)}
+    text = " ".join(f"<@U{index:010d}> deploy" for index in range(0, 60, 3))
+    assert MentionResolver(users).resolve(text) == _replace_loop(text, users)
+
+
+def test_mention_pattern_finds_explicit_mentions():
+    assert MENTION_PATTERN.findall("<@U07VDMP4943> and <@W0123456789|lan> but not U0NOTMENTION") == [
+        "U07VDMP4943", "W0123456789"
+    ]
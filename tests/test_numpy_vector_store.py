@@ -0,0 +1,138 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.ai.numpy_vector_store import HEADER_FILE, LOG_FILE, SCALES_FILE, VECTORS_FILE, NumpyVectorStore
+from src.bench.fakes import HashEmbeddings
+
+DIM = 8
+
+
+def vector(index: int) -> list:
+    return np.eye(DIM)[index % DIM].tolist()
+
+
+def upsert(store: NumpyVectorStore, indexes: list, text: str = "chunk"):
+    store.upsert(
+        ids=[f"id-{index}" for index in indexes],
+        documents=[f"{text} {index}" for index in indexes],
+        metadatas=[{"message_ts": str(index)} for index in indexes],
+        embeddings=[vector(index) for index in indexes],
+    )
+
+
+@pytest.fixture(params=["float32", "int8"])
+def open_store(request, tmp_path):
+    def open_store() -> NumpyVectorStore:
+        return NumpyVectorStore(str(tmp_path / "vectors"), HashEmbeddings(dim=DIM), dtype=request.param)
+
+    return open_store
+
+
+def nearest(store: NumpyVectorStore, index: int) -> str:
+    document, distance = store.search_by_vector(vector(index), k=1)[0]
+    assert distance == pytest.approx(0, abs=1e-2)
+    return document.id
+
+
+def test_crashed_write_is_ignored_and_overwritten(open_store):
+    store = open_store()
+    upsert(store, [0, 1])
+    # A writer that died after its vectors and half a sidecar line
+    with open(os.path.join(store.directory, VECTORS_FILE), "ab") as f:
+        f.write(b"\xff" * 64)
+    with open(os.path.join(store.directory, LOG_FILE), "a") as f:
+        f.write('{"id": "id-9", "row": 2, "docu')
+
+    store = open_store()
+    assert store.get()["ids"] == ["id-0", "id-1"]
+    upsert(store, [2, 3])
+
+    store = open_store()
+    assert store.get()["ids"] == ["id-0", "id-1", "id-2", "id-3"]
+    assert [nearest(store, index) for index in range(4)] == ["id-0", "id-1", "id-2", "id-3"]
+
+
+def test_line_being_written_is_picked_up_once_complete(open_store):
+    writer = open_store()
+    upsert(writer, [0])
+    reader = open_store()
+    assert reader.get()["ids"] == ["id-0"]
+
+    upsert(writer, [1])
+    path = os.path.join(writer.directory, LOG_FILE)
+    with open(path) as f:
+        committed, line = f.read().splitlines(keepends=True)
+    # Seen by the reader halfway through the writer's append
+    with open(path, "w") as f:
+        f.write(committed + line[:10])
+    assert reader.get()["ids"] == ["id-0"]
+    with open(path, "a") as f:
+        f.write(line[10:])
+    assert reader.get()["ids"] == ["id-0", "id-1"]
+    assert nearest(reader, 1) == "id-1"
+
+
+def test_replaced_and_deleted_rows_are_masked_and_vacuumed(open_store):
+    store = open_store()
+    upsert(store, [0, 1, 2])
+    upsert(store, [1], text="updated")
+    store.delete(["id-2"])
+
+    result = store.get()
+    assert result["ids"] == ["id-0", "id-1"]
+    assert result["documents"] == ["chunk 0", "updated 1"]
+    assert [document.id for document, _ in store.search_by_vector(vector(2), k=4)] == ["id-0", "id-1"]
+
+    store.vacuum()
+    assert os.path.getsize(store._file(VECTORS_FILE)) == 2 * DIM * np.dtype(store.dtype).itemsize
+    for reopened in (store, open_store()):
+        assert reopened.get()["documents"] == ["chunk 0", "updated 1"]
+        assert [nearest(reopened, index) for index in range(2)] == ["id-0", "id-1"]
+
+
+def test_reader_reloads_after_another_process_vacuums(open_store):
+    writer = open_store()
+    reader = open_store()
+    upsert(writer, [0, 1, 2])
+    assert len(reader.get()["ids"]) == 3
+
+    writer.delete(["id-0"])
+    writer.vacuum()
+    upsert(writer, [3])
+    assert reader.get()["ids"] == ["id-1", "id-2", "id-3"]
+    assert nearest(reader, 3) == "id-3"
+
+
+
+def test_reader_sees_either_generation_whole_during_a_vacuum(open_store, monkeypatch):
+    writer = open_store()
+    reader = open_store()
+    upsert(writer, [0, 1, 2, 3])
+    writer.delete(["id-0", "id-2"])
+    assert reader.get()["ids"] == ["id-1", "id-3"]
+    write_header = writer._write_header
+    seen = []
+
+    def switch(generation=None):
+        # Every file of the new generation is written, but the header still points at the old one
+        ids = reader.get()["ids"]
+        assert [nearest(reader, int(doc_id.split("-")[1])) for doc_id in ids] == ids
+        seen.append(ids)
+        write_header(generation)
+
+    monkeypatch.setattr(writer, "_write_header", switch)
+    writer.vacuum()
+    assert reader.get()["ids"] == ["id-1", "id-3"]
+    writer.delete(["id-1"])
+    writer.vacuum()
+
+    assert seen == [["id-1", "id-3"], ["id-3"]]
+    assert reader.get()["ids"] == ["id-3"]
+    assert nearest(reader, 3) == "id-3"
+    # The previous generation is kept for readers still loading it, older ones are removed
+    names = (VECTORS_FILE, SCALES_FILE, LOG_FILE) if writer.dtype == "int8" else (VECTORS_FILE, LOG_FILE)
+    assert sorted(os.listdir(writer.directory)) == sorted(
+        [HEADER_FILE] + [os.path.basename(writer._file(name, generation)) for name in names for generation in (1, 2)]
+    )
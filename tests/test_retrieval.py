@@ -0,0 +1,127 @@
+import os
+from datetime import datetime
+
+import pytest
+from langchain_core.documents import Document
+
+from src.ai import retrieval
+from src.bench.fakes import HashEmbeddings
+
+
+@pytest.fixture
+def indexed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for channel in ("general", "social"):
+        retrieval.save_channel_info(channel, f"C-{channel}", is_private=False)
+    retrieval.save_channel_info("leadership", "G-leadership", is_private=True)
+    # Indexed before privacy was recorded
+    os.makedirs(retrieval.channel_persist_directory("legacy"))
+    # Directories the vector store keeps next to the channels are not channels
+    os.makedirs(os.path.join(retrieval.PERSIST_DIRECTORY, "3f2b9c1e-0d4a-4f7e-9a51-2c6d8e0b7a13"))
+    os.makedirs(os.path.join(retrieval.CHANNELS_DIRECTORY, ".tmp"))
+
+
+def test_list_channels_only_lists_channel_directories(indexed):
+    assert retrieval.list_channels() == ["general", "leadership", "legacy", "social"]
+
+
+def test_requested_channels_must_be_indexed(indexed):
+    assert retrieval._resolve_channels(None) == ["general", "social"]
+    assert retrieval._resolve_channels(["#social", "social"]) == ["social"]
+    with pytest.raises(ValueError, match="Unknown channels random"):
+        retrieval._resolve_channels(["general", "random"])
+    with pytest.raises(ValueError, match="Unknown channels"):
+        retrieval._resolve_channels("../general")
+
+
+def test_private_channels_are_only_searched_from_mentions_in_them(indexed):
+    assert retrieval.searchable_channels() == ["general", "social"]
+    assert retrieval.searchable_channels("C-general") == ["general", "social"]
+    assert retrieval.searchable_channels("G-leadership") == ["general", "leadership", "social"]
+    assert retrieval._resolve_channels(["leadership"], "G-leadership") == ["leadership"]
+    # Named like any channel that does not exist, so its name is not confirmed either
+    with pytest.raises(ValueError, match="Unknown channels leadership, legacy"):
+        retrieval._resolve_channels(["leadership", "legacy"], "C-general")
+    assert retrieval.get_document("leadership:1700000000.000100:0", "C-general") is None
+
+
+@pytest.fixture
+def search_index(indexed, monkeypatch):
+    """Index chunks of (channel, message_ts, user, text) with hashed embeddings."""
+    monkeypatch.setattr(retrieval, "get_embeddings", HashEmbeddings)
+    # Stores and embeddings are cached per process, by channel name and query
+    retrieval.load_db.cache_clear()
+    retrieval.load_keyword_index.cache_clear()
+    retrieval.query_embedding_cache.clear()
+
+    def index(chunks):
+        for channel, message_ts, user, text in chunks:
+            document = Document(id=f"{channel}:{message_ts}:0", page_content=text, metadata={
+                "channel": channel, "message_ts": message_ts, "user": user, "timestamp": float(message_ts),
+                "permalink_to_message": f"https://example.slack.com/archives/{channel}/p{message_ts}",
+            })
+            retrieval.load_db(channel).add_documents([document])
+            retrieval.load_keyword_index(channel).upsert([document])
+
+    yield index
+    retrieval.load_db.cache_clear()
+    retrieval.load_keyword_index.cache_clear()
+
+
+def test_retrieve_searches_the_private_channel_it_was_asked_in(search_index):
+    search_index([
+        ("general", "1700000000.000100", "An", "The deploy of billing is on Friday"),
+        ("leadership", "1700000000.000200", "Binh", "The deploy of billing is postponed, budget cut"),
+    ])
+    assert "postponed" not in retrieval.retrieve("billing deploy", k=3)
+    assert "postponed" not in retrieval.retrieve("billing deploy", k=3, mention_channel="C-general")
+    assert "postponed" in retrieval.retrieve("billing deploy", k=3, mention_channel="G-leadership")
+
+
+def test_reciprocal_rank_fusion_favours_documents_ranked_by_both():
+    a, b, c = (Document(id=doc_id, page_content=doc_id) for doc_id in "abc")
+    fused = retrieval.reciprocal_rank_fusion([[a, b], [c, b]], k=60)
+    assert [doc.id for doc, _ in fused] == ["b", "a", "c"]
+    assert fused[0][1] == pytest.approx(2 / 62)
+    assert fused[1][1] == pytest.approx(1 / 61)
+
+
+THREADS = [
+    ("general", "1700000000.000100", "An", "Checkout fails with error E_TIMEOUT after the payment step"),
+    ("general", "1700086400.000100", "Binh", "Checkout is slow when the payment provider times out"),
+    ("social", "1700172800.000100", "An", "Lunch on Friday, the usual place"),
+]
+
+
+def test_exact_ids_are_found_by_keyword(search_index):
+    search_index(THREADS)
+    hits = retrieval.search_with_scores("E_TIMEOUT", k=3)
+    assert hits[0][0].id == "general:1700000000.000100:0"
+
+
+def test_filters_apply_to_vector_and_keyword_search(search_index):
+    search_index(THREADS)
+    query = "checkout payment timeout"
+    assert {doc.metadata["user"] for doc in retrieval.search(query, k=3, user="An")} == {"An"}
+    assert {doc.id for doc in retrieval.search(query, k=3, since=1700086400.0)} == {
+        "general:1700086400.000100:0", "social:1700172800.000100:0",
+    }
+    # A bare until date includes that whole day
+    first_day = datetime.fromtimestamp(1700000000).date().isoformat()
+    assert {doc.id for doc in retrieval.search(query, k=3, until=first_day)} == {"general:1700000000.000100:0"}
+    # An empty name is no filter in either search, not a filter for authors named ""
+    unfiltered = [(doc.id, score) for doc, score in retrieval.search_with_scores(query, k=3)]
+    assert [(doc.id, score) for doc, score in retrieval.search_with_scores(query, k=3, user="")] == unfiltered
+    assert retrieval.metadata_filter(user="") == {"user": ""}
+    assert retrieval.search(query, k=3, user="Nobody") == []
+
+
+def test_retrieve_defaults_to_the_tools_k(search_index):
+    search_index(THREADS)
+    assert retrieval.retrieve("checkout").count("Link: ") == 3
+
+
+@pytest.mark.parametrize("channel", ["", ".", "..", "../social", "a/b", "a\\b"])
+def test_channel_names_cannot_leave_the_channels_directory(channel):
+    with pytest.raises(ValueError):
+        retrieval.channel_persist_directory(channel)
@@ -0,0 +1,86 @@
+import asyncio
+import multiprocessing
+import time
+
+import pytest
+
+from src.utils.shared_state import MemorySharedState, SQLiteSharedState
+
+KEYS = 200
+
+
+def claim_all(path: str, owner: str) -> list:
+    state = SQLiteSharedState(path)
+    return [key for key in range(KEYS) if state.claim(f"event:{key}", ttl=60, owner=owner)]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def state(request, tmp_path):
+    if request.param == "memory":
+        return MemorySharedState()
+    return SQLiteSharedState(str(tmp_path / "shared_state.sqlite3"))
+
+
+def test_each_key_is_claimed_by_exactly_one_process(tmp_path):
+    path = str(tmp_path / "shared_state.sqlite3")
+    SQLiteSharedState(path)
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        won = pool.starmap(claim_all, [(path, f"worker-{index}") for index in range(4)])
+    assert sorted(key for keys in won for key in keys) == list(range(KEYS))
+
+
+def test_claim_is_exclusive_until_it_expires(state):
+    assert state.claim("event:1", ttl=0.2, owner="a")
+    assert not state.claim("event:1", ttl=0.2, owner="b")
+    assert not state.claim("event:1", ttl=0.2, owner="a")
+    time.sleep(0.3)
+    assert state.claim("event:1", ttl=60, owner="b")
+
+
+def test_only_the_owner_releases_or_renews(state):
+    assert state.claim("lock:t", ttl=60, owner="a")
+    state.release("lock:t", owner="b")
+    assert not state.renew("lock:t", ttl=60, owner="b")
+    assert not state.claim("lock:t", ttl=60, owner="b")
+    assert state.renew("lock:t", ttl=60, owner="a")
+    state.release("lock:t", owner="a")
+    assert not state.renew("lock:t", ttl=60, owner="a")
+    assert state.claim("lock:t", ttl=60, owner="b")
+
+
+def test_lock_is_held_past_its_ttl_while_renewed(state):
+    async def run():
+        order = []
+
+        async def hold(name: str):
+            async with state.lock("thread:C1:1.0", ttl=0.3, poll=0.01):
+                order.append(f"{name} in")
+                await asyncio.sleep(0.6)
+                order.append(f"{name} out")
+
+        first = asyncio.create_task(hold("first"))
+        await asyncio.sleep(0.05)
+        await asyncio.gather(first, hold("second"))
+        return order
+
+    assert asyncio.run(run()) == ["first in", "first out", "second in", "second out"]
+
+
+def test_sqlite_cache_is_shared_and_reports_changes(tmp_path):
+    path = str(tmp_path / "shared_state.sqlite3")
+    writer = SQLiteSharedState(path).cache("answers")
+    reader = SQLiteSharedState(path).cache("answers")
+
+    async def run():
+        started = time.time()
+        await writer.aset("q1", {"answer": 1})
+        await writer.aset("q2", {"answer": 2})
+        changes = await reader.achanged_since(started)
+        popped = await reader.apop("q1")
+        return changes, popped, await writer.aget("q1", "gone"), await writer.aget("q2")
+
+    changes, popped, missing, kept = asyncio.run(run())
+    assert [(key, value) for key, value, _ in changes] == [("q1", {"answer": 1}), ("q2", {"answer": 2})]
+    assert popped == {"answer": 1}
+    assert missing == "gone"
+    assert kept == {"answer": 2}
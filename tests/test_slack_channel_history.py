@@ -0,0 +1,39 @@
+import asyncio
+
+from src.bench.workspace import Workspace
+from src.slack import slack_channel_history
+from src.slack.slack_channel_history import AsyncSlackChannelHistory, build_permalink
+
+
+def test_build_permalink():
+    url = "https://acme.slack.com/"
+    assert build_permalink(url, "C123", "1712345678.000100") == "https://acme.slack.com/archives/C123/p1712345678000100"
+    assert build_permalink(url, "C123", "1712345678.000200", thread_ts="1712345678.000100") == (
+        "https://acme.slack.com/archives/C123/p1712345678000200?thread_ts=1712345678.000100&cid=C123"
+    )
+    # A parent message links without thread parameters
+    assert build_permalink(url, "C123", "1712345678.000100", thread_ts="1712345678.000100") == (
+        "https://acme.slack.com/archives/C123/p1712345678000100"
+    )
+    assert build_permalink("", "C123", "1712345678.000100") == ""
+
+
+def test_permalinks_are_derived_from_one_auth_test(fake_slack, monkeypatch):
+    monkeypatch.setattr(slack_channel_history, "_workspace_url", None)
+    workspace = Workspace(users=5, channels=1, threads_per_channel=20, mean_replies=1, max_replies=3)
+    channel_id = next(iter(workspace.channels))
+
+    async def run():
+        async with fake_slack(workspace) as server:
+            history = AsyncSlackChannelHistory("bench-0", channel_id=channel_id)
+            messages = workspace.messages[channel_id]
+            permalinks = [await history.get_permalink(message["ts"]) for message in messages]
+            from_slack = [
+                (await history.client.chat_getPermalink(channel=channel_id, message_ts=message["ts"]))["permalink"]
+                for message in messages
+            ]
+            return permalinks, from_slack, dict(server.calls)
+
+    permalinks, from_slack, calls = asyncio.run(run())
+    assert permalinks == from_slack
+    assert calls == {"auth.test": 1, "chat.getPermalink": len(from_slack)}
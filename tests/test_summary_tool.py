@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+from langchain_openai import ChatOpenAI
+
+from src.utils import tools
+from src.utils.shared_state import MemorySharedState
+from src.utils.tools import TomTatThreadTool, current_thread
+
+LINES = [f"User {i % 3}: message number {i} about the release plan" for i in range(6)]
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    """Prompts sent to the model, which answers with a numbered summary."""
+    monkeypatch.setattr(tools, "summary_cache", MemorySharedState().cache("thread_summaries"))
+    prompts = []
+
+    async def complete(self, prompt: str) -> str:
+        prompts.append(prompt)
+        return f"summary {len(prompts)}"
+
+    monkeypatch.setattr(TomTatThreadTool, "_complete", complete)
+    return prompts
+
+
+@pytest.fixture
+def tool(prompts):
+    return TomTatThreadTool(ChatOpenAI(model="gpt-4o-mini", api_key="sk-test"))
+
+
+def summarize(tool: TomTatThreadTool, lines: list, thread: str = "C1:1700000000.000100") -> str:
+    async def run():
+        token = current_thread.set(thread)
+        try:
+            return await tool._arun("\n".join(lines))
+        finally:
+            current_thread.reset(token)
+
+    return asyncio.run(run())
+
+
+def test_unchanged_thread_is_served_from_the_cache(tool, prompts):
+    assert summarize(tool, LINES) == "summary 1"
+    # Retyped with different whitespace
+    assert summarize(tool, [f"  {line}  " for line in LINES] + [""]) == "summary 1"
+    assert len(prompts) == 1
+
+
+def test_new_messages_are_folded_into_the_cached_summary(tool, prompts):
+    summarize(tool, LINES[:4])
+    assert summarize(tool, LINES) == "summary 2"
+    update = prompts[1]
+    assert update.startswith(tools.UPDATE_PROMPT.split("{summary}")[0])
+    assert "summary 1" in update
+    assert [i for i in range(6) if f"message number {i} " in update] == [4, 5]
+
+
+def test_edited_earlier_message_is_summarized_from_scratch(tool, prompts):
+    summarize(tool, LINES[:4])
+    edited = [LINES[0], "User 1: message number 1 was edited"] + LINES[2:]
+    assert summarize(tool, edited) == "summary 2"
+    assert "summary 1" not in prompts[1]
+    assert all(f"message number {i} " in prompts[1] for i in (0, 2, 3, 4, 5))
+
+
+def test_summaries_are_kept_per_thread(tool, prompts):
+    summarize(tool, LINES, thread="C1:1700000000.000100")
+    # Same thread_ts in another channel
+    summarize(tool, LINES, thread="C2:1700000000.000100")
+    assert len(prompts) == 2
+    summarize(tool, LINES, thread="C1:1700000000.000100")
+    assert len(prompts) == 2
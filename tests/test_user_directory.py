@@ -0,0 +1,43 @@
+import asyncio
+import json
+
+import aiohttp
+
+from src.slack.user_directory import UserDirectory
+from src.utils.shared_state import MemorySharedState
+
+
+class FailingClient:
+    """Slack client whose users.list fails like a dropped connection."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def users_list(self, **kwargs):
+        self.calls += 1
+        raise aiohttp.ClientConnectionError("Connection reset by peer")
+
+
+def test_failed_refresh_keeps_serving_the_snapshot(tmp_path):
+    snapshot = tmp_path / "users.json"
+    snapshot.write_text(json.dumps({"U07VDMP4943": "Lan Tran"}))
+    state = MemorySharedState()
+    client = FailingClient()
+    # Stale from the start, like a cold start with an old snapshot
+    directory = UserDirectory(snapshot_path=str(snapshot), ttl=0, client=client, state=state)
+
+    async def run():
+        await directory.ensure_fresh(wait=True)
+        await directory.ensure_fresh(wait=True)
+
+    asyncio.run(run())
+    assert directory.name("U07VDMP4943") == "Lan Tran"
+    # The claim is released, so each attempt could reload
+    assert client.calls == 2
+    assert state.claim("users:refresh", ttl=60)
+
+
+def test_failed_refresh_without_shared_state(tmp_path):
+    directory = UserDirectory(snapshot_path=str(tmp_path / "users.json"), ttl=0, client=FailingClient())
+    assert asyncio.run(directory.refresh()) == 0
+    assert directory.name("U07VDMP4943") == "U07VDMP4943"